@@ -0,0 +1,84 @@
+-- Polls and answers of months without a partition land in the default
+-- partitions instead of failing, e.g. when maintenance didn't run for a
+-- while. Creating the partitions of a month moves its rows out of them.
+create table polls_default partition of polls default;
+create table poll_answers_default partition of poll_answers default;
+
+-- Same as in V8, but the months of the rows in the default partitions are
+-- created too, and their rows are moved into the new partitions.
+create or replace function create_poll_partitions(since timestamptz, until timestamptz)
+returns setof timestamptz
+language plpgsql as $$
+declare
+    month timestamp;
+    month_start timestamptz;
+    month_end timestamptz;
+    polls_partition text;
+    answers_partition text;
+    moved_answers bigint;
+begin
+    select
+        date_trunc('month', least(since, min(creation_time)) at time zone 'UTC'),
+        greatest(until, max(creation_time))
+    into month, until
+    from polls_default;
+
+    while month <= until at time zone 'UTC' loop
+        month_start := month at time zone 'UTC';
+        month_end := (month + interval '1 month') at time zone 'UTC';
+        polls_partition := 'polls_' || to_char(month, '"y"YYYY"m"MM');
+        answers_partition := 'poll_answers_' || to_char(month, '"y"YYYY"m"MM');
+
+        -- The answers go first, they reference the polls
+        if to_regclass(answers_partition) is null then
+            create temp table moved_poll_answers as
+            with moved as (
+                delete from poll_answers_default
+                where poll_time >= month_start and poll_time < month_end
+                returning *
+            )
+            select * from moved;
+        end if;
+
+        if to_regclass(polls_partition) is null then
+            create temp table moved_polls as
+            with moved as (
+                delete from polls_default
+                where creation_time >= month_start and creation_time < month_end
+                returning *
+            )
+            select * from moved;
+
+            execute format(
+                'create table %I partition of polls for values from (%L) to (%L)',
+                polls_partition,
+                month_start,
+                month_end
+            );
+            insert into polls select * from moved_polls;
+            drop table moved_polls;
+            return next month_start;
+        end if;
+
+        if to_regclass(answers_partition) is null then
+            execute format(
+                'create table %I partition of poll_answers for values from (%L) to (%L)',
+                answers_partition,
+                month_start,
+                month_end
+            );
+
+            -- The moved answers are counted in the stats already
+            select count(*) into moved_answers from moved_poll_answers;
+            if moved_answers > 0 then
+                alter table poll_answers disable trigger poll_answers_stats;
+                insert into poll_answers select * from moved_poll_answers;
+                alter table poll_answers enable trigger poll_answers_stats;
+            end if;
+            drop table moved_poll_answers;
+        end if;
+
+        month := month + interval '1 month';
+    end loop;
+end;
+$$;
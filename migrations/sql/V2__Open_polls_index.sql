@@ -0,0 +1 @@
+create index on polls(creation_time asc) where close_time is null;
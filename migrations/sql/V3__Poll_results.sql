@@ -0,0 +1,5 @@
+create table poll_results(
+    poll_id text primary key references polls(id),
+    total_voter_count integer not null,
+    option_counts integer[] not null
+)
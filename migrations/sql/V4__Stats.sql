@@ -0,0 +1,198 @@
+create index on polls(group_id, creation_time desc);
+
+-- Answer distribution per poll, i.e. per group and day.
+-- option_counts is indexed by option value (1-based in SQL).
+create table poll_stats(
+    poll_id text primary key references polls(id),
+    option_counts integer[] not null default '{0,0,0,0}',
+    voter_count integer not null default 0
+);
+
+-- A streak is a run of consecutive polls in a group the user answered.
+-- current_streak is the run ending at the last answered poll.
+create table user_group_stats(
+    user_id bigint not null references users(id),
+    group_id bigint not null,
+    answer_count integer not null default 0,
+    option_sum bigint not null default 0,
+    last_poll_time timestamptz,
+    current_streak integer not null default 0,
+    longest_streak integer not null default 0,
+    primary key (user_id, group_id)
+);
+
+create function update_answer_stats() returns trigger
+language plpgsql as $$
+declare
+    answered_poll polls%rowtype;
+    previous_poll_time timestamptz;
+begin
+    if tg_op = 'UPDATE' and old.option is not distinct from new.option then
+        return null;
+    end if;
+
+    select * into answered_poll from polls where id = new.poll_id;
+
+    insert into poll_stats(poll_id)
+    values (new.poll_id)
+    on conflict do nothing;
+
+    insert into user_group_stats(user_id, group_id)
+    values (new.user_id, answered_poll.group_id)
+    on conflict do nothing;
+
+    -- A changed vote first takes back its old contribution
+    if tg_op = 'UPDATE' and old.option is not null then
+        update poll_stats set
+            option_counts[old.option + 1] = option_counts[old.option + 1] - 1,
+            voter_count = voter_count - 1
+        where poll_id = old.poll_id;
+
+        update user_group_stats set
+            answer_count = answer_count - 1,
+            option_sum = option_sum - old.option
+        where user_id = old.user_id and group_id = answered_poll.group_id;
+    end if;
+
+    if new.option is not null then
+        update poll_stats set
+            option_counts[new.option + 1] = option_counts[new.option + 1] + 1,
+            voter_count = voter_count + 1
+        where poll_id = new.poll_id;
+
+        update user_group_stats set
+            answer_count = answer_count + 1,
+            option_sum = option_sum + new.option
+        where user_id = new.user_id and group_id = answered_poll.group_id;
+    end if;
+
+    if tg_op = 'INSERT' then
+        select max(creation_time) into previous_poll_time
+        from polls
+        where group_id = answered_poll.group_id
+            and creation_time < answered_poll.creation_time;
+
+        -- Answers to polls older than the last answered one can't be placed
+        -- incrementally, rebuilding the stats takes care of them.
+        update user_group_stats set
+            current_streak = case
+                when last_poll_time >= answered_poll.creation_time then current_streak
+                when last_poll_time = previous_poll_time then current_streak + 1
+                else 1
+            end,
+            last_poll_time = greatest(last_poll_time, answered_poll.creation_time)
+        where user_id = new.user_id and group_id = answered_poll.group_id;
+
+        update user_group_stats set
+            longest_streak = greatest(longest_streak, current_streak)
+        where user_id = new.user_id and group_id = answered_poll.group_id;
+    end if;
+
+    return null;
+end;
+$$;
+
+create trigger poll_answers_stats
+after insert or update on poll_answers
+for each row execute function update_answer_stats();
+
+-- Recomputes all stats from the raw answers and returns the number of rows
+-- that differed from the incrementally maintained ones.
+create function rebuild_answer_stats() returns bigint
+language plpgsql as $$
+declare
+    mismatches bigint;
+begin
+    -- Keep answers from changing while the stats are rebuilt
+    lock table poll_answers in share mode;
+
+    create temp table rebuilt_poll_stats as
+    select
+        poll_id,
+        array[
+            count(*) filter (where option = 0),
+            count(*) filter (where option = 1),
+            count(*) filter (where option = 2),
+            count(*) filter (where option = 3)
+        ]::integer[] as option_counts,
+        count(option)::integer as voter_count
+    from poll_answers
+    group by poll_id;
+
+    create temp table rebuilt_user_group_stats as
+    with group_polls as (
+        select
+            id,
+            group_id,
+            creation_time,
+            row_number() over (
+                partition by group_id order by creation_time
+            ) as poll_number
+        from polls
+    ), participation as (
+        select
+            a.user_id,
+            p.group_id,
+            p.creation_time,
+            a.option,
+            p.poll_number - row_number() over (
+                partition by a.user_id, p.group_id order by p.creation_time
+            ) as island
+        from poll_answers a
+        join group_polls p on p.id = a.poll_id
+    ), streaks as (
+        select user_id, group_id, count(*) as length, max(creation_time) as end_time
+        from participation
+        group by user_id, group_id, island
+    ), totals as (
+        select
+            user_id,
+            group_id,
+            count(option)::integer as answer_count,
+            coalesce(sum(option), 0)::bigint as option_sum,
+            max(creation_time) as last_poll_time
+        from participation
+        group by user_id, group_id
+    )
+    select
+        t.user_id,
+        t.group_id,
+        t.answer_count,
+        t.option_sum,
+        t.last_poll_time,
+        (
+            select s.length from streaks s
+            where s.user_id = t.user_id
+                and s.group_id = t.group_id
+                and s.end_time = t.last_poll_time
+        )::integer as current_streak,
+        (
+            select max(s.length) from streaks s
+            where s.user_id = t.user_id and s.group_id = t.group_id
+        )::integer as longest_streak
+    from totals t;
+
+    select
+        (select count(*) from (
+            (table rebuilt_poll_stats except table poll_stats)
+            union all
+            (table poll_stats except table rebuilt_poll_stats)
+        ) as poll_differences)
+        + (select count(*) from (
+            (table rebuilt_user_group_stats except table user_group_stats)
+            union all
+            (table user_group_stats except table rebuilt_user_group_stats)
+        ) as user_differences)
+    into mismatches;
+
+    truncate poll_stats, user_group_stats;
+    insert into poll_stats select * from rebuilt_poll_stats;
+    insert into user_group_stats select * from rebuilt_user_group_stats;
+
+    drop table rebuilt_poll_stats, rebuilt_user_group_stats;
+
+    return mismatches;
+end;
+$$;
+
+select rebuild_answer_stats();
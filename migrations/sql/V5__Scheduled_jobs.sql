@@ -0,0 +1,6 @@
+-- Jobs run by the scheduler of handle-updates instead of a CronJob.
+-- last_run is when the last finished run was scheduled for, not when it ran.
+create table scheduled_jobs(
+    name text primary key,
+    last_run timestamptz not null
+)
@@ -0,0 +1,24 @@
+-- Per-chat settings, null means the default from the bot's config.
+-- send_time only applies to the scheduler of handle-updates, the
+-- send-polls CronJob sends to all enabled chats at once.
+create table chats(
+    id bigint primary key,
+    enabled boolean not null default true,
+    timezone text,
+    send_time time,
+    memes_enabled boolean not null default true
+);
+
+-- Running bots keep the chats in memory and reload them on this
+-- notification, so changes apply without a restart.
+create function notify_chats_changed() returns trigger
+language plpgsql as $$
+begin
+    perform pg_notify('chats_changed', '');
+    return null;
+end;
+$$;
+
+create trigger chats_changed
+after insert or update or delete or truncate on chats
+for each statement execute function notify_chats_changed();
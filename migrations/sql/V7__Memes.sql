@@ -0,0 +1,28 @@
+-- Memes sent along with the polls, weekday 0 is Monday. Memes added from a
+-- local file keep its name and content, so they can be uploaded again when
+-- Telegram no longer accepts their file_id. file_id is null until the file
+-- has been uploaded. Memes without either can't be sent and are disabled.
+create table memes(
+    id bigint generated always as identity primary key,
+    kind text not null check (kind in ('photo', 'video', 'animation', 'audio')),
+    weekday smallint not null check (weekday between 0 and 6),
+    weight integer not null default 1 check (weight > 0),
+    file_name text,
+    content bytea,
+    file_id text,
+    enabled boolean not null default true,
+    last_sent_at timestamptz,
+    check (not enabled or file_id is not null or content is not null),
+    check ((file_name is null) = (content is null))
+);
+
+-- The memes that were part of the code until now
+insert into memes(kind, weekday, file_id) values
+    ('photo', 0, 'AgACAgIAAxkBAAM_YadeyBhYrgqfspOYJI2-Q0CJBKoAAmS1MRsbNeBI8OUMldl34gMBAAMCAAN4AAMiBA'),
+    ('photo', 0, 'AgACAgIAAxkBAANDYxdkpr0njPmQiA1jUPJPyhoz04MAAom-MRt2lMFIay6HJVncG6kBAAMCAAN5AAMpBA'),
+    ('animation', 1, 'CgACAgQAAxkBAANBYxdhE8fUGGNR82Oh-IatiJM3m-gAAvkCAAKjsB1TKszbmqUkSXYpBA'),
+    ('photo', 2, 'AgACAgIAAxkBAAM7YDZLM7l3_SDr5gU6Uui6HQzT0h0AAk2xMRt69rhJVqsnsDCWduc3tAeeLgADAQADAgADbQADfJACAAEeBA'),
+    ('animation', 3, 'CgACAgIAAxkBAANEYzMf9xDKJ4ScYBT5JriNNV8L4aAAAiweAAIl4plJ4JCjKfT7dRUpBA'),
+    ('audio', 4, 'AwACAgIAAxkDAANeaQ23Qi7fZEBTFNwHgW_IVbk4olIAAlOAAALhXnBIApVGoujSZ882BA'),
+    ('video', 4, 'BAACAgIAAxkBAAM8YE0YG3NVgZdCH__27kNYL4DTj5MAAnsLAAIFyWhKhR8KzjuNll4eBA'),
+    ('photo', 6, 'AgACAgIAAxkBAANNaINuPaTrEVWJQxJyDiwdluPp4ikAAh3-MRsNR1FLHbovMdCNO-0BAAMCAAN5AAM2BA');
@@ -0,0 +1,279 @@
+-- Polls and their answers are partitioned by the month (in UTC) the poll was
+-- created in, so queries only touch the months they need and old months can
+-- be detached or archived by the maintenance operation mode. Answers carry
+-- their poll's creation time as poll_time for that.
+--
+-- Poll IDs are only unique together with the creation time now, so
+-- poll_stats and poll_results can't reference polls anymore.
+
+-- Creates the missing partitions of polls and poll_answers for the months
+-- from since to until and returns the start of each month it created.
+-- Months whose partition was detached are skipped, they have to be attached
+-- again or dropped first.
+create function create_poll_partitions(since timestamptz, until timestamptz)
+returns setof timestamptz
+language plpgsql as $$
+declare
+    month timestamp := date_trunc('month', since at time zone 'UTC');
+    month_start timestamptz;
+    month_end timestamptz;
+    polls_partition text;
+    answers_partition text;
+begin
+    while month <= until at time zone 'UTC' loop
+        month_start := month at time zone 'UTC';
+        month_end := (month + interval '1 month') at time zone 'UTC';
+        polls_partition := 'polls_' || to_char(month, '"y"YYYY"m"MM');
+        answers_partition := 'poll_answers_' || to_char(month, '"y"YYYY"m"MM');
+
+        if to_regclass(polls_partition) is null then
+            execute format(
+                'create table %I partition of polls for values from (%L) to (%L)',
+                polls_partition,
+                month_start,
+                month_end
+            );
+            return next month_start;
+        end if;
+
+        if to_regclass(answers_partition) is null then
+            execute format(
+                'create table %I partition of poll_answers for values from (%L) to (%L)',
+                answers_partition,
+                month_start,
+                month_end
+            );
+        end if;
+
+        month := month + interval '1 month';
+    end loop;
+end;
+$$;
+
+drop trigger poll_answers_stats on poll_answers;
+alter table poll_stats drop constraint poll_stats_poll_id_fkey;
+alter table poll_results drop constraint poll_results_poll_id_fkey;
+
+alter table polls rename to unpartitioned_polls;
+alter index polls_pkey rename to unpartitioned_polls_pkey;
+alter table poll_answers rename to unpartitioned_poll_answers;
+alter index poll_answers_pkey rename to unpartitioned_poll_answers_pkey;
+
+create table polls(
+    id text not null,
+    group_id bigint not null,
+    message_id bigint not null,
+    creation_time timestamptz not null,
+    close_time timestamptz,
+    primary key (id, creation_time)
+) partition by range (creation_time);
+
+create table poll_answers(
+    user_id bigint not null references users(id),
+    poll_id text not null,
+    poll_time timestamptz not null,
+    time timestamptz not null,
+    option integer,
+    primary key (user_id, poll_id, poll_time),
+    foreign key (poll_id, poll_time) references polls(id, creation_time)
+) partition by range (poll_time);
+
+-- Every month since the first poll and the next three
+select create_poll_partitions(
+    coalesce((select min(creation_time) from unpartitioned_polls), now()),
+    now() + interval '3 months'
+);
+
+insert into polls(id, group_id, message_id, creation_time, close_time)
+select id, group_id, message_id, creation_time, close_time
+from unpartitioned_polls;
+
+insert into poll_answers(user_id, poll_id, poll_time, time, option)
+select a.user_id, a.poll_id, p.creation_time, a.time, a.option
+from unpartitioned_poll_answers a
+join unpartitioned_polls p on p.id = a.poll_id;
+
+drop table unpartitioned_poll_answers;
+drop table unpartitioned_polls;
+
+-- Partitioning replaces the plain indexes on creation_time and close_time
+create index on polls(creation_time) where close_time is null;
+create index on polls(group_id, creation_time desc);
+
+-- Same as in V4, but the answered poll is looked up in its partition only
+create or replace function update_answer_stats() returns trigger
+language plpgsql as $$
+declare
+    answered_poll polls%rowtype;
+    previous_poll_time timestamptz;
+begin
+    if tg_op = 'UPDATE' and old.option is not distinct from new.option then
+        return null;
+    end if;
+
+    select * into answered_poll
+    from polls
+    where id = new.poll_id and creation_time = new.poll_time;
+
+    insert into poll_stats(poll_id)
+    values (new.poll_id)
+    on conflict do nothing;
+
+    insert into user_group_stats(user_id, group_id)
+    values (new.user_id, answered_poll.group_id)
+    on conflict do nothing;
+
+    -- A changed vote first takes back its old contribution
+    if tg_op = 'UPDATE' and old.option is not null then
+        update poll_stats set
+            option_counts[old.option + 1] = option_counts[old.option + 1] - 1,
+            voter_count = voter_count - 1
+        where poll_id = old.poll_id;
+
+        update user_group_stats set
+            answer_count = answer_count - 1,
+            option_sum = option_sum - old.option
+        where user_id = old.user_id and group_id = answered_poll.group_id;
+    end if;
+
+    if new.option is not null then
+        update poll_stats set
+            option_counts[new.option + 1] = option_counts[new.option + 1] + 1,
+            voter_count = voter_count + 1
+        where poll_id = new.poll_id;
+
+        update user_group_stats set
+            answer_count = answer_count + 1,
+            option_sum = option_sum + new.option
+        where user_id = new.user_id and group_id = answered_poll.group_id;
+    end if;
+
+    if tg_op = 'INSERT' then
+        select max(creation_time) into previous_poll_time
+        from polls
+        where group_id = answered_poll.group_id
+            and creation_time < answered_poll.creation_time;
+
+        -- Answers to polls older than the last answered one can't be placed
+        -- incrementally, rebuilding the stats takes care of them.
+        update user_group_stats set
+            current_streak = case
+                when last_poll_time >= answered_poll.creation_time then current_streak
+                when last_poll_time = previous_poll_time then current_streak + 1
+                else 1
+            end,
+            last_poll_time = greatest(last_poll_time, answered_poll.creation_time)
+        where user_id = new.user_id and group_id = answered_poll.group_id;
+
+        update user_group_stats set
+            longest_streak = greatest(longest_streak, current_streak)
+        where user_id = new.user_id and group_id = answered_poll.group_id;
+    end if;
+
+    return null;
+end;
+$$;
+
+create trigger poll_answers_stats
+after insert or update on poll_answers
+for each row execute function update_answer_stats();
+
+-- Same as in V4, but answers are joined to their poll within its partition.
+-- Only attached months are counted, detaching a month takes its answers out
+-- of the rebuilt stats.
+create or replace function rebuild_answer_stats() returns bigint
+language plpgsql as $$
+declare
+    mismatches bigint;
+begin
+    -- Keep answers from changing while the stats are rebuilt
+    lock table poll_answers in share mode;
+
+    create temp table rebuilt_poll_stats as
+    select
+        poll_id,
+        array[
+            count(*) filter (where option = 0),
+            count(*) filter (where option = 1),
+            count(*) filter (where option = 2),
+            count(*) filter (where option = 3)
+        ]::integer[] as option_counts,
+        count(option)::integer as voter_count
+    from poll_answers
+    group by poll_id;
+
+    create temp table rebuilt_user_group_stats as
+    with group_polls as (
+        select
+            id,
+            group_id,
+            creation_time,
+            row_number() over (
+                partition by group_id order by creation_time
+            ) as poll_number
+        from polls
+    ), participation as (
+        select
+            a.user_id,
+            p.group_id,
+            p.creation_time,
+            a.option,
+            p.poll_number - row_number() over (
+                partition by a.user_id, p.group_id order by p.creation_time
+            ) as island
+        from poll_answers a
+        join group_polls p on p.id = a.poll_id and p.creation_time = a.poll_time
+    ), streaks as (
+        select user_id, group_id, count(*) as length, max(creation_time) as end_time
+        from participation
+        group by user_id, group_id, island
+    ), totals as (
+        select
+            user_id,
+            group_id,
+            count(option)::integer as answer_count,
+            coalesce(sum(option), 0)::bigint as option_sum,
+            max(creation_time) as last_poll_time
+        from participation
+        group by user_id, group_id
+    )
+    select
+        t.user_id,
+        t.group_id,
+        t.answer_count,
+        t.option_sum,
+        t.last_poll_time,
+        (
+            select s.length from streaks s
+            where s.user_id = t.user_id
+                and s.group_id = t.group_id
+                and s.end_time = t.last_poll_time
+        )::integer as current_streak,
+        (
+            select max(s.length) from streaks s
+            where s.user_id = t.user_id and s.group_id = t.group_id
+        )::integer as longest_streak
+    from totals t;
+
+    select
+        (select count(*) from (
+            (table rebuilt_poll_stats except table poll_stats)
+            union all
+            (table poll_stats except table rebuilt_poll_stats)
+        ) as poll_differences)
+        + (select count(*) from (
+            (table rebuilt_user_group_stats except table user_group_stats)
+            union all
+            (table user_group_stats except table rebuilt_user_group_stats)
+        ) as user_differences)
+    into mismatches;
+
+    truncate poll_stats, user_group_stats;
+    insert into poll_stats select * from rebuilt_poll_stats;
+    insert into user_group_stats select * from rebuilt_user_group_stats;
+
+    drop table rebuilt_poll_stats, rebuilt_user_group_stats;
+
+    return mismatches;
+end;
+$$;
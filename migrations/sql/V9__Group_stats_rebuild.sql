@@ -0,0 +1,96 @@
+-- Same as rebuild_answer_stats(), but only for the polls and users of the
+-- given groups and without counting mismatches. History imports write their
+-- answers with the poll_answers_stats trigger disabled and rebuild the stats
+-- of the groups they touched with this instead.
+create function rebuild_group_stats(group_ids bigint[]) returns void
+language plpgsql as $$
+begin
+    -- Keep answers from changing while the stats are rebuilt
+    lock table poll_answers in share mode;
+
+    create temp table group_polls as
+    select
+        id,
+        group_id,
+        creation_time,
+        row_number() over (
+            partition by group_id order by creation_time
+        ) as poll_number
+    from polls
+    where group_id = any(group_ids);
+
+    delete from poll_stats
+    where poll_id in (select id from group_polls);
+
+    insert into poll_stats(poll_id, option_counts, voter_count)
+    select
+        a.poll_id,
+        array[
+            count(*) filter (where a.option = 0),
+            count(*) filter (where a.option = 1),
+            count(*) filter (where a.option = 2),
+            count(*) filter (where a.option = 3)
+        ]::integer[],
+        count(a.option)::integer
+    from poll_answers a
+    join group_polls p on p.id = a.poll_id and p.creation_time = a.poll_time
+    group by a.poll_id;
+
+    delete from user_group_stats
+    where group_id = any(group_ids);
+
+    insert into user_group_stats(
+        user_id,
+        group_id,
+        answer_count,
+        option_sum,
+        last_poll_time,
+        current_streak,
+        longest_streak
+    )
+    with participation as (
+        select
+            a.user_id,
+            p.group_id,
+            p.creation_time,
+            a.option,
+            p.poll_number - row_number() over (
+                partition by a.user_id, p.group_id order by p.creation_time
+            ) as island
+        from poll_answers a
+        join group_polls p on p.id = a.poll_id and p.creation_time = a.poll_time
+    ), streaks as (
+        select user_id, group_id, count(*) as length, max(creation_time) as end_time
+        from participation
+        group by user_id, group_id, island
+    ), totals as (
+        select
+            user_id,
+            group_id,
+            count(option)::integer as answer_count,
+            coalesce(sum(option), 0)::bigint as option_sum,
+            max(creation_time) as last_poll_time
+        from participation
+        group by user_id, group_id
+    )
+    select
+        t.user_id,
+        t.group_id,
+        t.answer_count,
+        t.option_sum,
+        t.last_poll_time,
+        (
+            select s.length from streaks s
+            where s.user_id = t.user_id
+                and s.group_id = t.group_id
+                and s.end_time = t.last_poll_time
+        )::integer,
+        (
+            select max(s.length) from streaks s
+            where s.user_id = t.user_id and s.group_id = t.group_id
+        )::integer
+    from totals t;
+
+    drop table group_polls;
+end;
+$$;
@@ -1,50 +1,122 @@
 import asyncio
 import logging
 import sys
+from typing import TYPE_CHECKING
 
-from bot.bot import MoodBot
+from bot import tracing
 from bot.init import initialize
+from bot.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from bot.bot import MoodBot
+    from bot.config import Config
+    from bot.database import Database
 
 _logger = logging.getLogger(__package__)
 
+# Every mode but handle-updates runs in a fresh CronJob pod, so modules are
+# only imported by the modes that need them. Check the cost with
+# src/tests/benchmarks/startup_bench.py.
+
+
+def _create_bot(config: Config, database: Database) -> MoodBot:
+    from bot.bot import MoodBot
+
+    return MoodBot(
+        config.telegram,
+        config.nats,
+        database,
+        config.metrics,
+        scheduler_config=config.scheduler,
+        partition_config=config.partition,
+        meme_config=config.memes,
+        active_chats=config.active_chats,
+    )
+
 
-async def _send_polls(bot: MoodBot, active_chats: list[int]) -> None:
+async def _send_polls(bot: MoodBot) -> None:
     await bot.initialize()
     try:
-        for chat_id in active_chats:
-            await bot.send_poll(chat_id)
+        with tracing.transaction(op="cron", name="send-polls"):
+            # Ignores the send times of the chats, they are up to the CronJob
+            await bot.send_polls([chat.id for chat in bot.chats.enabled_chats])
     finally:
         await bot.close()
+        sys.stdout.write(REGISTRY.render())
 
 
 async def _close_polls(bot: MoodBot) -> None:
     await bot.initialize()
     try:
-        await bot.close_open_polls()
+        with tracing.transaction(op="cron", name="close-polls"):
+            await bot.close_open_polls()
     finally:
         await bot.close()
+        sys.stdout.write(REGISTRY.render())
 
 
-def main() -> None:
-    config, database = initialize()
+async def _rebuild_stats(database: Database) -> None:
+    await database.open()
+    try:
+        mismatches = await database.rebuild_stats()
+        if mismatches:
+            _logger.warning("Rebuilt stats, %d entries were out of date", mismatches)
+        else:
+            _logger.info("Rebuilt stats, all entries were up to date")
+    finally:
+        await database.close()
 
-    bot = MoodBot(config.telegram, config.nats, database)
 
+async def _add_memes(bot: MoodBot, args: list[str]) -> None:
+    from bot.meme import add_memes
+
+    await bot.db.open()
+    try:
+        await add_memes(bot.memes, args)
+    finally:
+        await bot.close()
+
+
+def main() -> None:
     args = sys.argv[1:]
-    if len(args) != 1:
+    mode = args[0] if args else None
+    config, database = initialize(include_nats=mode == "handle-updates")
+
+    if mode is None:
         _logger.error("Must specify operation mode")
         return
 
-    match args[0]:
+    match mode:
         case "handle-updates":
             _logger.info("Running bot")
-            bot.run()
+            _create_bot(config, database).run()
         case "send-polls":
             _logger.info("Sending out polls")
-            asyncio.run(_send_polls(bot, config.active_chats))
+            asyncio.run(_send_polls(_create_bot(config, database)))
         case "close-polls":
             _logger.info("Closing polls")
-            asyncio.run(_close_polls(bot))
+            asyncio.run(_close_polls(_create_bot(config, database)))
+        case "rebuild-stats":
+            _logger.info("Rebuilding stats")
+            asyncio.run(_rebuild_stats(database))
+        case "export":
+            from bot.export import export
+
+            _logger.info("Exporting answers")
+            asyncio.run(export(database, config.telegram.timezone_name, args[1:]))
+        case "import":
+            from bot.backfill import backfill
+
+            _logger.info("Importing answers")
+            asyncio.run(backfill(database, args[1:]))
+        case "maintenance":
+            from bot.maintenance import maintain
+
+            _logger.info("Maintaining poll partitions")
+            asyncio.run(maintain(database, config.retention))
+        case "add-meme":
+            _logger.info("Adding memes")
+            asyncio.run(_add_memes(_create_bot(config, database), args[1:]))
         case other:
             _logger.error("Unknown operation mode: %s", other)
             sys.exit(1)
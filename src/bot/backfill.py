@@ -0,0 +1,93 @@
+import argparse
+import csv
+import json
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from bot.database import ExportFormat
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Mapping
+    from typing import Any
+
+    from bot.database import Database, HistoryRecord
+
+_logger = logging.getLogger(__name__)
+
+
+def _parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="import")
+    parser.add_argument(
+        "--format",
+        type=ExportFormat,
+        choices=list(ExportFormat),
+        default=ExportFormat.csv,
+    )
+    parser.add_argument(
+        "input",
+        type=Path,
+        help="File in the format written by the export operation mode",
+    )
+    return parser.parse_args(args)
+
+
+def _to_record(row: Mapping[str, Any]) -> HistoryRecord:
+    option = row["option"]
+    return (
+        int(row["group_id"]),
+        str(row["poll_id"]),
+        int(row["message_id"]),
+        datetime.fromisoformat(row["poll_time"]),
+        int(row["user_id"]),
+        str(row["first_name"]),
+        datetime.fromisoformat(row["answer_time"]),
+        None if option is None or option == "" else int(option),
+    )
+
+
+def _read_records(path: Path, input_format: ExportFormat) -> Iterator[HistoryRecord]:
+    with path.open("r", encoding="utf-8", newline="") as f:
+        match input_format:
+            case ExportFormat.csv:
+                for row in csv.DictReader(f):
+                    yield _to_record(row)
+            case ExportFormat.jsonl:
+                for line in f:
+                    if line.strip():
+                        yield _to_record(json.loads(line))
+
+
+async def backfill(database: Database, args: list[str]) -> None:
+    parsed = _parse_args(args)
+
+    await database.open()
+    try:
+        start = time.perf_counter()
+        result = await database.import_answers(
+            _read_records(parsed.input, parsed.format)
+        )
+        duration = time.perf_counter() - start
+    finally:
+        await database.close()
+
+    _logger.info(
+        "Imported %d rows in %.2f s, skipped %d invalid rows",
+        result.staged_rows,
+        duration,
+        result.skipped_rows,
+    )
+    _logger.info(
+        "Users: %d inserted, %d updated. Polls: %d inserted. Memberships: %d inserted",
+        result.users_inserted,
+        result.users_updated,
+        result.polls_inserted,
+        result.memberships_inserted,
+    )
+    _logger.info(
+        "Answers: %d inserted, %d updated",
+        result.answers_inserted,
+        result.answers_updated,
+    )
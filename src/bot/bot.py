@@ -1,54 +1,248 @@
+import asyncio
+import functools
 import logging
 import signal
-from datetime import UTC, datetime, tzinfo
+import time
+from datetime import UTC, date, datetime, timedelta, tzinfo
 from typing import TYPE_CHECKING, cast
 from zoneinfo import ZoneInfo
 
 import telegram
 from asyncpg import PostgresError
-from bs_nats_updater import NatsConfig, create_updater
 from telegram.constants import ChatType, ParseMode
-from telegram.ext import (
-    Application,
-    ApplicationBuilder,
-    ContextTypes,
-    MessageHandler,
-    PollAnswerHandler,
-    Updater,
-    filters,
-)
+from telegram.error import BadRequest, RetryAfter
 
-from bot.meme import Meme, MemeKind, get_meme
-from bot.model import Poll, PollAnswer, PollOption, User
+from bot import metrics, tracing
+from bot.chats import ChatDirectory
+from bot.meme import Meme, MemeCatalog, MemeKind
+from bot.model import Poll, PollAnswer, PollOption, PollResult, User
+from bot.ratelimit import SendRateLimiter
+from bot.request import create_request
+from bot.scheduler import ScheduledJob, Scheduler
 
 if TYPE_CHECKING:
-    from bot.config import TelegramConfig
+    from collections.abc import Awaitable, Callable, Collection, Hashable, Sequence
+    from datetime import time as time_of_day
+
+    from bs_nats_updater import NatsConfig
+    from telegram.ext import Application, ContextTypes, Updater
+
+    from bot.config import (
+        MemeConfig,
+        MetricsConfig,
+        PartitionConfig,
+        SchedulerConfig,
+        TelegramConfig,
+    )
     from bot.database import Database
 
 _logger = logging.getLogger(__name__)
 
 type Context = ContextTypes.DEFAULT_TYPE
+type Handler = Callable[[telegram.Update, Context], Awaitable[None]]
+
+_UPDATES = metrics.REGISTRY.counter(
+    "mood_updates_total",
+    "Received updates",
+)
+_HANDLER_SECONDS = metrics.REGISTRY.histogram(
+    "mood_handler_seconds",
+    "Duration of update handlers",
+    ("handler",),
+)
+_HANDLER_ERRORS = metrics.REGISTRY.counter(
+    "mood_handler_errors_total",
+    "Update handlers that raised an exception",
+    ("handler",),
+)
+
+
+def _ordering_key(update: object) -> Hashable | None:
+    # Changing a vote quickly must not be applied out of order, everything
+    # else can be handled in any order.
+    if isinstance(update, telegram.Update) and (answer := update.poll_answer):
+        if (user := answer.user) is not None:
+            return user.id, answer.poll_id
+
+    return None
+
+
+def _partition_key(update: telegram.Update) -> int:
+    # A user's answers go to one replica, so _ordering_key() still holds
+    if (answer := update.poll_answer) and (user := answer.user) is not None:
+        return user.id
+
+    if (chat := update.effective_chat) is not None:
+        return chat.id
+
+    return update.update_id
+
+
+def _is_stale_file_id(error: BadRequest) -> bool:
+    # E.g. "Wrong remote file identifier specified" or "File_reference_expired"
+    message = error.message.lower()
+    return "file identifier" in message or "file_reference" in message
+
+
+def _get_file_id(message: telegram.Message, kind: MemeKind) -> str:
+    file: telegram.Video | telegram.Animation | telegram.Voice | None
+    match kind:
+        case MemeKind.photo:
+            if not message.photo:
+                raise ValueError("Message has no photo")
+            largest = max(message.photo, key=lambda p: p.file_size or 0)
+            return largest.file_id
+        case MemeKind.video:
+            file = message.video
+        case MemeKind.animation:
+            file = message.animation
+        case MemeKind.audio:
+            file = message.voice
+
+    if file is None:
+        raise ValueError(f"Message has no {kind.name}")
+
+    return file.file_id
+
+
+def _since_midnight(at: time_of_day) -> timedelta:
+    return datetime.combine(date.min, at) - datetime.min
+
+
+def _measured(name: str, handler: Handler) -> Handler:
+    async def _handle(update: telegram.Update, context: Context) -> None:
+        with (
+            tracing.transaction(op="update", name=name),
+            _HANDLER_SECONDS.time(name),
+        ):
+            try:
+                await handler(update, context)
+            except Exception:
+                _HANDLER_ERRORS.inc(name)
+                raise
+
+    return _handle
 
 
 class MoodBot:
     def __init__(
         self,
         config: TelegramConfig,
-        nats_config: NatsConfig,
+        nats_config: NatsConfig | None,
         database: Database,
+        metrics_config: MetricsConfig | None = None,
+        *,
+        scheduler_config: SchedulerConfig | None = None,
+        partition_config: PartitionConfig | None = None,
+        meme_config: MemeConfig | None = None,
+        active_chats: Sequence[int] = (),
+        bot: telegram.Bot | None = None,
     ) -> None:
         self.config = config
         self.db = database
         self.timezone: tzinfo = ZoneInfo(config.timezone_name)
+        self.metrics_config = metrics_config
+        self.scheduler_config = scheduler_config
+        self.partition_config = partition_config
+        self.meme_config = meme_config
+        self.chats = ChatDirectory(
+            database,
+            default_timezone=self.timezone,
+            seed_chat_ids=active_chats,
+        )
+        self.memes = MemeCatalog(
+            database,
+            upload=None if meme_config is None else self._upload_meme,
+        )
+        self._scheduler: Scheduler | None = None
+        self._nats_config = nats_config
+        self._metrics_server: asyncio.Server | None = None
+        self._app: Application | None = None
+        self._bot = bot
+
+    @property
+    def app(self) -> Application:
+        app = self._app
+        if app is None:
+            app = self._build_application()
+            self._app = app
+
+        return app
+
+    @property
+    def bot(self) -> telegram.Bot:
+        bot = self._bot
+        if bot is None:
+            # Polls are sent through a bot of our own, the one that comes with
+            # the NATS updater can't be given a different request or base URL.
+            bot = telegram.Bot(
+                self.config.token,
+                base_url=self.config.api_base_url,
+                request=create_request(self.config.http),
+            )
+            self._bot = bot
+
+        return bot
+
+    def _build_application(self) -> Application:
+        # Only handle-updates needs an application, cron runs get by without
+        # importing telegram.ext and the NATS updater.
+        from bs_nats_updater import create_updater
+        from telegram.ext import (
+            ApplicationBuilder,
+            CommandHandler,
+            MessageHandler,
+            PollAnswerHandler,
+            TypeHandler,
+            filters,
+        )
 
-        app = (
+        from bot.update_filter import UpdateFilter
+        from bot.update_processor import OrderedUpdateProcessor
+
+        config = self.config
+        processor = OrderedUpdateProcessor(config.update_concurrency, _ordering_key)
+        builder = (
             ApplicationBuilder()
-            .updater(create_updater(self.config.token, nats_config))
+            .concurrent_updates(processor)
             .post_init(self.initialize)
             .post_shutdown(lambda _: self.close())
-            .build()
         )
-        app.add_handler(PollAnswerHandler(self._on_poll_answer))
+        if (nats_config := self._nats_config) is not None:
+            builder = builder.updater(create_updater(config.token, nats_config))
+        else:
+            # Without an updater, updates have to be put into the update queue
+            # directly, see bot.loadtest.
+            builder = (
+                builder.token(config.token)
+                .base_url(config.api_base_url)
+                .request(create_request(config.http))
+                .updater(None)
+            )
+
+        app = builder.build()
+        update_queue = app.update_queue
+        metrics.REGISTRY.gauge(
+            "mood_updates_queued",
+            "Received updates waiting to be handled",
+            lambda: update_queue.qsize() + processor.waiting,
+        )
+        metrics.REGISTRY.gauge(
+            "mood_updates_in_flight",
+            "Updates currently being handled",
+            lambda: processor.in_flight,
+        )
+        update_filter = UpdateFilter(
+            window=config.update_dedupe_window,
+            partition=self.partition_config,
+            key=_partition_key,
+        )
+        app.add_handler(TypeHandler(telegram.Update, update_filter), group=-2)
+        app.add_handler(TypeHandler(telegram.Update, self._count_update), group=-1)
+        app.add_handler(
+            PollAnswerHandler(_measured("poll_answer", self._on_poll_answer))
+        )
+        app.add_handler(CommandHandler("stats", _measured("stats", self._on_stats)))
         message_filter = (
             filters.PHOTO
             | filters.VIDEO
@@ -59,12 +253,10 @@ class MoodBot:
         app.add_handler(
             MessageHandler(
                 filters=message_filter,
-                callback=self._on_message,
+                callback=_measured("message", self._on_message),
             )
         )
-
-        self.app = app
-        self.bot: telegram.Bot = app.bot
+        return app
 
     async def initialize(self, application: Application | None = None) -> None:
         try:
@@ -74,15 +266,135 @@ class MoodBot:
             if application is not None:
                 application.stop_running()
 
+        # Opens the HTTP client of the bot and checks the token
+        await self.bot.initialize()
+
+        # Cron runs only need the chats as they are right now
+        await self.chats.open(listen=application is not None)
+
+        # Only the long-running update handler serves metrics, cron runs
+        # print them when they are done.
+        if application is not None and (metrics_config := self.metrics_config):
+            self._metrics_server = await metrics.serve(metrics_config.port)
+
+        # Replaces the send-polls and close-polls CronJobs
+        if application is not None and (scheduler_config := self.scheduler_config):
+            scheduler = self._create_scheduler(scheduler_config)
+            scheduler.start()
+            self._scheduler = scheduler
+
+    def _create_scheduler(self, config: SchedulerConfig) -> Scheduler:
+        return Scheduler(
+            self.db,
+            lambda: self._get_scheduled_jobs(config),
+            max_delay=timedelta(minutes=config.max_delay_minutes),
+        )
+
+    def _get_scheduled_jobs(self, config: SchedulerConfig) -> list[ScheduledJob]:
+        jobs: list[ScheduledJob] = []
+        # Polls are open as long as with the default times, whenever they
+        # were sent
+        open_for = _since_midnight(config.close_polls_at)
+        open_for -= _since_midnight(config.send_polls_at)
+        open_for %= timedelta(days=1)
+
+        # Chats that get their poll at the same time share a run
+        default_send_time = (config.send_polls_at, self.timezone)
+        chat_ids_by_send_time = self.chats.group_by_send_time(config.send_polls_at)
+        other_chat_ids: list[int] = []
+        for send_time, chat_ids in chat_ids_by_send_time.items():
+            if send_time == default_send_time:
+                continue
+
+            at, timezone = send_time
+            close_at = (datetime.combine(date.min, at) + open_for).time()
+            other_chat_ids.extend(chat_ids)
+            jobs.append(
+                ScheduledJob(
+                    name=f"send-polls {at:%H:%M} {timezone}",
+                    at=at,
+                    timezone=timezone,
+                    run=functools.partial(self.send_polls, chat_ids),
+                )
+            )
+            jobs.append(
+                ScheduledJob(
+                    name=f"close-polls {close_at:%H:%M} {timezone}",
+                    at=close_at,
+                    timezone=timezone,
+                    run=functools.partial(self.close_open_polls, chat_ids),
+                )
+            )
+
+        if chat_ids := chat_ids_by_send_time.get(default_send_time):
+            jobs.append(
+                ScheduledJob(
+                    name="send-polls",
+                    at=config.send_polls_at,
+                    timezone=self.timezone,
+                    run=functools.partial(self.send_polls, chat_ids),
+                )
+            )
+
+        # Also closes the polls of chats that were disabled since
+        jobs.append(
+            ScheduledJob(
+                name="close-polls",
+                at=config.close_polls_at,
+                timezone=self.timezone,
+                run=functools.partial(
+                    self.close_open_polls,
+                    skip_chat_ids=other_chat_ids,
+                ),
+            )
+        )
+        return jobs
+
     async def close(self) -> None:
+        if (scheduler := self._scheduler) is not None:
+            await scheduler.close()
+            self._scheduler = None
+
+        if (server := self._metrics_server) is not None:
+            server.close()
+            self._metrics_server = None
+
+        await self.memes.close()
+        # Uploads of memes are done by now
+        if (bot := self._bot) is not None:
+            await bot.shutdown()
+
+        await self.chats.close()
         await self.db.close()
-        updater: Updater | None = self.app.updater
+        # Without an application there is no updater to stop
+        app = self._app
+        updater: Updater | None = None if app is None else app.updater
         if updater is not None and updater.running:
             await updater.stop()
 
     def _now(self) -> datetime:
         return datetime.now(tz=UTC).astimezone(self.timezone)
 
+    @staticmethod
+    async def _count_update(_: telegram.Update, __: Context) -> None:
+        _UPDATES.inc()
+
+    async def _reply(
+        self,
+        message: telegram.Message,
+        text: str,
+        *,
+        parse_mode: str | None = None,
+    ) -> None:
+        # Not message.reply_text, the bot of the NATS updater doesn't use the
+        # configured HTTP client
+        await self.bot.send_message(
+            chat_id=message.chat_id,
+            text=text,
+            parse_mode=parse_mode,
+            reply_parameters=telegram.ReplyParameters(message_id=message.message_id),
+        )
+
     async def _on_message(self, update: telegram.Update, _: Context) -> None:
         message = update.message
         if message is None:
@@ -90,7 +402,8 @@ class MoodBot:
 
         async def _notify_file_id(*, kind: str, file_id: str) -> None:
             if message.chat.type == ChatType.PRIVATE:
-                await message.reply_text(
+                await self._reply(
+                    message,
                     f"File ID of {kind} is `{file_id}`",
                     parse_mode=ParseMode.MARKDOWN_V2,
                 )
@@ -137,55 +450,290 @@ class MoodBot:
         answer = PollAnswer.from_telegram(poll_answer)
         _logger.info("Received poll answer from %s: %s", user, answer)
 
-        await self.db.upsert_user(user)
-        await self.db.upsert_answer(answer)
+        await self.db.record_answer(user, answer)
 
-        poll = await self.db.get_poll(answer.poll_id)
-        await self.db.add_to_group(user_id=user.id, group_id=poll.group_id)
+    async def _on_stats(self, update: telegram.Update, _: Context) -> None:
+        message = update.message
+        if message is None or message.from_user is None:
+            return
+
+        group_id = message.chat.id
+        lines: list[str] = []
+
+        poll_stats = await self.db.get_latest_poll_stats(group_id)
+        if poll_stats is None:
+            lines.append("Noch keine Antworten in dieser Gruppe.")
+        else:
+            day = self._get_day_description(
+                poll_stats.creation_time.astimezone(self.chats.get_timezone(group_id))
+            )
+            lines.append(f"{day}: {poll_stats.voter_count} Antworten")
+            for option in PollOption:
+                lines.append(f"{option}: {poll_stats.get_count(option)}")
+
+        user_stats = await self.db.get_user_stats(
+            user_id=message.from_user.id,
+            group_id=group_id,
+        )
+        if user_stats is not None and (average := user_stats.average) is not None:
+            lines.append("")
+            lines.append(
+                f"Im Schnitt geht es dir {PollOption(round(average))}"
+                f" ({average:.2f}, {user_stats.answer_count} Antworten)."
+            )
+            lines.append(
+                f"Serie: {user_stats.current_streak}"
+                f" (Rekord: {user_stats.longest_streak})"
+            )
+
+        await self._reply(message, "\n".join(lines))
 
     async def send_poll(self, chat_id: int) -> None:
+        await self.send_polls([chat_id])
+
+    async def send_polls(self, chat_ids: Sequence[int]) -> None:
         if not await self.db.can_connect():
             _logger.error("Could not connect to database")
             return
 
-        now = self._now()
-        day_of_week = self._get_day_description(now)
-        meme = get_meme(now)
-
-        if meme is not None:
-            await self._send_meme(chat_id, meme)
+        now = datetime.now(tz=UTC)
+        # Maintenance creates partitions ahead of time. If it didn't run, the
+        # polls would end up in the default partition.
+        try:
+            await self.db.create_poll_partitions(since=now, until=now)
+        except Exception as e:
+            _logger.error("Could not create the poll partition", exc_info=e)
+
+        config = self.config
+        limiter = SendRateLimiter(
+            messages_per_second=config.messages_per_second,
+            chat_interval=config.chat_interval_ms / 1000,
+        )
+        semaphore = asyncio.Semaphore(config.send_concurrency)
+        try:
+            await self.memes.load()
+        except Exception as e:
+            _logger.error("Could not load memes", exc_info=e)
+
+        # Polls are stored as soon as they are sent, votes on them may come
+        # in right away. Polls sent while an insert is running are inserted
+        # together with the next one.
+        unsaved: list[tuple[Poll, asyncio.Future[None]]] = []
+        insert_lock = asyncio.Lock()
+
+        async def _insert(poll: Poll) -> None:
+            inserted = asyncio.get_running_loop().create_future()
+            unsaved.append((poll, inserted))
+            async with insert_lock:
+                if batch := unsaved.copy():
+                    unsaved.clear()
+                    try:
+                        await self.db.insert_polls([poll for poll, _ in batch])
+                    except Exception as e:
+                        for _, batch_inserted in batch:
+                            batch_inserted.set_exception(e)
+                    else:
+                        for _, batch_inserted in batch:
+                            batch_inserted.set_result(None)
+
+            await inserted
+
+        async def _send(chat_id: int) -> tuple[Poll, float]:
+            async with semaphore:
+                start = time.perf_counter()
+                chat = self.chats.get(chat_id)
+                local_now = now.astimezone(self.chats.get_timezone(chat_id))
+                question = f"Heute, {self._get_day_description(local_now)}, geht es mir"
+                meme = None
+                if chat is None or chat.memes_enabled:
+                    meme = self.memes.get_meme(local_now)
+
+                if meme is not None:
+                    await self._send_limited(
+                        limiter,
+                        chat_id,
+                        lambda: self._send_meme(chat_id, meme),
+                    )
+
+                message = await self._send_limited(
+                    limiter,
+                    chat_id,
+                    lambda: self.bot.send_poll(
+                        chat_id=chat_id,
+                        question=question,
+                        options=[str(option) for option in PollOption],
+                        is_anonymous=False,
+                        allows_multiple_answers=False,
+                    ),
+                )
+                telegram_poll = cast(telegram.Poll, message.poll)
+                poll = Poll(
+                    id=telegram_poll.id,
+                    group_id=chat_id,
+                    message_id=message.message_id,
+                    creation_time=local_now,
+                    close_time=None,
+                )
+                await _insert(poll)
+                return poll, time.perf_counter() - start
 
-        message = await self.bot.send_poll(
-            chat_id=chat_id,
-            question=f"Heute, {day_of_week}, geht es mir",
-            options=[str(option) for option in PollOption],
-            is_anonymous=False,
-            allows_multiple_answers=False,
+        run_start = time.perf_counter()
+        results = await asyncio.gather(
+            *(_send(chat_id) for chat_id in chat_ids),
+            return_exceptions=True,
         )
-        telegram_poll = cast(telegram.Poll, message.poll)
-        poll = Poll(
-            id=telegram_poll.id,
-            group_id=chat_id,
-            message_id=message.message_id,
-            creation_time=now,
-            close_time=None,
+
+        polls: list[Poll] = []
+        durations: list[float] = []
+        errors: list[Exception] = []
+        for chat_id, result in zip(chat_ids, results, strict=True):
+            if isinstance(result, Exception):
+                _logger.error("Could not send poll to %d", chat_id, exc_info=result)
+                errors.append(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                poll, duration = result
+                polls.append(poll)
+                durations.append(duration)
+
+        try:
+            await self.memes.record_sent(now)
+        except Exception as e:
+            _logger.error("Could not record sent memes", exc_info=e)
+
+        _logger.info(
+            "Sent %d of %d polls in %.2f s (slowest chat %.2f s, throttled %d times)",
+            len(polls),
+            len(chat_ids),
+            time.perf_counter() - run_start,
+            max(durations, default=0.0),
+            limiter.throttled,
         )
-        await self.db.insert_poll(poll)
+        if errors:
+            # Fails the CronJob or the scheduled run
+            raise ExceptionGroup(
+                f"Could not send {len(errors)} of {len(chat_ids)} polls",
+                errors,
+            )
 
-    async def close_open_polls(self) -> None:
+    async def _send_limited[T](
+        self,
+        limiter: SendRateLimiter,
+        chat_id: int,
+        send: Callable[[], Awaitable[T]],
+    ) -> T:
+        attempt = 1
+        while True:
+            await limiter.acquire(chat_id)
+            try:
+                return await send()
+            except RetryAfter as e:
+                if attempt >= self.config.max_send_attempts:
+                    raise
+
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    delay = retry_after.total_seconds()
+                else:
+                    delay = float(retry_after)
+                # Back off a little further on every attempt on top of what
+                # Telegram asked for.
+                delay += 2 ** (attempt - 1)
+                _logger.warning(
+                    "Rate limited while sending to %d, retrying in %.1f s",
+                    chat_id,
+                    delay,
+                )
+                limiter.pause(delay)
+                attempt += 1
+
+    async def close_open_polls(
+        self,
+        chat_ids: Collection[int] | None = None,
+        *,
+        skip_chat_ids: Collection[int] = (),
+    ) -> None:
+        """
+        Closes all open polls of the given chats. Without chat IDs, the polls
+        of every chat are closed once their day is over in the chat's
+        timezone.
+        """
+        config = self.config
         close_time = self._now()
-        async for poll in self.db.get_open_polls():
-            creation_time = poll.creation_time.astimezone(self.timezone)
-            if creation_time.date() == close_time.date():
-                _logger.debug("Skipping poll %s from today", poll.id)
-                continue
+        chat_id_set = None if chat_ids is None else set(chat_ids)
+        skipped_chat_ids = set(skip_chat_ids)
+
+        def _is_due(poll: Poll) -> bool:
+            if poll.group_id in skipped_chat_ids:
+                return False
+
+            if chat_id_set is not None:
+                return poll.group_id in chat_id_set
 
-            _logger.debug("Closing poll %s in group %d", poll.id, poll.group_id)
-            await self.bot.stop_poll(
-                chat_id=poll.group_id,
-                message_id=poll.message_id,
+            timezone = self.chats.get_timezone(poll.group_id)
+            start_of_today = datetime.combine(
+                close_time.astimezone(timezone).date(),
+                datetime.min.time(),
+                tzinfo=timezone,
             )
-            await self.db.update_poll_close_time(poll.id, close_time)
+            return poll.creation_time < start_of_today
+
+        limiter = SendRateLimiter(
+            messages_per_second=config.messages_per_second,
+            chat_interval=config.chat_interval_ms / 1000,
+        )
+        semaphore = asyncio.Semaphore(config.send_concurrency)
+
+        async def _stop(poll: Poll) -> PollResult:
+            async with semaphore:
+                _logger.debug("Closing poll %s in group %d", poll.id, poll.group_id)
+                telegram_poll = await self._send_limited(
+                    limiter,
+                    poll.group_id,
+                    lambda: self.bot.stop_poll(
+                        chat_id=poll.group_id,
+                        message_id=poll.message_id,
+                    ),
+                )
+                return PollResult.from_telegram(telegram_poll)
+
+        async def _close_batch(polls: list[Poll]) -> int:
+            results = await asyncio.gather(
+                *(_stop(poll) for poll in polls),
+                return_exceptions=True,
+            )
+            closed: list[PollResult] = []
+            for poll, result in zip(polls, results, strict=True):
+                if isinstance(result, BaseException):
+                    _logger.error("Could not close poll %s", poll.id, exc_info=result)
+                else:
+                    closed.append(result)
+
+            if closed:
+                await self.db.insert_poll_results(closed)
+                await self.db.update_polls_close_time(
+                    [result.poll_id for result in closed],
+                    close_time,
+                )
+
+            return len(closed)
+
+        closed_count = 0
+        batch: list[Poll] = []
+        async for poll in self.db.get_open_polls(created_before=close_time):
+            if not _is_due(poll):
+                continue
+
+            batch.append(poll)
+            if len(batch) >= config.close_batch_size:
+                closed_count += await _close_batch(batch)
+                batch = []
+
+        if batch:
+            closed_count += await _close_batch(batch)
+
+        _logger.info("Closed %d polls", closed_count)
 
     def run(self) -> None:
         self.app.run_polling(
@@ -193,29 +741,54 @@ class MoodBot:
         )
 
     async def _send_meme(self, chat_id: int, meme: Meme) -> None:
+        with tracing.span(op="meme", name=meme.kind.name):
+            try:
+                await self._send_meme_file(chat_id, meme.kind, cast(str, meme.file_id))
+            except BadRequest as e:
+                if not _is_stale_file_id(e):
+                    raise
+
+                # The chat goes without a meme today, it's uploaded again in
+                # the background.
+                _logger.warning("Telegram rejected the file ID of meme %d", meme.id)
+                self.memes.replace_stale(meme)
+
+    async def _upload_meme(self, meme: Meme, content: bytes) -> str:
+        chat_id = cast("MemeConfig", self.meme_config).upload_chat_id
+        file = telegram.InputFile(content, filename=meme.file_name)
+        with tracing.span(op="meme", name="upload"):
+            message = await self._send_meme_file(chat_id, meme.kind, file)
+
+        return _get_file_id(message, meme.kind)
+
+    async def _send_meme_file(
+        self,
+        chat_id: int,
+        kind: MemeKind,
+        file: str | telegram.InputFile,
+    ) -> telegram.Message:
         bot = self.bot
-        file_id = meme.file_id
-        match meme.kind:
+        match kind:
             case MemeKind.photo:
-                await bot.send_photo(
+                return await bot.send_photo(
                     chat_id=chat_id,
-                    photo=file_id,
+                    photo=file,
                     disable_notification=True,
                 )
             case MemeKind.video:
-                await bot.send_video(
+                return await bot.send_video(
                     chat_id=chat_id,
-                    video=file_id,
+                    video=file,
                     disable_notification=True,
                 )
             case MemeKind.animation:
-                await bot.send_animation(
+                return await bot.send_animation(
                     chat_id=chat_id,
-                    animation=file_id,
+                    animation=file,
                     disable_notification=True,
                 )
             case MemeKind.audio:
-                await bot.send_voice(
+                return await bot.send_voice(
                     chat_id=chat_id,
-                    voice=file_id,
+                    voice=file,
                 )
@@ -0,0 +1,67 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(kw_only=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+class LruCache[K, V]:
+    """
+    Size-bounded LRU cache. If a TTL is given, entries older than that are
+    treated as missing.
+    """
+
+    def __init__(self, *, max_size: int, ttl_seconds: float | None = None) -> None:
+        if max_size < 1:
+            raise ValueError(f"max_size must be positive, got {max_size}")
+
+        self._max_size = max_size
+        self._ttl = ttl_seconds
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key, count=False) is not None
+
+    def get(self, key: K, *, count: bool = True) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            if count:
+                self.stats.misses += 1
+            return None
+
+        inserted_at, value = entry
+        if self._ttl is not None and time.monotonic() - inserted_at > self._ttl:
+            del self._entries[key]
+            self.stats.expirations += 1
+            if count:
+                self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        if count:
+            self.stats.hits += 1
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        entries = self._entries
+        entries[key] = (time.monotonic(), value)
+        entries.move_to_end(key)
+        while len(entries) > self._max_size:
+            entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def discard(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,143 @@
+import asyncio
+import contextlib
+import logging
+from typing import TYPE_CHECKING
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from bot.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+    from datetime import time, tzinfo
+
+    from bot.database import Database
+    from bot.model import Chat
+
+_logger = logging.getLogger(__name__)
+
+_RELOAD_RETRY_DELAY = 5.0
+
+_RELOADS = REGISTRY.counter(
+    "mood_chat_reloads_total",
+    "Reloads of the chats table",
+)
+
+
+class ChatDirectory:
+    """
+    Keeps the chats table in memory, so looking up a chat's settings doesn't
+    touch the database. With listen, the table is reloaded whenever it
+    changes, so edits apply to running bots.
+
+    Chats missing from the table are added from seed_chat_ids on open.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        *,
+        default_timezone: tzinfo,
+        seed_chat_ids: Collection[int] = (),
+    ) -> None:
+        self._db = database
+        self.default_timezone = default_timezone
+        self._seed_chat_ids = seed_chat_ids
+        self._is_seeded = not seed_chat_ids
+        self._chats: dict[int, Chat] = {}
+        self._timezones: dict[int, tzinfo] = {}
+        self._changed = asyncio.Event()
+        self._stack = contextlib.AsyncExitStack()
+        self._reload_task: asyncio.Task[None] | None = None
+        REGISTRY.gauge(
+            "mood_chats_enabled",
+            "Chats that get a daily poll",
+            lambda: len(self.enabled_chats),
+        )
+
+    async def open(self, *, listen: bool) -> None:
+        if listen:
+            # Listening first, so changes during the first load aren't missed
+            await self._stack.enter_async_context(
+                self._db.listen_for_chat_changes(self._changed.set)
+            )
+            self._reload_task = asyncio.create_task(self._reload_on_change())
+
+        try:
+            await self.reload()
+        except Exception as e:
+            # Answers can still be spooled, the chats are loaded once the
+            # database is back.
+            _logger.error("Could not load chats", exc_info=e)
+            self._changed.set()
+
+    async def close(self) -> None:
+        if (task := self._reload_task) is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            self._reload_task = None
+
+        await self._stack.aclose()
+
+    async def reload(self) -> None:
+        if not self._is_seeded:
+            if added := await self._db.insert_chats(self._seed_chat_ids):
+                _logger.info("Added %d chats from the config", added)
+            self._is_seeded = True
+
+        chats = await self._db.get_chats()
+        timezones: dict[int, tzinfo] = {}
+        for chat in chats:
+            if (timezone_name := chat.timezone_name) is None:
+                continue
+
+            try:
+                timezones[chat.id] = ZoneInfo(timezone_name)
+            except ZoneInfoNotFoundError, ValueError:
+                _logger.warning(
+                    "Unknown timezone %s for chat %d, using the default",
+                    timezone_name,
+                    chat.id,
+                )
+
+        self._chats = {chat.id: chat for chat in chats}
+        self._timezones = timezones
+        _RELOADS.inc()
+        _logger.debug("Loaded %d chats", len(chats))
+
+    async def _reload_on_change(self) -> None:
+        while True:
+            await self._changed.wait()
+            # Changes from here on need another reload
+            self._changed.clear()
+            try:
+                await self.reload()
+            except Exception as e:
+                _logger.error("Could not reload chats", exc_info=e)
+                self._changed.set()
+                await asyncio.sleep(_RELOAD_RETRY_DELAY)
+
+    def get(self, chat_id: int) -> Chat | None:
+        return self._chats.get(chat_id)
+
+    @property
+    def enabled_chats(self) -> list[Chat]:
+        return [chat for chat in self._chats.values() if chat.is_enabled]
+
+    def get_timezone(self, chat_id: int) -> tzinfo:
+        return self._timezones.get(chat_id, self.default_timezone)
+
+    def group_by_send_time(
+        self,
+        default_send_time: time,
+    ) -> dict[tuple[time, tzinfo], list[int]]:
+        """
+        Groups the enabled chats by the local time they get their poll at.
+        """
+        groups: dict[tuple[time, tzinfo], list[int]] = {}
+        for chat in self.enabled_chats:
+            send_time = chat.send_time or default_send_time
+            timezone = self.get_timezone(chat.id)
+            groups.setdefault((send_time, timezone), []).append(chat.id)
+
+        return groups
@@ -1,16 +1,24 @@
 from dataclasses import dataclass
+from datetime import time
+from enum import Enum
 from typing import TYPE_CHECKING, Self
 
-from bs_nats_updater import NatsConfig
-
 if TYPE_CHECKING:
     from bs_config import Env
+    from bs_nats_updater import NatsConfig
 
 
 @dataclass(frozen=True, kw_only=True)
 class SentryConfig:
     dsn: str
     release: str
+    # 0 disables tracing
+    update_traces_sample_rate: float
+    cron_traces_sample_rate: float
+
+    @property
+    def is_tracing_enabled(self) -> bool:
+        return self.update_traces_sample_rate > 0 or self.cron_traces_sample_rate > 0
 
     @classmethod
     def from_env(cls, env: Env) -> Self | None:
@@ -22,19 +30,176 @@ class SentryConfig:
         return cls(
             dsn=dsn,
             release=env.get_string("app-version", default="debug"),
+            update_traces_sample_rate=float(
+                env.get_string("sentry-update-traces-sample-rate", default="0")
+            ),
+            cron_traces_sample_rate=float(
+                env.get_string("sentry-cron-traces-sample-rate", default="0")
+            ),
+        )
+
+
+@dataclass(frozen=True, kw_only=True)
+class HttpConfig:
+    # Connections to the Bot API, calls beyond that wait up to pool_timeout
+    pool_size: int
+    # Idle connections kept open for reuse, 0 connects anew for every call
+    keepalive_connections: int
+    keepalive_expiry_seconds: float
+    # Needs the h2 package, i.e. httpx[http2]
+    http2: bool
+    connect_timeout_seconds: float
+    read_timeout_seconds: float
+    write_timeout_seconds: float
+    # Uploads, like memes sent from a file
+    media_write_timeout_seconds: float
+    pool_timeout_seconds: float
+
+    @classmethod
+    def from_env(cls, env: Env) -> Self:
+        pool_size = env.get_int("pool-size", default=256)
+        return cls(
+            pool_size=pool_size,
+            keepalive_connections=env.get_int(
+                "keepalive-connections",
+                default=pool_size,
+            ),
+            keepalive_expiry_seconds=float(
+                env.get_string("keepalive-expiry-seconds", default="5")
+            ),
+            http2=env.get_bool("http2", default=False),
+            connect_timeout_seconds=float(
+                env.get_string("connect-timeout-seconds", default="5")
+            ),
+            read_timeout_seconds=float(
+                env.get_string("read-timeout-seconds", default="5")
+            ),
+            write_timeout_seconds=float(
+                env.get_string("write-timeout-seconds", default="5")
+            ),
+            media_write_timeout_seconds=float(
+                env.get_string("media-write-timeout-seconds", default="20")
+            ),
+            pool_timeout_seconds=float(
+                env.get_string("pool-timeout-seconds", default="1")
+            ),
         )
 
 
 @dataclass(frozen=True, kw_only=True)
 class TelegramConfig:
     token: str
+    api_base_url: str
     timezone_name: str
+    send_concurrency: int
+    messages_per_second: int
+    chat_interval_ms: int
+    max_send_attempts: int
+    close_batch_size: int
+    update_concurrency: int
+    # Remembered update IDs to drop redelivered updates, 0 disables it
+    update_dedupe_window: int
+    http: HttpConfig
 
     @classmethod
     def from_env(cls, env: Env) -> Self:
         return cls(
             token=env.get_string("token", required=True),
+            # A local Bot API server, or the stand-in from bot.standin
+            api_base_url=env.get_string(
+                "api-base-url",
+                default="https://api.telegram.org/bot",
+            ),
             timezone_name=env.get_string("timezone", default="Etc/UTC"),
+            send_concurrency=env.get_int("send-concurrency", default=8),
+            messages_per_second=env.get_int("messages-per-second", default=25),
+            chat_interval_ms=env.get_int("chat-interval-ms", default=1000),
+            max_send_attempts=env.get_int("max-send-attempts", default=3),
+            close_batch_size=env.get_int("close-batch-size", default=100),
+            update_concurrency=env.get_int("update-concurrency", default=8),
+            update_dedupe_window=env.get_int("update-dedupe-window", default=10_000),
+            http=HttpConfig.from_env(env / "http"),
+        )
+
+
+@dataclass(frozen=True, kw_only=True)
+class WriteBufferConfig:
+    max_batch_size: int
+    max_delay_ms: int
+
+    @classmethod
+    def from_env(cls, env: Env) -> Self | None:
+        if not env.get_bool("enabled", default=False):
+            return None
+
+        return cls(
+            max_batch_size=env.get_int("max-batch-size", default=500),
+            max_delay_ms=env.get_int("max-delay-ms", default=1000),
+        )
+
+
+@dataclass(frozen=True, kw_only=True)
+class SpoolConfig:
+    # Should be on a persistent volume, or answers don't survive a restart
+    directory: str
+    max_batch_size: int
+    max_delay_ms: int
+
+    @classmethod
+    def from_env(cls, env: Env) -> Self | None:
+        if not env.get_bool("enabled", default=False):
+            return None
+
+        return cls(
+            directory=env.get_string("directory", default="spool"),
+            max_batch_size=env.get_int("max-batch-size", default=500),
+            max_delay_ms=env.get_int("max-delay-ms", default=200),
+        )
+
+
+@dataclass(frozen=True, kw_only=True)
+class CacheConfig:
+    max_polls: int
+    max_users: int
+    max_memberships: int
+    ttl_seconds: int
+
+    @classmethod
+    def from_env(cls, env: Env) -> Self | None:
+        if not env.get_bool("enabled", default=True):
+            return None
+
+        return cls(
+            max_polls=env.get_int("max-polls", default=1024),
+            max_users=env.get_int("max-users", default=10_000),
+            max_memberships=env.get_int("max-memberships", default=10_000),
+            ttl_seconds=env.get_int("ttl-seconds", default=86400),
+        )
+
+
+@dataclass(frozen=True, kw_only=True)
+class PoolConfig:
+    min_size: int
+    max_size: int
+    # Connections are replaced after this many queries
+    max_queries: int
+    max_inactive_connection_lifetime_seconds: int
+    # Prepared statements kept per connection, 0 disables the cache
+    statement_cache_size: int
+    command_timeout_seconds: int
+
+    @classmethod
+    def from_env(cls, env: Env) -> Self:
+        return cls(
+            min_size=env.get_int("min-size", default=1),
+            max_size=env.get_int("max-size", default=4),
+            max_queries=env.get_int("max-queries", default=50_000),
+            max_inactive_connection_lifetime_seconds=env.get_int(
+                "max-inactive-connection-lifetime-seconds",
+                default=300,
+            ),
+            statement_cache_size=env.get_int("statement-cache-size", default=100),
+            command_timeout_seconds=env.get_int("command-timeout-seconds", default=30),
         )
 
 
@@ -44,6 +209,10 @@ class DatabaseConfig:
     name: str
     username: str
     password: str
+    pool: PoolConfig
+    cache: CacheConfig | None
+    write_buffer: WriteBufferConfig | None
+    spool: SpoolConfig | None
 
     def to_connection_string(self) -> str:
         return f"postgresql://{self.username}:{self.password}@{self.host}/{self.name}"
@@ -55,23 +224,161 @@ class DatabaseConfig:
             name=env.get_string("name", required=True),
             username=env.get_string("username", required=True),
             password=env.get_string("password", required=True),
+            pool=PoolConfig.from_env(env / "pool"),
+            cache=CacheConfig.from_env(env / "cache"),
+            write_buffer=WriteBufferConfig.from_env(env / "write-buffer"),
+            spool=SpoolConfig.from_env(env / "spool"),
+        )
+
+
+@dataclass(frozen=True, kw_only=True)
+class MemeConfig:
+    # Memes added from a file are uploaded to this chat once to get a file_id
+    upload_chat_id: int
+
+    @classmethod
+    def from_env(cls, env: Env) -> Self | None:
+        upload_chat_id = env.get_int("upload-chat-id", default=0)
+
+        if not upload_chat_id:
+            return None
+
+        return cls(upload_chat_id=upload_chat_id)
+
+
+@dataclass(frozen=True, kw_only=True)
+class MetricsConfig:
+    port: int
+
+    @classmethod
+    def from_env(cls, env: Env) -> Self | None:
+        port = env.get_int("port", default=0)
+
+        if not port:
+            return None
+
+        return cls(port=port)
+
+
+@dataclass(frozen=True, kw_only=True)
+class PartitionConfig:
+    # Every replica needs its own NATS consumer, named like the shared one
+    # with "-<index>" appended. It only handles the updates of its partition.
+    index: int
+    count: int
+
+    @classmethod
+    def from_env(cls, env: Env) -> Self | None:
+        count = env.get_int("count", default=1)
+        if count <= 1:
+            return None
+
+        index = env.get_int("index", required=True)
+        if not 0 <= index < count:
+            raise ValueError(f"Partition index {index} not in [0, {count})")
+
+        return cls(index=index, count=count)
+
+    def check_consumer(self, consumer_name: str) -> None:
+        # A shared consumer delivers each update to one of the replicas only,
+        # which drops it unless it belongs to its own partition
+        suffix = f"-{self.index}"
+        if not consumer_name.endswith(suffix):
+            raise ValueError(
+                f"NATS consumer {consumer_name} is not the one of partition"
+                f" {self.index}, its name must end with {suffix}"
+            )
+
+
+class RetentionAction(Enum):
+    # Keeps the tables of old months in the database, out of the way
+    detach = "detach"
+    # Exports old months to a file each, then drops them
+    archive = "archive"
+
+
+@dataclass(frozen=True, kw_only=True)
+class RetentionConfig:
+    # Months of polls kept besides the current one, 0 keeps all of them
+    months: int
+    # Months partitions are created for ahead of time
+    premake_months: int
+    action: RetentionAction
+    # Should be on a persistent volume, archives can be imported again
+    archive_directory: str
+
+    @classmethod
+    def from_env(cls, env: Env) -> Self:
+        return cls(
+            months=env.get_int("months", default=0),
+            premake_months=env.get_int("premake-months", default=3),
+            action=RetentionAction(env.get_string("action", default="detach")),
+            archive_directory=env.get_string("archive-directory", default="archive"),
+        )
+
+
+@dataclass(frozen=True, kw_only=True)
+class SchedulerConfig:
+    # Local times in the bot's timezone, like the CronJob schedules. Polls of
+    # chats with their own send time or timezone stay open just as long.
+    send_polls_at: time
+    close_polls_at: time
+    # Missed runs are caught up on after a restart, unless they are older
+    max_delay_minutes: int
+
+    @classmethod
+    def from_env(cls, env: Env) -> Self | None:
+        if not env.get_bool("enabled", default=False):
+            return None
+
+        return cls(
+            send_polls_at=time.fromisoformat(
+                env.get_string("send-polls-at", default="13:00")
+            ),
+            close_polls_at=time.fromisoformat(
+                env.get_string("close-polls-at", default="00:05")
+            ),
+            max_delay_minutes=env.get_int("max-delay-minutes", default=360),
         )
 
 
 @dataclass(frozen=True, kw_only=True)
 class Config:
+    # Added to the chats table on startup, where they can be changed
     active_chats: list[int]
     database: DatabaseConfig
-    nats: NatsConfig
+    memes: MemeConfig | None
+    metrics: MetricsConfig | None
+    # Only loaded for handle-updates, the other modes don't receive updates
+    nats: NatsConfig | None
+    partition: PartitionConfig | None
+    retention: RetentionConfig
+    scheduler: SchedulerConfig | None
     sentry: SentryConfig | None
     telegram: TelegramConfig
 
     @classmethod
-    def from_env(cls, env: Env) -> Self:
+    def from_env(cls, env: Env, *, include_nats: bool = True) -> Self:
+        nats: NatsConfig | None = None
+        if include_nats:
+            # Imports telegram.ext, which cron runs don't need
+            from bs_nats_updater import NatsConfig
+
+            nats = NatsConfig.from_env(env / "nats")
+
+        partition = PartitionConfig.from_env(env / "partition")
+        if nats is not None and partition is not None:
+            partition.check_consumer(nats.consumer_name)
+
         return cls(
-            active_chats=env.get_int_list("active-chats", required=True),
+            active_chats=env.get_int_list("active-chats", default=[]),
             database=DatabaseConfig.from_env(env / "database"),
-            nats=NatsConfig.from_env(env / "nats"),
+            memes=MemeConfig.from_env(env / "memes"),
+            metrics=MetricsConfig.from_env(env / "metrics"),
+            nats=nats,
+            partition=partition,
+            retention=RetentionConfig.from_env(env / "retention"),
+            scheduler=SchedulerConfig.from_env(env / "scheduler"),
             sentry=SentryConfig.from_env(env),
             telegram=TelegramConfig.from_env(env / "telegram"),
         )
@@ -1,11 +1,24 @@
 import abc
-from typing import TYPE_CHECKING
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING, BinaryIO
 
 if TYPE_CHECKING:
-    from collections.abc import AsyncIterable
+    from collections.abc import AsyncIterable, Callable, Collection, Iterable
+    from contextlib import AbstractAsyncContextManager
     from datetime import datetime
+    from pathlib import Path
 
-    from bot.model import Poll, PollAnswer, User
+    from bot.meme import Meme, MemeKind
+    from bot.model import (
+        Chat,
+        Poll,
+        PollAnswer,
+        PollResult,
+        PollStats,
+        User,
+        UserStats,
+    )
 
 
 class DatabaseException(abc.ABC, Exception):
@@ -29,6 +42,59 @@ class DuplicateException(ConstraintException):
     pass
 
 
+# Columns of exported and imported answer history:
+# group_id, poll_id, message_id, poll_time, user_id, first_name, answer_time, option
+type HistoryRecord = tuple[int, str, int, datetime, int, str, datetime, int | None]
+
+
+@dataclass(frozen=True, kw_only=True)
+class ImportResult:
+    staged_rows: int
+    skipped_rows: int
+    users_inserted: int
+    users_updated: int
+    polls_inserted: int
+    memberships_inserted: int
+    answers_inserted: int
+    answers_updated: int
+
+
+@dataclass(frozen=True, kw_only=True)
+class PollPartition:
+    """
+    The partitions of polls and poll_answers for the polls created in
+    [start, end).
+    """
+
+    polls_table: str
+    answers_table: str | None
+    start: datetime
+    end: datetime
+
+
+class ExportFormat(Enum):
+    csv = "csv"
+    jsonl = "jsonl"
+
+
+@dataclass(frozen=True, kw_only=True)
+class WriteBatch:
+    users: Collection[User]
+    answers: Collection[PollAnswer]
+    # (user_id, group_id)
+    memberships: Collection[tuple[int, int]]
+    # (user_id, poll_id), the group is resolved from the poll
+    poll_memberships: Collection[tuple[int, str]]
+
+    def __len__(self) -> int:
+        return (
+            len(self.users)
+            + len(self.answers)
+            + len(self.memberships)
+            + len(self.poll_memberships)
+        )
+
+
 class Database(abc.ABC):
     @abc.abstractmethod
     async def open(self) -> None:
@@ -39,7 +105,28 @@ class Database(abc.ABC):
         pass
 
     @abc.abstractmethod
-    def get_open_polls(self) -> AsyncIterable[Poll]:
+    def get_open_polls(self, *, created_before: datetime) -> AsyncIterable[Poll]:
+        pass
+
+    @abc.abstractmethod
+    async def get_poll_result(self, poll_id: str) -> PollResult:
+        pass
+
+    @abc.abstractmethod
+    async def get_latest_poll_stats(self, group_id: int) -> PollStats | None:
+        pass
+
+    @abc.abstractmethod
+    async def get_user_stats(self, *, user_id: int, group_id: int) -> UserStats | None:
+        pass
+
+    @abc.abstractmethod
+    async def rebuild_stats(self) -> int:
+        """
+        Recomputes all stats from the stored answers.
+
+        :return: the number of stats entries that were out of date
+        """
         pass
 
     @abc.abstractmethod
@@ -54,6 +141,10 @@ class Database(abc.ABC):
     async def insert_poll(self, poll: Poll) -> None:
         pass
 
+    @abc.abstractmethod
+    async def insert_polls(self, polls: Collection[Poll]) -> None:
+        pass
+
     @abc.abstractmethod
     async def update_poll_close_time(
         self,
@@ -62,10 +153,173 @@ class Database(abc.ABC):
     ) -> None:
         pass
 
+    @abc.abstractmethod
+    async def update_polls_close_time(
+        self,
+        poll_ids: Collection[str],
+        close_time: datetime,
+    ) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def insert_poll_results(self, results: Collection[PollResult]) -> None:
+        pass
+
     @abc.abstractmethod
     async def upsert_answer(self, poll_answer: PollAnswer) -> None:
         pass
 
+    @abc.abstractmethod
+    async def record_answer(self, user: User, poll_answer: PollAnswer) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def write_batch(self, batch: WriteBatch) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def export_answers(
+        self,
+        output: Path | BinaryIO,
+        *,
+        export_format: ExportFormat,
+        group_id: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        """
+        Streams all answers joined with their poll and user to the output.
+
+        :return: the number of exported rows
+        """
+        pass
+
+    @abc.abstractmethod
+    async def import_answers(
+        self,
+        records: Iterable[HistoryRecord],
+    ) -> ImportResult:
+        """
+        Merges answer history into the database in a single transaction.
+        Existing polls are kept as they are, existing users and answers are
+        updated.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def get_chats(self) -> list[Chat]:
+        pass
+
+    @abc.abstractmethod
+    async def insert_chats(self, chat_ids: Collection[int]) -> int:
+        """
+        Adds chats with default settings, existing chats are left alone.
+
+        :return: the number of added chats
+        """
+        pass
+
+    @abc.abstractmethod
+    def listen_for_chat_changes(
+        self,
+        callback: Callable[[], None],
+    ) -> AbstractAsyncContextManager[None]:
+        """
+        Calls back when chats were changed by any process, or changes may
+        have been missed, until the context exits.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def get_last_scheduled_run(self, job: str) -> datetime | None:
+        """
+        :return: when the last claimed run of the job was scheduled for
+        """
+        pass
+
+    @abc.abstractmethod
+    async def claim_scheduled_run(self, job: str, scheduled_for: datetime) -> bool:
+        """
+        Records the run as the job's last one, unless the same or a later run
+        was recorded already. Other processes sharing the database can't
+        claim it anymore after that.
+
+        :return: whether this call claimed the run
+        """
+        pass
+
+    @abc.abstractmethod
+    async def get_memes(self) -> list[Meme]:
+        """
+        :return: the enabled memes, without their content
+        """
+        pass
+
+    @abc.abstractmethod
+    async def get_meme_content(self, meme_id: int) -> bytes | None:
+        """
+        :return: the file the meme was added from, if any
+        """
+        pass
+
+    @abc.abstractmethod
+    async def insert_meme(
+        self,
+        *,
+        kind: MemeKind,
+        weekday: int,
+        weight: int,
+        file_name: str,
+        content: bytes,
+    ) -> Meme:
+        pass
+
+    @abc.abstractmethod
+    async def set_meme_file_id(self, meme_id: int, file_id: str | None) -> None:
+        """
+        Removing the file ID of a meme that wasn't added from a file disables
+        it, it can't be sent anymore.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def set_memes_last_sent(
+        self,
+        meme_ids: Collection[int],
+        sent_at: datetime,
+    ) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def create_poll_partitions(self, *, since: datetime, until: datetime) -> int:
+        """
+        Creates the missing partitions for polls created from the month of
+        since to the month of until, and for the months of polls that were
+        stored without a partition of their own.
+
+        :return: the number of months partitions were created for
+        """
+        pass
+
+    @abc.abstractmethod
+    async def get_poll_partitions(self) -> list[PollPartition]:
+        """
+        :return: the attached partitions, oldest first
+        """
+        pass
+
+    @abc.abstractmethod
+    async def detach_poll_partition(self, partition: PollPartition) -> None:
+        """
+        Takes the polls and answers of the partition out of the tables, but
+        keeps them in the database.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def drop_poll_partition(self, partition: PollPartition) -> None:
+        pass
+
     @abc.abstractmethod
     async def can_connect(self) -> bool:
         pass
@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from bot.database import Database, WriteBatch
+from bot.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterable, Callable, Collection, Iterable
+    from contextlib import AbstractAsyncContextManager
+    from datetime import datetime
+    from pathlib import Path
+    from typing import BinaryIO
+
+    from bot.config import WriteBufferConfig
+    from bot.database import (
+        ExportFormat,
+        HistoryRecord,
+        ImportResult,
+        PollPartition,
+    )
+    from bot.meme import Meme, MemeKind
+    from bot.model import (
+        Chat,
+        Poll,
+        PollAnswer,
+        PollResult,
+        PollStats,
+        User,
+        UserStats,
+    )
+
+_logger = logging.getLogger(__name__)
+
+_FLUSH_SECONDS = REGISTRY.histogram(
+    "mood_write_buffer_flush_seconds",
+    "Duration of flushes of the write buffer, including failed ones",
+)
+_FLUSHES = REGISTRY.counter(
+    "mood_write_buffer_flushes_total",
+    "Successful flushes of the write buffer",
+)
+_FAILED_FLUSHES = REGISTRY.counter(
+    "mood_write_buffer_flush_errors_total",
+    "Flushes of the write buffer that raised an exception",
+)
+_FLUSHED_ROWS = REGISTRY.counter(
+    "mood_write_buffer_flushed_rows_total",
+    "Rows written by flushes of the write buffer",
+)
+
+
+@dataclass(kw_only=True)
+class WriteBufferStats:
+    flushes: int = 0
+    failed_flushes: int = 0
+    flushed_rows: int = 0
+    total_flush_seconds: float = 0.0
+    max_flush_seconds: float = 0.0
+    last_flush_seconds: float = 0.0
+
+
+class BufferedDatabase(Database):
+    """
+    Write-behind layer that buffers user, answer and membership writes and
+    flushes them in bulk once the batch is large enough or old enough.
+
+    Repeated writes for the same key are coalesced, the last one wins.
+    """
+
+    def __init__(self, database: Database, config: WriteBufferConfig) -> None:
+        self._db = database
+        self._config = config
+        self._users: dict[int, User] = {}
+        self._answers: dict[tuple[int, str], PollAnswer] = {}
+        self._memberships: set[tuple[int, int]] = set()
+        self._poll_memberships: set[tuple[int, str]] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task[None] | None = None
+        self.stats = WriteBufferStats()
+        REGISTRY.gauge(
+            "mood_write_buffer_pending_rows",
+            "Buffered rows not written to the database yet",
+            lambda: self.pending_rows,
+        )
+
+    @property
+    def pending_rows(self) -> int:
+        return (
+            len(self._users)
+            + len(self._answers)
+            + len(self._memberships)
+            + len(self._poll_memberships)
+        )
+
+    async def open(self) -> None:
+        await self._db.open()
+
+    async def close(self) -> None:
+        if (task := self._flush_task) is not None:
+            task.cancel()
+            self._flush_task = None
+
+        try:
+            await self.flush()
+        except Exception as e:
+            _logger.error(
+                "Could not flush %d buffered rows",
+                self.pending_rows,
+                exc_info=e,
+            )
+        finally:
+            await self._db.close()
+
+    async def can_connect(self) -> bool:
+        return await self._db.can_connect()
+
+    async def get_poll(self, poll_id: str) -> Poll:
+        return await self._db.get_poll(poll_id)
+
+    def get_open_polls(self, *, created_before: datetime) -> AsyncIterable[Poll]:
+        return self._db.get_open_polls(created_before=created_before)
+
+    async def insert_poll(self, poll: Poll) -> None:
+        await self._db.insert_poll(poll)
+
+    async def insert_polls(self, polls: Collection[Poll]) -> None:
+        await self._db.insert_polls(polls)
+
+    async def update_poll_close_time(
+        self,
+        poll_id: str,
+        close_time: datetime,
+    ) -> None:
+        await self._db.update_poll_close_time(poll_id, close_time)
+
+    async def update_polls_close_time(
+        self,
+        poll_ids: Collection[str],
+        close_time: datetime,
+    ) -> None:
+        await self._db.update_polls_close_time(poll_ids, close_time)
+
+    async def get_poll_result(self, poll_id: str) -> PollResult:
+        return await self._db.get_poll_result(poll_id)
+
+    async def insert_poll_results(self, results: Collection[PollResult]) -> None:
+        await self._db.insert_poll_results(results)
+
+    async def get_latest_poll_stats(self, group_id: int) -> PollStats | None:
+        return await self._db.get_latest_poll_stats(group_id)
+
+    async def get_user_stats(self, *, user_id: int, group_id: int) -> UserStats | None:
+        return await self._db.get_user_stats(user_id=user_id, group_id=group_id)
+
+    async def rebuild_stats(self) -> int:
+        return await self._db.rebuild_stats()
+
+    async def upsert_user(self, user: User) -> None:
+        self._users[user.id] = user
+        await self._on_write()
+
+    async def add_to_group(self, *, user_id: int, group_id: int) -> None:
+        self._memberships.add((user_id, group_id))
+        await self._on_write()
+
+    async def upsert_answer(self, poll_answer: PollAnswer) -> None:
+        self._answers[poll_answer.user_id, poll_answer.poll_id] = poll_answer
+        await self._on_write()
+
+    async def record_answer(self, user: User, poll_answer: PollAnswer) -> None:
+        self._users[user.id] = user
+        self._answers[poll_answer.user_id, poll_answer.poll_id] = poll_answer
+        self._poll_memberships.add((user.id, poll_answer.poll_id))
+        await self._on_write()
+
+    async def write_batch(self, batch: WriteBatch) -> None:
+        await self._db.write_batch(batch)
+
+    async def export_answers(
+        self,
+        output: Path | BinaryIO,
+        *,
+        export_format: ExportFormat,
+        group_id: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        return await self._db.export_answers(
+            output,
+            export_format=export_format,
+            group_id=group_id,
+            since=since,
+            until=until,
+        )
+
+    async def _on_write(self) -> None:
+        if self.pending_rows >= self._config.max_batch_size:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._config.max_delay_ms / 1000)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            _logger.error("Delayed flush failed", exc_info=e)
+            if self.pending_rows and self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_later())
+
+    def _take_batch(self) -> WriteBatch:
+        batch = WriteBatch(
+            users=list(self._users.values()),
+            answers=list(self._answers.values()),
+            memberships=list(self._memberships),
+            poll_memberships=list(self._poll_memberships),
+        )
+        self._users = {}
+        self._answers = {}
+        self._memberships = set()
+        self._poll_memberships = set()
+        return batch
+
+    def _restore_batch(self, batch: WriteBatch) -> None:
+        # Anything written while the batch was in flight is newer and wins.
+        for user in batch.users:
+            self._users.setdefault(user.id, user)
+        for answer in batch.answers:
+            self._answers.setdefault((answer.user_id, answer.poll_id), answer)
+        self._memberships.update(batch.memberships)
+        self._poll_memberships.update(batch.poll_memberships)
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            batch = self._take_batch()
+            if not batch:
+                return
+
+            stats = self.stats
+            start = time.perf_counter()
+            try:
+                await self._db.write_batch(batch)
+            except Exception:
+                stats.failed_flushes += 1
+                _FAILED_FLUSHES.inc()
+                self._restore_batch(batch)
+                raise
+            finally:
+                duration = time.perf_counter() - start
+                stats.last_flush_seconds = duration
+                stats.total_flush_seconds += duration
+                stats.max_flush_seconds = max(stats.max_flush_seconds, duration)
+                _FLUSH_SECONDS.observe(duration)
+
+            stats.flushes += 1
+            stats.flushed_rows += len(batch)
+            _FLUSHES.inc()
+            _FLUSHED_ROWS.inc(amount=len(batch))
+            _logger.debug(
+                "Flushed %d rows in %.1f ms (%d flushes, %d failed)",
+                len(batch),
+                duration * 1000,
+                stats.flushes,
+                stats.failed_flushes,
+            )
+
+    async def import_answers(
+        self,
+        records: Iterable[HistoryRecord],
+    ) -> ImportResult:
+        return await self._db.import_answers(records)
+
+    async def get_chats(self) -> list[Chat]:
+        return await self._db.get_chats()
+
+    async def insert_chats(self, chat_ids: Collection[int]) -> int:
+        return await self._db.insert_chats(chat_ids)
+
+    def listen_for_chat_changes(
+        self,
+        callback: Callable[[], None],
+    ) -> AbstractAsyncContextManager[None]:
+        return self._db.listen_for_chat_changes(callback)
+
+    async def get_last_scheduled_run(self, job: str) -> datetime | None:
+        return await self._db.get_last_scheduled_run(job)
+
+    async def claim_scheduled_run(self, job: str, scheduled_for: datetime) -> bool:
+        return await self._db.claim_scheduled_run(job, scheduled_for)
+
+    async def get_memes(self) -> list[Meme]:
+        return await self._db.get_memes()
+
+    async def get_meme_content(self, meme_id: int) -> bytes | None:
+        return await self._db.get_meme_content(meme_id)
+
+    async def insert_meme(
+        self,
+        *,
+        kind: MemeKind,
+        weekday: int,
+        weight: int,
+        file_name: str,
+        content: bytes,
+    ) -> Meme:
+        return await self._db.insert_meme(
+            kind=kind,
+            weekday=weekday,
+            weight=weight,
+            file_name=file_name,
+            content=content,
+        )
+
+    async def set_meme_file_id(self, meme_id: int, file_id: str | None) -> None:
+        await self._db.set_meme_file_id(meme_id, file_id)
+
+    async def set_memes_last_sent(
+        self,
+        meme_ids: Collection[int],
+        sent_at: datetime,
+    ) -> None:
+        await self._db.set_memes_last_sent(meme_ids, sent_at)
+
+    async def create_poll_partitions(self, *, since: datetime, until: datetime) -> int:
+        return await self._db.create_poll_partitions(since=since, until=until)
+
+    async def get_poll_partitions(self) -> list[PollPartition]:
+        return await self._db.get_poll_partitions()
+
+    async def detach_poll_partition(self, partition: PollPartition) -> None:
+        await self._db.detach_poll_partition(partition)
+
+    async def drop_poll_partition(self, partition: PollPartition) -> None:
+        await self._db.drop_poll_partition(partition)
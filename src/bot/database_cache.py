@@ -0,0 +1,302 @@
+import dataclasses
+import logging
+from typing import TYPE_CHECKING, Any
+
+from bot.cache import LruCache
+from bot.database import Database
+from bot.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterable, Callable, Collection, Iterable
+    from contextlib import AbstractAsyncContextManager
+    from datetime import datetime
+    from pathlib import Path
+    from typing import BinaryIO
+
+    from bot.config import CacheConfig
+    from bot.database import (
+        ExportFormat,
+        HistoryRecord,
+        ImportResult,
+        PollPartition,
+        WriteBatch,
+    )
+    from bot.meme import Meme, MemeKind
+    from bot.model import (
+        Chat,
+        Poll,
+        PollAnswer,
+        PollResult,
+        PollStats,
+        User,
+        UserStats,
+    )
+
+_logger = logging.getLogger(__name__)
+
+
+def _register_metrics(name: str, cache: LruCache[Any, Any]) -> None:
+    description = name.replace("_", " ")
+    REGISTRY.gauge(
+        f"mood_{name}_cache_entries",
+        f"Entries in the {description} cache",
+        lambda: len(cache),
+    )
+    REGISTRY.gauge(
+        f"mood_{name}_cache_hits",
+        f"Lookups found in the {description} cache",
+        lambda: cache.stats.hits,
+    )
+    REGISTRY.gauge(
+        f"mood_{name}_cache_misses",
+        f"Lookups missing from the {description} cache",
+        lambda: cache.stats.misses,
+    )
+    REGISTRY.gauge(
+        f"mood_{name}_cache_evictions",
+        f"Entries evicted from the full {description} cache",
+        lambda: cache.stats.evictions,
+    )
+    REGISTRY.gauge(
+        f"mood_{name}_cache_expirations",
+        f"Entries of the {description} cache that outlived the TTL",
+        lambda: cache.stats.expirations,
+    )
+
+
+class CachedDatabase(Database):
+    """
+    Keeps recently seen polls in memory so lookups of known polls don't need
+    a query. Polls never change their group or message after creation, only
+    their close time, which is updated in place.
+
+    Also remembers user names and group memberships that are known to be
+    written already, so repeated answers only write the answer itself.
+    """
+
+    def __init__(self, database: Database, config: CacheConfig) -> None:
+        self._db = database
+        self.polls: LruCache[str, Poll] = LruCache(
+            max_size=config.max_polls,
+            ttl_seconds=config.ttl_seconds,
+        )
+        self.user_names: LruCache[int, str] = LruCache(
+            max_size=config.max_users,
+            ttl_seconds=config.ttl_seconds,
+        )
+        self.memberships: LruCache[tuple[int, int], bool] = LruCache(
+            max_size=config.max_memberships,
+            ttl_seconds=config.ttl_seconds,
+        )
+        _register_metrics("poll", self.polls)
+        _register_metrics("user_name", self.user_names)
+        _register_metrics("membership", self.memberships)
+
+    async def open(self) -> None:
+        await self._db.open()
+
+    async def close(self) -> None:
+        for name, cache in [
+            ("Poll", self.polls),
+            ("User name", self.user_names),
+            ("Membership", self.memberships),
+        ]:
+            stats = cache.stats
+            _logger.debug(
+                "%s cache: %d hits, %d misses, %d evictions, %d expirations",
+                name,
+                stats.hits,
+                stats.misses,
+                stats.evictions,
+                stats.expirations,
+            )
+        await self._db.close()
+
+    async def can_connect(self) -> bool:
+        return await self._db.can_connect()
+
+    async def get_poll(self, poll_id: str) -> Poll:
+        if (poll := self.polls.get(poll_id)) is not None:
+            return poll
+
+        poll = await self._db.get_poll(poll_id)
+        self.polls.put(poll_id, poll)
+        return poll
+
+    async def get_open_polls(self, *, created_before: datetime) -> AsyncIterable[Poll]:
+        async for poll in self._db.get_open_polls(created_before=created_before):
+            self.polls.put(poll.id, poll)
+            yield poll
+
+    async def insert_poll(self, poll: Poll) -> None:
+        await self._db.insert_poll(poll)
+        self.polls.put(poll.id, poll)
+
+    async def insert_polls(self, polls: Collection[Poll]) -> None:
+        await self._db.insert_polls(polls)
+        for poll in polls:
+            self.polls.put(poll.id, poll)
+
+    async def update_poll_close_time(
+        self,
+        poll_id: str,
+        close_time: datetime,
+    ) -> None:
+        await self._db.update_poll_close_time(poll_id, close_time)
+        self._set_cached_close_time(poll_id, close_time)
+
+    async def update_polls_close_time(
+        self,
+        poll_ids: Collection[str],
+        close_time: datetime,
+    ) -> None:
+        await self._db.update_polls_close_time(poll_ids, close_time)
+        for poll_id in poll_ids:
+            self._set_cached_close_time(poll_id, close_time)
+
+    def _set_cached_close_time(self, poll_id: str, close_time: datetime) -> None:
+        if (poll := self.polls.get(poll_id, count=False)) is not None:
+            self.polls.put(
+                poll_id,
+                dataclasses.replace(poll, close_time=close_time),
+            )
+
+    async def get_poll_result(self, poll_id: str) -> PollResult:
+        return await self._db.get_poll_result(poll_id)
+
+    async def insert_poll_results(self, results: Collection[PollResult]) -> None:
+        await self._db.insert_poll_results(results)
+
+    async def get_latest_poll_stats(self, group_id: int) -> PollStats | None:
+        return await self._db.get_latest_poll_stats(group_id)
+
+    async def get_user_stats(self, *, user_id: int, group_id: int) -> UserStats | None:
+        return await self._db.get_user_stats(user_id=user_id, group_id=group_id)
+
+    async def rebuild_stats(self) -> int:
+        return await self._db.rebuild_stats()
+
+    async def upsert_user(self, user: User) -> None:
+        if self.user_names.get(user.id) == user.first_name:
+            return
+
+        await self._db.upsert_user(user)
+        self.user_names.put(user.id, user.first_name)
+
+    async def add_to_group(self, *, user_id: int, group_id: int) -> None:
+        key = (user_id, group_id)
+        if self.memberships.get(key):
+            return
+
+        await self._db.add_to_group(user_id=user_id, group_id=group_id)
+        self.memberships.put(key, True)
+
+    async def upsert_answer(self, poll_answer: PollAnswer) -> None:
+        await self._db.upsert_answer(poll_answer)
+
+    async def record_answer(self, user: User, poll_answer: PollAnswer) -> None:
+        # Looking up an unknown poll once is cheaper than rewriting the user
+        # and membership on every answer to it.
+        poll = await self.get_poll(poll_answer.poll_id)
+        membership = (user.id, poll.group_id)
+
+        is_name_known = self.user_names.get(user.id) == user.first_name
+        if is_name_known and self.memberships.get(membership):
+            await self._db.upsert_answer(poll_answer)
+            return
+
+        await self._db.record_answer(user, poll_answer)
+        self.user_names.put(user.id, user.first_name)
+        self.memberships.put(membership, True)
+
+    async def write_batch(self, batch: WriteBatch) -> None:
+        await self._db.write_batch(batch)
+
+    async def export_answers(
+        self,
+        output: Path | BinaryIO,
+        *,
+        export_format: ExportFormat,
+        group_id: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        return await self._db.export_answers(
+            output,
+            export_format=export_format,
+            group_id=group_id,
+            since=since,
+            until=until,
+        )
+
+    async def import_answers(
+        self,
+        records: Iterable[HistoryRecord],
+    ) -> ImportResult:
+        return await self._db.import_answers(records)
+
+    async def get_chats(self) -> list[Chat]:
+        return await self._db.get_chats()
+
+    async def insert_chats(self, chat_ids: Collection[int]) -> int:
+        return await self._db.insert_chats(chat_ids)
+
+    def listen_for_chat_changes(
+        self,
+        callback: Callable[[], None],
+    ) -> AbstractAsyncContextManager[None]:
+        return self._db.listen_for_chat_changes(callback)
+
+    async def get_last_scheduled_run(self, job: str) -> datetime | None:
+        return await self._db.get_last_scheduled_run(job)
+
+    async def claim_scheduled_run(self, job: str, scheduled_for: datetime) -> bool:
+        return await self._db.claim_scheduled_run(job, scheduled_for)
+
+    async def get_memes(self) -> list[Meme]:
+        return await self._db.get_memes()
+
+    async def get_meme_content(self, meme_id: int) -> bytes | None:
+        return await self._db.get_meme_content(meme_id)
+
+    async def insert_meme(
+        self,
+        *,
+        kind: MemeKind,
+        weekday: int,
+        weight: int,
+        file_name: str,
+        content: bytes,
+    ) -> Meme:
+        return await self._db.insert_meme(
+            kind=kind,
+            weekday=weekday,
+            weight=weight,
+            file_name=file_name,
+            content=content,
+        )
+
+    async def set_meme_file_id(self, meme_id: int, file_id: str | None) -> None:
+        await self._db.set_meme_file_id(meme_id, file_id)
+
+    async def set_memes_last_sent(
+        self,
+        meme_ids: Collection[int],
+        sent_at: datetime,
+    ) -> None:
+        await self._db.set_memes_last_sent(meme_ids, sent_at)
+
+    async def create_poll_partitions(self, *, since: datetime, until: datetime) -> int:
+        return await self._db.create_poll_partitions(since=since, until=until)
+
+    async def get_poll_partitions(self) -> list[PollPartition]:
+        return await self._db.get_poll_partitions()
+
+    async def detach_poll_partition(self, partition: PollPartition) -> None:
+        await self._db.detach_poll_partition(partition)
+        # Rare enough to not bother finding the polls of the partition
+        self.polls.clear()
+
+    async def drop_poll_partition(self, partition: PollPartition) -> None:
+        await self._db.drop_poll_partition(partition)
+        self.polls.clear()
@@ -0,0 +1,687 @@
+import bisect
+import csv
+import io
+import json
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, replace
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from bot.database import (
+    Database,
+    DuplicateException,
+    ExportFormat,
+    ImportResult,
+    NotFoundException,
+    PollPartition,
+    WriteBatch,
+)
+from bot.meme import Meme
+from bot.model import (
+    Chat,
+    Poll,
+    PollAnswer,
+    PollOption,
+    PollResult,
+    PollStats,
+    User,
+    UserStats,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import (
+        AsyncIterable,
+        AsyncIterator,
+        Callable,
+        Collection,
+        Iterable,
+        Iterator,
+    )
+    from typing import BinaryIO
+
+    from bot.database import HistoryRecord
+    from bot.meme import MemeKind
+
+_logger = logging.getLogger(__name__)
+
+_EXPORT_COLUMNS = (
+    "group_id",
+    "poll_id",
+    "message_id",
+    "poll_time",
+    "user_id",
+    "first_name",
+    "answer_time",
+    "option",
+)
+
+
+@dataclass(kw_only=True)
+class _PollCounts:
+    option_counts: list[int] = field(default_factory=lambda: [0] * len(PollOption))
+    voter_count: int = 0
+
+
+@dataclass(kw_only=True)
+class _UserGroupCounts:
+    answer_count: int = 0
+    option_sum: int = 0
+    last_poll_time: datetime | None = None
+    current_streak: int = 0
+    longest_streak: int = 0
+
+
+class MemoryDatabase(Database):
+    """
+    Keeps everything in process memory, for benchmarks and local runs
+    without Postgres.
+
+    Stats are maintained the same way as by the update_answer_stats trigger,
+    including its limits for answers to older polls.
+    """
+
+    def __init__(self) -> None:
+        self._is_open = False
+        self._users: dict[int, User] = {}
+        self._memberships: set[tuple[int, int]] = set()
+        self._polls: dict[str, Poll] = {}
+        self._open_polls: dict[str, Poll] = {}
+        # Sorted by creation time, like the polls(group_id, creation_time) index
+        self._group_polls: dict[int, list[Poll]] = {}
+        self._results: dict[str, PollResult] = {}
+        self._answers: dict[tuple[int, str], PollAnswer] = {}
+        self._poll_stats: dict[str, _PollCounts] = {}
+        self._user_stats: dict[tuple[int, int], _UserGroupCounts] = {}
+        self._chats: dict[int, Chat] = {}
+        self._chat_listeners: list[Callable[[], None]] = []
+        self._last_scheduled_runs: dict[str, datetime] = {}
+        self._memes: dict[int, Meme] = {}
+        self._meme_contents: dict[int, bytes] = {}
+        self._disabled_memes: set[int] = set()
+        # By start, polls outside of the partitions are kept all the same
+        self._poll_partitions: dict[datetime, PollPartition] = {}
+        self._detached_partitions: dict[datetime, PollPartition] = {}
+
+    async def open(self) -> None:
+        self._is_open = True
+
+    async def can_connect(self) -> bool:
+        return self._is_open
+
+    async def close(self) -> None:
+        self._is_open = False
+
+    def _get_poll(self, poll_id: str) -> Poll:
+        poll = self._polls.get(poll_id)
+        if poll is None:
+            raise NotFoundException(poll_id)
+
+        return poll
+
+    def _store_poll(self, poll: Poll) -> None:
+        poll = replace(poll)
+        self._polls[poll.id] = poll
+        if poll.close_time is None:
+            self._open_polls[poll.id] = poll
+        bisect.insort(
+            self._group_polls.setdefault(poll.group_id, []),
+            poll,
+            key=lambda p: p.creation_time,
+        )
+
+    def _previous_poll_time(self, poll: Poll) -> datetime | None:
+        group_polls = self._group_polls[poll.group_id]
+        index = bisect.bisect_left(
+            group_polls,
+            poll.creation_time,
+            key=lambda p: p.creation_time,
+        )
+        if index == 0:
+            return None
+
+        return group_polls[index - 1].creation_time
+
+    def _store_answer(self, answer: PollAnswer) -> bool:
+        """
+        :return: whether the answer was new
+        """
+        poll = self._get_poll(answer.poll_id)
+        if answer.user_id not in self._users:
+            raise NotFoundException(str(answer.user_id))
+
+        key = (answer.user_id, answer.poll_id)
+        old = self._answers.get(key)
+        self._answers[key] = answer
+        if old is not None and old.option == answer.option:
+            return False
+
+        poll_counts = self._poll_stats.setdefault(poll.id, _PollCounts())
+        user_counts = self._user_stats.setdefault(
+            (answer.user_id, poll.group_id),
+            _UserGroupCounts(),
+        )
+
+        if old is not None and (old_option := old.option) is not None:
+            poll_counts.option_counts[old_option] -= 1
+            poll_counts.voter_count -= 1
+            user_counts.answer_count -= 1
+            user_counts.option_sum -= old_option
+
+        if (option := answer.option) is not None:
+            poll_counts.option_counts[option] += 1
+            poll_counts.voter_count += 1
+            user_counts.answer_count += 1
+            user_counts.option_sum += option
+
+        if old is None:
+            last_poll_time = user_counts.last_poll_time
+            if last_poll_time is None:
+                user_counts.current_streak = 1
+                user_counts.last_poll_time = poll.creation_time
+            elif last_poll_time < poll.creation_time:
+                if last_poll_time == self._previous_poll_time(poll):
+                    user_counts.current_streak += 1
+                else:
+                    user_counts.current_streak = 1
+                user_counts.last_poll_time = poll.creation_time
+
+            user_counts.longest_streak = max(
+                user_counts.longest_streak,
+                user_counts.current_streak,
+            )
+
+        return old is None
+
+    async def get_poll(self, poll_id: str) -> Poll:
+        return replace(self._get_poll(poll_id))
+
+    async def get_open_polls(self, *, created_before: datetime) -> AsyncIterable[Poll]:
+        # Iterate over a snapshot, callers close polls while iterating
+        polls = [
+            replace(poll)
+            for poll in self._open_polls.values()
+            if poll.creation_time < created_before
+        ]
+        for poll in polls:
+            yield poll
+
+    async def get_poll_result(self, poll_id: str) -> PollResult:
+        result = self._results.get(poll_id)
+        if result is None:
+            raise NotFoundException(poll_id)
+
+        return result
+
+    async def get_latest_poll_stats(self, group_id: int) -> PollStats | None:
+        for poll in reversed(self._group_polls.get(group_id, [])):
+            counts = self._poll_stats.get(poll.id)
+            if counts is not None:
+                return PollStats(
+                    poll_id=poll.id,
+                    creation_time=poll.creation_time,
+                    voter_count=counts.voter_count,
+                    option_counts=list(counts.option_counts),
+                )
+
+        return None
+
+    async def get_user_stats(self, *, user_id: int, group_id: int) -> UserStats | None:
+        counts = self._user_stats.get((user_id, group_id))
+        if counts is None:
+            return None
+
+        return UserStats(
+            user_id=user_id,
+            group_id=group_id,
+            answer_count=counts.answer_count,
+            option_sum=counts.option_sum,
+            current_streak=counts.current_streak,
+            longest_streak=counts.longest_streak,
+        )
+
+    async def rebuild_stats(self) -> int:
+        poll_numbers: dict[str, int] = {}
+        for group_polls in self._group_polls.values():
+            for number, poll in enumerate(group_polls):
+                poll_numbers[poll.id] = number
+
+        poll_stats: dict[str, _PollCounts] = {}
+        participation: dict[tuple[int, int], list[tuple[int, Poll]]] = {}
+        user_stats: dict[tuple[int, int], _UserGroupCounts] = {}
+        for (user_id, poll_id), answer in self._answers.items():
+            poll = self._polls[poll_id]
+            poll_counts = poll_stats.setdefault(poll_id, _PollCounts())
+            key = (user_id, poll.group_id)
+            user_counts = user_stats.setdefault(key, _UserGroupCounts())
+            participation.setdefault(key, []).append((poll_numbers[poll_id], poll))
+
+            if (option := answer.option) is not None:
+                poll_counts.option_counts[option] += 1
+                poll_counts.voter_count += 1
+                user_counts.answer_count += 1
+                user_counts.option_sum += option
+
+        for key, answered in participation.items():
+            answered.sort(key=lambda entry: entry[0])
+            user_counts = user_stats[key]
+            streak = 0
+            previous_number: int | None = None
+            for number, _ in answered:
+                if previous_number is not None and number == previous_number + 1:
+                    streak += 1
+                else:
+                    streak = 1
+                user_counts.longest_streak = max(user_counts.longest_streak, streak)
+                previous_number = number
+
+            user_counts.current_streak = streak
+            user_counts.last_poll_time = answered[-1][1].creation_time
+
+        mismatches = _count_differences(self._poll_stats, poll_stats)
+        mismatches += _count_differences(self._user_stats, user_stats)
+        self._poll_stats = poll_stats
+        self._user_stats = user_stats
+        return mismatches
+
+    async def upsert_user(self, user: User) -> None:
+        self._users[user.id] = user
+
+    async def add_to_group(self, *, user_id: int, group_id: int) -> None:
+        self._memberships.add((user_id, group_id))
+
+    async def insert_poll(self, poll: Poll) -> None:
+        await self.insert_polls([poll])
+
+    async def insert_polls(self, polls: Collection[Poll]) -> None:
+        for poll in polls:
+            if poll.id in self._polls:
+                raise DuplicateException(poll.id)
+
+        for poll in polls:
+            self._store_poll(poll)
+
+    async def update_poll_close_time(
+        self,
+        poll_id: str,
+        close_time: datetime,
+    ) -> None:
+        await self.update_polls_close_time([poll_id], close_time)
+
+    async def update_polls_close_time(
+        self,
+        poll_ids: Collection[str],
+        close_time: datetime,
+    ) -> None:
+        for poll_id in poll_ids:
+            poll = self._polls.get(poll_id)
+            if poll is not None:
+                poll.close_time = close_time
+                self._open_polls.pop(poll_id, None)
+
+    async def insert_poll_results(self, results: Collection[PollResult]) -> None:
+        for result in results:
+            self._results[result.poll_id] = result
+
+    async def upsert_answer(self, poll_answer: PollAnswer) -> None:
+        self._store_answer(poll_answer)
+
+    async def record_answer(self, user: User, poll_answer: PollAnswer) -> None:
+        poll = self._get_poll(poll_answer.poll_id)
+        self._users[user.id] = user
+        self._store_answer(poll_answer)
+        self._memberships.add((user.id, poll.group_id))
+
+    async def write_batch(self, batch: WriteBatch) -> None:
+        for user in batch.users:
+            self._users[user.id] = user
+
+        dropped = 0
+        for answer in batch.answers:
+            if answer.poll_id in self._polls:
+                self._store_answer(answer)
+            else:
+                dropped += 1
+        if dropped:
+            _logger.warning("Dropped %d answers to unknown polls", dropped)
+
+        self._memberships.update(batch.memberships)
+        for user_id, poll_id in batch.poll_memberships:
+            if (poll := self._polls.get(poll_id)) is not None:
+                self._memberships.add((user_id, poll.group_id))
+
+    async def export_answers(
+        self,
+        output: Path | BinaryIO,
+        *,
+        export_format: ExportFormat,
+        group_id: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        if export_format == ExportFormat.csv:
+            writer.writerow(_EXPORT_COLUMNS)
+
+        count = 0
+        for (user_id, poll_id), answer in self._answers.items():
+            poll = self._polls[poll_id]
+            if group_id is not None and poll.group_id != group_id:
+                continue
+            if since is not None and poll.creation_time < since:
+                continue
+            if until is not None and poll.creation_time >= until:
+                continue
+
+            values = (
+                poll.group_id,
+                poll.id,
+                poll.message_id,
+                poll.creation_time.isoformat(),
+                user_id,
+                self._users[user_id].first_name,
+                answer.time.isoformat(),
+                answer.get_option_value(),
+            )
+            match export_format:
+                case ExportFormat.csv:
+                    writer.writerow(values)
+                case ExportFormat.jsonl:
+                    buffer.write(json.dumps(dict(zip(_EXPORT_COLUMNS, values))))
+                    buffer.write("\n")
+            count += 1
+
+        data = buffer.getvalue().encode("utf-8")
+        if isinstance(output, Path):
+            output.write_bytes(data)
+        else:
+            output.write(data)
+
+        return count
+
+    async def import_answers(
+        self,
+        records: Iterable[HistoryRecord],
+    ) -> ImportResult:
+        staged_rows = 0
+        valid_rows = 0
+        latest: dict[tuple[int, str], HistoryRecord] = {}
+        for record in records:
+            staged_rows += 1
+            option = record[7]
+            if option is not None and not 0 <= option < len(PollOption):
+                continue
+
+            valid_rows += 1
+            key = (record[4], record[1])
+            current = latest.get(key)
+            if current is None or current[6] < record[6]:
+                latest[key] = record
+
+        users: dict[int, HistoryRecord] = {}
+        polls: dict[str, Poll] = {}
+        for record in latest.values():
+            group_id, poll_id, message_id, poll_time, user_id, _, answer_time, _ = (
+                record
+            )
+            if (user := users.get(user_id)) is None or user[6] < answer_time:
+                users[user_id] = record
+
+            poll = polls.get(poll_id)
+            if poll is None:
+                polls[poll_id] = Poll(
+                    id=poll_id,
+                    group_id=group_id,
+                    message_id=message_id,
+                    creation_time=poll_time,
+                    close_time=answer_time,
+                )
+            else:
+                poll.group_id = min(poll.group_id, group_id)
+                poll.message_id = min(poll.message_id, message_id)
+                poll.creation_time = min(poll.creation_time, poll_time)
+                poll.close_time = max(answer_time, poll.close_time or answer_time)
+
+        users_inserted = 0
+        users_updated = 0
+        for user_id, record in users.items():
+            existing = self._users.get(user_id)
+            if existing is None:
+                users_inserted += 1
+            elif existing.first_name != record[5]:
+                users_updated += 1
+            else:
+                continue
+            self._users[user_id] = User(id=user_id, first_name=record[5])
+
+        polls_inserted = 0
+        for poll in polls.values():
+            if poll.id not in self._polls:
+                self._store_poll(poll)
+                polls_inserted += 1
+
+        memberships = {(record[4], record[0]) for record in latest.values()}
+        memberships_inserted = len(memberships - self._memberships)
+        self._memberships.update(memberships)
+
+        answers_inserted = 0
+        answers_updated = 0
+        for (user_id, poll_id), record in latest.items():
+            option = record[7]
+            answer = PollAnswer(
+                time=record[6],
+                option=None if option is None else PollOption(option),
+                user_id=user_id,
+                poll_id=poll_id,
+            )
+            # Older history doesn't replace newer votes
+            existing = self._answers.get((user_id, poll_id))
+            if existing is not None and existing.time >= answer.time:
+                continue
+
+            if self._store_answer(answer):
+                answers_inserted += 1
+            else:
+                answers_updated += 1
+
+        # Like Postgres, imported answers aren't counted one by one
+        await self.rebuild_stats()
+
+        return ImportResult(
+            staged_rows=staged_rows,
+            skipped_rows=staged_rows - valid_rows,
+            users_inserted=users_inserted,
+            users_updated=users_updated,
+            polls_inserted=polls_inserted,
+            memberships_inserted=memberships_inserted,
+            answers_inserted=answers_inserted,
+            answers_updated=answers_updated,
+        )
+
+    async def get_chats(self) -> list[Chat]:
+        return list(self._chats.values())
+
+    async def insert_chats(self, chat_ids: Collection[int]) -> int:
+        inserted = 0
+        for chat_id in chat_ids:
+            if chat_id not in self._chats:
+                self._chats[chat_id] = Chat(
+                    id=chat_id,
+                    is_enabled=True,
+                    timezone_name=None,
+                    send_time=None,
+                    memes_enabled=True,
+                )
+                inserted += 1
+
+        self._notify_chat_listeners()
+        return inserted
+
+    def update_chat(self, chat: Chat) -> None:
+        # Stands in for editing the chats table
+        self._chats[chat.id] = chat
+        self._notify_chat_listeners()
+
+    def _notify_chat_listeners(self) -> None:
+        for listener in list(self._chat_listeners):
+            listener()
+
+    @asynccontextmanager
+    async def listen_for_chat_changes(
+        self,
+        callback: Callable[[], None],
+    ) -> AsyncIterator[None]:
+        self._chat_listeners.append(callback)
+        try:
+            yield
+        finally:
+            self._chat_listeners.remove(callback)
+
+    async def get_last_scheduled_run(self, job: str) -> datetime | None:
+        return self._last_scheduled_runs.get(job)
+
+    async def claim_scheduled_run(self, job: str, scheduled_for: datetime) -> bool:
+        last_run = self._last_scheduled_runs.get(job)
+        if last_run is not None and last_run >= scheduled_for:
+            return False
+
+        self._last_scheduled_runs[job] = scheduled_for
+        return True
+
+    async def get_memes(self) -> list[Meme]:
+        return list(self._memes.values())
+
+    async def get_meme_content(self, meme_id: int) -> bytes | None:
+        return self._meme_contents.get(meme_id)
+
+    async def insert_meme(
+        self,
+        *,
+        kind: MemeKind,
+        weekday: int,
+        weight: int,
+        file_name: str,
+        content: bytes,
+    ) -> Meme:
+        meme = Meme(
+            id=max((*self._memes, *self._disabled_memes), default=0) + 1,
+            kind=kind,
+            weekday=weekday,
+            weight=weight,
+            file_name=file_name,
+            file_id=None,
+            last_sent_at=None,
+        )
+        self._memes[meme.id] = meme
+        self._meme_contents[meme.id] = content
+        return meme
+
+    def add_meme(self, meme: Meme) -> None:
+        # Stands in for memes inserted with a file_id, like the ones from V7
+        self._memes[meme.id] = meme
+
+    async def set_meme_file_id(self, meme_id: int, file_id: str | None) -> None:
+        meme = self._memes.get(meme_id)
+        if meme is None:
+            return
+
+        if file_id is None and meme_id not in self._meme_contents:
+            self._disabled_memes.add(meme_id)
+            del self._memes[meme_id]
+        else:
+            self._memes[meme_id] = replace(meme, file_id=file_id)
+
+    async def set_memes_last_sent(
+        self,
+        meme_ids: Collection[int],
+        sent_at: datetime,
+    ) -> None:
+        for meme_id in meme_ids:
+            if (meme := self._memes.get(meme_id)) is not None:
+                self._memes[meme_id] = replace(meme, last_sent_at=sent_at)
+
+    async def create_poll_partitions(self, *, since: datetime, until: datetime) -> int:
+        # Like the default partitions in Postgres, polls outside of any
+        # partition get theirs too
+        for poll in self._polls.values():
+            if not self._is_partitioned(poll.creation_time):
+                since = min(since, poll.creation_time)
+                until = max(until, poll.creation_time)
+
+        created = 0
+        for start, end in _months(since, until):
+            if start in self._poll_partitions or start in self._detached_partitions:
+                continue
+
+            suffix = start.strftime("y%Ym%m")
+            self._poll_partitions[start] = PollPartition(
+                polls_table=f"polls_{suffix}",
+                answers_table=f"poll_answers_{suffix}",
+                start=start,
+                end=end,
+            )
+            created += 1
+
+        return created
+
+    def _is_partitioned(self, time: datetime) -> bool:
+        return any(
+            partition.start <= time < partition.end
+            for partitions in (self._poll_partitions, self._detached_partitions)
+            for partition in partitions.values()
+        )
+
+    async def get_poll_partitions(self) -> list[PollPartition]:
+        return sorted(self._poll_partitions.values(), key=lambda p: p.start)
+
+    async def detach_poll_partition(self, partition: PollPartition) -> None:
+        self._remove_polls(partition)
+        self._poll_partitions.pop(partition.start, None)
+        self._detached_partitions[partition.start] = partition
+
+    async def drop_poll_partition(self, partition: PollPartition) -> None:
+        self._remove_polls(partition)
+        self._poll_partitions.pop(partition.start, None)
+        self._detached_partitions.pop(partition.start, None)
+
+    def _remove_polls(self, partition: PollPartition) -> None:
+        # Results and stats stay, like their tables do in Postgres
+        removed = {
+            poll_id
+            for poll_id, poll in self._polls.items()
+            if partition.start <= poll.creation_time < partition.end
+        }
+        for poll_id in removed:
+            poll = self._polls.pop(poll_id)
+            self._open_polls.pop(poll_id, None)
+            self._group_polls[poll.group_id].remove(poll)
+
+        self._answers = {
+            key: answer
+            for key, answer in self._answers.items()
+            if key[1] not in removed
+        }
+
+
+def _months(since: datetime, until: datetime) -> Iterator[tuple[datetime, datetime]]:
+    # Partitions cover UTC months
+    since = since.astimezone(UTC)
+    year, month = since.year, since.month
+    while (start := datetime(year, month, 1, tzinfo=UTC)) <= until:
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        yield start, datetime(year, month, 1, tzinfo=UTC)
+
+
+def _count_differences[K, V](current: dict[K, V], rebuilt: dict[K, V]) -> int:
+    # Like the symmetric EXCEPT in rebuild_answer_stats(), a changed entry
+    # counts once for each side.
+    differences = 0
+    for key, value in current.items():
+        if rebuilt.get(key) != value:
+            differences += 1
+    for key, value in rebuilt.items():
+        if current.get(key) != value:
+            differences += 1
+    return differences
@@ -1,19 +1,76 @@
+import asyncio
+import contextlib
 import logging
-from typing import TYPE_CHECKING, cast
+import time
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING, Any, cast
 
 import asyncpg
 
-from bot.database import Database, NotFoundException, OperationalException
-from bot.model import Poll, PollAnswer, User
+from bot import tracing
+from bot.database import (
+    Database,
+    ExportFormat,
+    ImportResult,
+    NotFoundException,
+    OperationalException,
+    PollPartition,
+    WriteBatch,
+)
+from bot.meme import Meme, MemeKind
+from bot.metrics import REGISTRY
+from bot.model import (
+    Chat,
+    Poll,
+    PollAnswer,
+    PollResult,
+    PollStats,
+    User,
+    UserStats,
+)
 
 if TYPE_CHECKING:
-    from collections.abc import AsyncIterable
-    from datetime import datetime
+    from collections.abc import (
+        AsyncIterable,
+        AsyncIterator,
+        Callable,
+        Collection,
+        Iterable,
+    )
+    from pathlib import Path
+    from typing import BinaryIO
 
     from bot.config import DatabaseConfig
+    from bot.database import HistoryRecord
 
 _logger = logging.getLogger(__name__)
 
+_CHATS_CHANNEL = "chats_changed"
+# Polls are partitioned by creation time, but answers and closing only know
+# the poll ID. Polls are looked up among those created within this window
+# before the answer or close time first, and only then in older partitions.
+_POLL_LOOKUP_WINDOW = timedelta(days=7)
+# Sent as -infinity and infinity
+_BEGINNING_OF_TIME = datetime.min.replace(tzinfo=UTC)
+_END_OF_TIME = datetime.max.replace(tzinfo=UTC)
+_MAX_LISTEN_RETRY_DELAY = 30.0
+
+_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "mood_db_pool_wait_seconds",
+    "Time spent waiting for a pool connection",
+)
+_OPERATION_SECONDS = REGISTRY.histogram(
+    "mood_db_operation_seconds",
+    "Time a database operation held its connection",
+    ("operation",),
+)
+_OPERATION_ERRORS = REGISTRY.counter(
+    "mood_db_operation_errors_total",
+    "Failed database operations",
+    ("operation",),
+)
+
 
 class PostgresDatabase(Database):
     def __init__(self, config: DatabaseConfig) -> None:
@@ -28,24 +85,64 @@ class PostgresDatabase(Database):
 
         return pool
 
+    @asynccontextmanager
+    async def _connection(self, operation: str) -> AsyncIterator[asyncpg.Connection]:
+        with tracing.span(op="db", name=operation):
+            start = time.perf_counter()
+            async with self._pool.acquire() as connection:
+                acquired = time.perf_counter()
+                _POOL_WAIT_SECONDS.observe(acquired - start)
+                try:
+                    yield cast(asyncpg.Connection, connection)
+                except Exception:
+                    _OPERATION_ERRORS.inc(operation)
+                    raise
+                finally:
+                    duration = time.perf_counter() - acquired
+                    _OPERATION_SECONDS.observe(duration, operation)
+
     async def open(self) -> None:
         if self.__pool is not None:
             raise ValueError("Already initialized")
 
         _logger.info("Opening connection pool")
         config = self.__config
+        pool_config = config.pool
         try:
             self.__pool = await asyncpg.create_pool(
                 database=config.name,
                 user=config.username,
                 password=config.password,
                 host=config.host,
-                min_size=1,
-                max_size=4,
+                min_size=pool_config.min_size,
+                max_size=pool_config.max_size,
+                max_queries=pool_config.max_queries,
+                max_inactive_connection_lifetime=(
+                    pool_config.max_inactive_connection_lifetime_seconds
+                ),
+                statement_cache_size=pool_config.statement_cache_size,
+                command_timeout=pool_config.command_timeout_seconds,
             )
         except asyncpg.PostgresConnectionError as e:
             raise OperationalException from e
 
+        pool = self.__pool
+        REGISTRY.gauge(
+            "mood_db_pool_size",
+            "Open connections in the pool",
+            pool.get_size,
+        )
+        REGISTRY.gauge(
+            "mood_db_pool_idle",
+            "Idle connections in the pool",
+            pool.get_idle_size,
+        )
+        REGISTRY.gauge(
+            "mood_db_pool_max_size",
+            "Maximum number of connections in the pool",
+            pool.get_max_size,
+        )
+
     async def can_connect(self) -> bool:
         try:
             async with self._pool.acquire():
@@ -59,22 +156,262 @@ class PostgresDatabase(Database):
         await self._pool.close()
         _logger.debug("Connection pool is closed")
 
+    async def export_answers(
+        self,
+        output: Path | BinaryIO,
+        *,
+        export_format: ExportFormat,
+        group_id: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        query = """
+            SELECT
+                polls.group_id,
+                polls.id AS poll_id,
+                polls.message_id,
+                polls.creation_time AS poll_time,
+                users.id AS user_id,
+                users.first_name,
+                poll_answers.time AS answer_time,
+                poll_answers.option
+            FROM poll_answers
+            JOIN polls
+                ON polls.id = poll_answers.poll_id
+                AND polls.creation_time = poll_answers.poll_time
+            JOIN users ON users.id = poll_answers.user_id
+            WHERE ($1::bigint IS NULL OR polls.group_id = $1)
+                AND polls.creation_time >= $2 AND polls.creation_time < $3
+                AND poll_answers.poll_time >= $2 AND poll_answers.poll_time < $3
+        """
+
+        match export_format:
+            case ExportFormat.csv:
+                copy_options: dict[str, Any] = {"format": "csv", "header": True}
+            case ExportFormat.jsonl:
+                query = f"SELECT row_to_json(answer)::text FROM ({query}) answer"
+                # CSV with quote and delimiter characters that JSON never
+                # contains unescaped passes each line through verbatim.
+                copy_options = {
+                    "format": "csv",
+                    "quote": "\x01",
+                    "delimiter": "\x02",
+                }
+
+        async with self._connection("export_answers") as connection:
+            status = await connection.copy_from_query(
+                query,
+                group_id,
+                # Bounds on both tables, so both only scan the partitions
+                # in range
+                since or _BEGINNING_OF_TIME,
+                until or _END_OF_TIME,
+                output=output,
+                **copy_options,
+            )
+
+        return int(status.rsplit(" ", 1)[-1])
+
+    async def import_answers(
+        self,
+        records: Iterable[HistoryRecord],
+    ) -> ImportResult:
+        async with self._connection("import_answers") as connection:
+            async with connection.transaction():
+                await connection.execute(
+                    """
+                    CREATE TEMP TABLE import_answers(
+                        group_id bigint not null,
+                        poll_id text not null,
+                        message_id bigint not null,
+                        poll_time timestamptz not null,
+                        user_id bigint not null,
+                        first_name text not null,
+                        answer_time timestamptz not null,
+                        option integer
+                    ) ON COMMIT DROP;
+                    """
+                )
+                status = await connection.copy_records_to_table(
+                    "import_answers",
+                    records=records,
+                )
+                staged_rows = int(status.rsplit(" ", 1)[-1])
+
+                # Only the latest row per answer counts, invalid options are
+                # skipped instead of failing the import.
+                await connection.execute(
+                    """
+                    CREATE TEMP TABLE import_latest_answers ON COMMIT DROP AS
+                    SELECT DISTINCT ON (user_id, poll_id) *
+                    FROM import_answers
+                    WHERE option IS NULL OR option BETWEEN 0 AND 3
+                    ORDER BY user_id, poll_id, answer_time DESC;
+                    """
+                )
+                valid_rows = await connection.fetchval(
+                    """
+                    SELECT count(*) FROM import_answers
+                    WHERE option IS NULL OR option BETWEEN 0 AND 3;
+                    """
+                )
+
+                # xmax is only set for rows that were updated
+                users = await connection.fetchrow(
+                    """
+                    WITH merged AS (
+                        INSERT INTO users(id, first_name)
+                        SELECT DISTINCT ON (user_id) user_id, first_name
+                        FROM import_latest_answers
+                        ORDER BY user_id, answer_time DESC
+                        ON CONFLICT(id) DO UPDATE SET
+                            first_name = excluded.first_name
+                        WHERE users.first_name IS DISTINCT FROM excluded.first_name
+                        RETURNING xmax = 0 AS inserted
+                    )
+                    SELECT
+                        count(*) FILTER (WHERE inserted) AS inserted,
+                        count(*) FILTER (WHERE NOT inserted) AS updated
+                    FROM merged;
+                    """
+                )
+                # History may go back further than the partitions
+                await connection.execute(
+                    """
+                    SELECT create_poll_partitions(min(poll_time), max(poll_time))
+                    FROM import_latest_answers;
+                    """
+                )
+                # Poll IDs are only unique together with the creation time
+                # in the table, so existing polls are looked up by ID alone
+                polls_status = await connection.execute(
+                    """
+                    INSERT INTO polls(id, group_id, message_id, creation_time, close_time)
+                    SELECT
+                        poll_id,
+                        min(group_id),
+                        min(message_id),
+                        min(poll_time),
+                        max(answer_time)
+                    FROM import_latest_answers i
+                    WHERE NOT EXISTS (SELECT FROM polls WHERE polls.id = i.poll_id)
+                    GROUP BY poll_id;
+                    """
+                )
+                memberships_status = await connection.execute(
+                    """
+                    INSERT INTO users_groups(user_id, group_id)
+                    SELECT DISTINCT user_id, group_id
+                    FROM import_latest_answers
+                    ON CONFLICT(user_id, group_id) DO NOTHING;
+                    """
+                )
+                # Updating the stats row by row is slow and gets streaks wrong
+                # for answers that arrive out of order, they are rebuilt for
+                # the imported groups below instead. Disabling the trigger
+                # also keeps the bot's answers out until the import commits.
+                await connection.execute(
+                    "ALTER TABLE poll_answers DISABLE TRIGGER poll_answers_stats;"
+                )
+                answers = await connection.fetchrow(
+                    """
+                    WITH merged AS (
+                        INSERT INTO poll_answers(user_id, poll_id, poll_time, time, option)
+                        SELECT i.user_id, i.poll_id, polls.creation_time, i.answer_time, i.option
+                        FROM import_latest_answers i
+                        JOIN polls ON polls.id = i.poll_id
+                        ON CONFLICT(user_id, poll_id, poll_time) DO UPDATE SET
+                            time = excluded.time,
+                            option = excluded.option
+                        -- History overlapping live answers doesn't replace
+                        -- newer votes with older ones
+                        WHERE (poll_answers.time, poll_answers.option)
+                            IS DISTINCT FROM (excluded.time, excluded.option)
+                            AND excluded.time > poll_answers.time
+                        RETURNING user_id, poll_id, poll_time
+                    )
+                    SELECT
+                        count(*) FILTER (WHERE existing.user_id IS NULL) AS inserted,
+                        count(existing.user_id) AS updated
+                    FROM merged
+                    -- Partitions have no xmax to tell, but the join still
+                    -- sees the answers from before the insert
+                    LEFT JOIN poll_answers existing
+                        USING (user_id, poll_id, poll_time);
+                    """
+                )
+                await connection.execute(
+                    """
+                    SELECT rebuild_group_stats(array_agg(DISTINCT polls.group_id))
+                    FROM import_latest_answers i
+                    JOIN polls ON polls.id = i.poll_id;
+                    """
+                )
+                await connection.execute(
+                    "ALTER TABLE poll_answers ENABLE TRIGGER poll_answers_stats;"
+                )
+
+        return ImportResult(
+            staged_rows=staged_rows,
+            skipped_rows=staged_rows - valid_rows,
+            users_inserted=users["inserted"],
+            users_updated=users["updated"],
+            polls_inserted=int(polls_status.rsplit(" ", 1)[-1]),
+            memberships_inserted=int(memberships_status.rsplit(" ", 1)[-1]),
+            answers_inserted=answers["inserted"],
+            answers_updated=answers["updated"],
+        )
+
     @staticmethod
     def _poll_from_row(row: asyncpg.Record) -> Poll:
+        # Columns: id, group_id, message_id, creation_time, close_time
         return Poll(
-            id=row["id"],
-            group_id=row["group_id"],
-            message_id=row["message_id"],
-            creation_time=row["creation_time"],
-            close_time=row["close_time"],
+            id=row[0],
+            group_id=row[1],
+            message_id=row[2],
+            creation_time=row[3],
+            close_time=row[4],
         )
 
     async def get_poll(self, poll_id: str) -> Poll:
-        async with self._pool.acquire() as connection:
-            connection = cast(asyncpg.Connection, connection)
+        async with self._connection("get_poll") as connection:
+            for since, until in _lookup_windows(datetime.now(tz=UTC)):
+                row = await connection.fetchrow(
+                    """
+                    SELECT id, group_id, message_id, creation_time, close_time
+                    FROM polls
+                    WHERE id = $1 AND creation_time >= $2 AND creation_time < $3;
+                    """,
+                    poll_id,
+                    since,
+                    until,
+                )
+                if row is not None:
+                    return self._poll_from_row(row)
+
+            raise NotFoundException(poll_id)
+
+    async def get_open_polls(self, *, created_before: datetime) -> AsyncIterable[Poll]:
+        async with self._connection("get_open_polls") as connection:
+            # Server-side cursors only exist within a transaction
+            async with connection.transaction():
+                async for row in connection.cursor(
+                    """
+                    SELECT id, group_id, message_id, creation_time, close_time
+                    FROM polls
+                    WHERE close_time IS NULL AND creation_time < $1;
+                    """,
+                    created_before,
+                ):
+                    yield self._poll_from_row(row)
+
+    async def get_poll_result(self, poll_id: str) -> PollResult:
+        async with self._connection("get_poll_result") as connection:
             row = await connection.fetchrow(
                 """
-                SELECT * FROM polls WHERE id = $1;
+                SELECT poll_id, total_voter_count, option_counts
+                FROM poll_results
+                WHERE poll_id = $1;
                 """,
                 poll_id,
             )
@@ -82,22 +419,82 @@ class PostgresDatabase(Database):
             if row is None:
                 raise NotFoundException(poll_id)
 
-            return self._poll_from_row(row)
+            return PollResult(
+                poll_id=row[0],
+                total_voter_count=row[1],
+                option_counts=row[2],
+            )
 
-    async def get_open_polls(self) -> AsyncIterable[Poll]:
-        async with self._pool.acquire() as connection:
-            connection = cast(asyncpg.Connection, connection)
-            records = await connection.fetch(
+    async def get_latest_poll_stats(self, group_id: int) -> PollStats | None:
+        async with self._connection("get_latest_poll_stats") as connection:
+            row = await connection.fetchrow(
                 """
-                SELECT * FROM polls WHERE close_time is null;
+                SELECT
+                    polls.id,
+                    polls.creation_time,
+                    stats.voter_count,
+                    stats.option_counts
+                FROM polls
+                JOIN poll_stats stats ON stats.poll_id = polls.id
+                WHERE polls.group_id = $1
+                ORDER BY polls.creation_time DESC
+                LIMIT 1;
+                """,
+                group_id,
+            )
+
+            if row is None:
+                return None
+
+            return PollStats(
+                poll_id=row[0],
+                creation_time=row[1],
+                voter_count=row[2],
+                option_counts=row[3],
+            )
+
+    async def get_user_stats(self, *, user_id: int, group_id: int) -> UserStats | None:
+        async with self._connection("get_user_stats") as connection:
+            row = await connection.fetchrow(
                 """
+                SELECT
+                    user_id,
+                    group_id,
+                    answer_count,
+                    option_sum,
+                    current_streak,
+                    longest_streak
+                FROM user_group_stats
+                WHERE user_id = $1 AND group_id = $2;
+                """,
+                user_id,
+                group_id,
             )
-            for row in records:
-                yield self._poll_from_row(row)
+
+            if row is None:
+                return None
+
+            return UserStats(
+                user_id=row[0],
+                group_id=row[1],
+                answer_count=row[2],
+                option_sum=row[3],
+                current_streak=row[4],
+                longest_streak=row[5],
+            )
+
+    async def rebuild_stats(self) -> int:
+        async with self._connection("rebuild_stats") as connection:
+            async with connection.transaction():
+                mismatches = await connection.fetchval(
+                    """
+                    SELECT rebuild_answer_stats();
+                    """
+                )
+                return cast(int, mismatches)
 
     async def upsert_user(self, user: User) -> None:
-        async with self._pool.acquire() as connection:
-            connection = cast(asyncpg.Connection, connection)
+        async with self._connection("upsert_user") as connection:
             await connection.execute(
                 """
                 INSERT INTO users(id, first_name)
@@ -110,8 +507,7 @@ class PostgresDatabase(Database):
             )
 
     async def add_to_group(self, *, user_id: int, group_id: int) -> None:
-        async with self._pool.acquire() as connection:
-            connection = cast(asyncpg.Connection, connection)
+        async with self._connection("add_to_group") as connection:
             await connection.execute(
                 """
                 INSERT INTO users_groups(user_id, group_id)
@@ -123,8 +519,7 @@ class PostgresDatabase(Database):
             )
 
     async def insert_poll(self, poll: Poll) -> None:
-        async with self._pool.acquire() as connection:
-            connection = cast(asyncpg.Connection, connection)
+        async with self._connection("insert_poll") as connection:
             await connection.execute(
                 """
                 INSERT INTO polls(id, group_id, message_id, creation_time, close_time)
@@ -137,36 +532,530 @@ class PostgresDatabase(Database):
                 poll.close_time,
             )
 
+    async def insert_polls(self, polls: Collection[Poll]) -> None:
+        async with self._connection("insert_polls") as connection:
+            await connection.execute(
+                """
+                INSERT INTO polls(id, group_id, message_id, creation_time, close_time)
+                SELECT * FROM unnest(
+                    $1::text[],
+                    $2::bigint[],
+                    $3::bigint[],
+                    $4::timestamptz[],
+                    $5::timestamptz[]
+                );
+                """,
+                [poll.id for poll in polls],
+                [poll.group_id for poll in polls],
+                [poll.message_id for poll in polls],
+                [poll.creation_time for poll in polls],
+                [poll.close_time for poll in polls],
+            )
+
     async def update_poll_close_time(
         self,
         poll_id: str,
         close_time: datetime,
     ) -> None:
-        async with self._pool.acquire() as connection:
-            connection = cast(asyncpg.Connection, connection)
+        await self.update_polls_close_time([poll_id], close_time)
+
+    async def update_polls_close_time(
+        self,
+        poll_ids: Collection[str],
+        close_time: datetime,
+    ) -> None:
+        async with self._connection("update_polls_close_time") as connection:
+            updated = 0
+            for since, until in _lookup_windows(close_time):
+                status = await connection.execute(
+                    """
+                    UPDATE polls
+                    SET close_time = $2
+                    WHERE id = ANY($1::text[])
+                        AND creation_time >= $3 AND creation_time < $4;
+                    """,
+                    list(poll_ids),
+                    close_time,
+                    since,
+                    until,
+                )
+                updated += int(status.rsplit(" ", 1)[-1])
+                if updated >= len(poll_ids):
+                    break
+
+    async def insert_poll_results(self, results: Collection[PollResult]) -> None:
+        async with self._connection("insert_poll_results") as connection:
+            await connection.executemany(
+                """
+                INSERT INTO poll_results(poll_id, total_voter_count, option_counts)
+                VALUES ($1, $2, $3)
+                ON CONFLICT(poll_id) DO UPDATE SET
+                    total_voter_count = $2,
+                    option_counts = $3;
+                """,
+                [
+                    (result.poll_id, result.total_voter_count, result.option_counts)
+                    for result in results
+                ],
+            )
+
+    async def upsert_answer(self, poll_answer: PollAnswer) -> None:
+        async with self._connection("upsert_answer") as connection:
+            for since, until in _lookup_windows(poll_answer.time):
+                status = await connection.execute(
+                    """
+                    INSERT INTO poll_answers(user_id, poll_id, poll_time, time, option)
+                    SELECT $1, id, creation_time, $3, $4
+                    FROM polls
+                    WHERE id = $2 AND creation_time >= $5 AND creation_time < $6
+                    ON CONFLICT(user_id, poll_id, poll_time) DO UPDATE SET
+                        time = $3,
+                        option = $4
+                    """,
+                    poll_answer.user_id,
+                    poll_answer.poll_id,
+                    poll_answer.time,
+                    poll_answer.get_option_value(),
+                    since,
+                    until,
+                )
+                if int(status.rsplit(" ", 1)[-1]):
+                    return
+
+            raise NotFoundException(poll_answer.poll_id)
+
+    async def record_answer(self, user: User, poll_answer: PollAnswer) -> None:
+        async with self._connection("record_answer") as connection:
+            for since, until in _lookup_windows(poll_answer.time):
+                # Foreign keys are checked at the end of the statement, so the
+                # answer and membership may reference the user upserted here.
+                # Nothing is written unless the poll is in the window.
+                found = await connection.fetchval(
+                    """
+                    WITH poll AS (
+                        SELECT id, group_id, creation_time
+                        FROM polls
+                        WHERE id = $3 AND creation_time >= $6 AND creation_time < $7
+                    ), upserted_user AS (
+                        INSERT INTO users(id, first_name)
+                        SELECT $1, $2 FROM poll
+                        ON CONFLICT(id) DO UPDATE SET
+                            first_name = $2
+                    ), upserted_answer AS (
+                        INSERT INTO poll_answers(user_id, poll_id, poll_time, time, option)
+                        SELECT $1, id, creation_time, $4, $5 FROM poll
+                        ON CONFLICT(user_id, poll_id, poll_time) DO UPDATE SET
+                            time = $4,
+                            option = $5
+                    ), added_membership AS (
+                        INSERT INTO users_groups(user_id, group_id)
+                        SELECT $1, group_id FROM poll
+                        ON CONFLICT(user_id, group_id) DO NOTHING
+                    )
+                    SELECT count(*) FROM poll;
+                    """,
+                    user.id,
+                    user.first_name,
+                    poll_answer.poll_id,
+                    poll_answer.time,
+                    poll_answer.get_option_value(),
+                    since,
+                    until,
+                )
+                if found:
+                    return
+
+            raise NotFoundException(poll_answer.poll_id)
+
+    async def write_batch(self, batch: WriteBatch) -> None:
+        # All answers of a batch came in around the same time
+        oldest = min(
+            (answer.time for answer in batch.answers),
+            default=datetime.now(tz=UTC),
+        )
+        windows = _lookup_windows(oldest)
+
+        async with self._connection("write_batch") as connection:
+            async with connection.transaction():
+                if users := batch.users:
+                    await connection.execute(
+                        """
+                        INSERT INTO users(id, first_name)
+                        SELECT * FROM unnest($1::bigint[], $2::text[])
+                        ON CONFLICT(id) DO UPDATE SET
+                            first_name = excluded.first_name;
+                        """,
+                        [user.id for user in users],
+                        [user.first_name for user in users],
+                    )
+
+                if answers := batch.answers:
+                    # Answers to unknown polls are dropped instead of failing
+                    # the whole batch on the foreign key.
+                    written = 0
+                    for since, until in windows:
+                        status = await connection.execute(
+                            """
+                            INSERT INTO poll_answers(user_id, poll_id, poll_time, time, option)
+                            SELECT
+                                a.user_id,
+                                a.poll_id,
+                                polls.creation_time,
+                                a.time,
+                                a.option
+                            FROM unnest(
+                                $1::bigint[],
+                                $2::text[],
+                                $3::timestamptz[],
+                                $4::integer[]
+                            ) AS a(user_id, poll_id, time, option)
+                            JOIN polls ON polls.id = a.poll_id
+                            WHERE polls.creation_time >= $5
+                                AND polls.creation_time < $6
+                            ON CONFLICT(user_id, poll_id, poll_time) DO UPDATE SET
+                                time = excluded.time,
+                                option = excluded.option;
+                            """,
+                            [answer.user_id for answer in answers],
+                            [answer.poll_id for answer in answers],
+                            [answer.time for answer in answers],
+                            [answer.get_option_value() for answer in answers],
+                            since,
+                            until,
+                        )
+                        written += int(status.rsplit(" ", 1)[-1])
+                        if written >= len(answers):
+                            break
+
+                    if written < len(answers):
+                        _logger.warning(
+                            "Dropped %d answers to unknown polls",
+                            len(answers) - written,
+                        )
+
+                if memberships := batch.memberships:
+                    await connection.execute(
+                        """
+                        INSERT INTO users_groups(user_id, group_id)
+                        SELECT * FROM unnest($1::bigint[], $2::bigint[])
+                        ON CONFLICT(user_id, group_id) DO NOTHING;
+                        """,
+                        [user_id for user_id, _ in memberships],
+                        [group_id for _, group_id in memberships],
+                    )
+
+                if poll_memberships := batch.poll_memberships:
+                    poll_ids = {poll_id for _, poll_id in poll_memberships}
+                    found = 0
+                    for since, until in windows:
+                        found += await connection.fetchval(
+                            """
+                            WITH matched AS (
+                                SELECT DISTINCT m.user_id, m.poll_id, polls.group_id
+                                FROM unnest($1::bigint[], $2::text[])
+                                    AS m(user_id, poll_id)
+                                JOIN polls ON polls.id = m.poll_id
+                                WHERE polls.creation_time >= $3
+                                    AND polls.creation_time < $4
+                            ), added AS (
+                                INSERT INTO users_groups(user_id, group_id)
+                                SELECT DISTINCT user_id, group_id FROM matched
+                                ON CONFLICT(user_id, group_id) DO NOTHING
+                            )
+                            SELECT count(DISTINCT poll_id) FROM matched;
+                            """,
+                            [user_id for user_id, _ in poll_memberships],
+                            [poll_id for _, poll_id in poll_memberships],
+                            since,
+                            until,
+                        )
+                        if found >= len(poll_ids):
+                            break
+
+    async def get_chats(self) -> list[Chat]:
+        async with self._connection("get_chats") as connection:
+            rows = await connection.fetch(
+                """
+                SELECT id, enabled, timezone, send_time, memes_enabled
+                FROM chats;
+                """
+            )
+            return [
+                Chat(
+                    id=row[0],
+                    is_enabled=row[1],
+                    timezone_name=row[2],
+                    send_time=row[3],
+                    memes_enabled=row[4],
+                )
+                for row in rows
+            ]
+
+    async def insert_chats(self, chat_ids: Collection[int]) -> int:
+        async with self._connection("insert_chats") as connection:
+            status = await connection.execute(
+                """
+                INSERT INTO chats(id)
+                SELECT * FROM unnest($1::bigint[])
+                ON CONFLICT(id) DO NOTHING;
+                """,
+                list(chat_ids),
+            )
+            return int(status.rsplit(" ", 1)[-1])
+
+    @asynccontextmanager
+    async def listen_for_chat_changes(
+        self,
+        callback: Callable[[], None],
+    ) -> AsyncIterator[None]:
+        task = asyncio.create_task(self._listen_for_chat_changes(callback))
+        try:
+            yield
+        finally:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    async def _listen_for_chat_changes(self, callback: Callable[[], None]) -> None:
+        def _on_notification(*_: object) -> None:
+            callback()
+
+        retry_delay = 1.0
+        while True:
+            try:
+                # Holds on to a pool connection, notifications only arrive
+                # while it's open.
+                async with self._pool.acquire() as connection:
+                    lost = asyncio.Event()
+                    connection.add_termination_listener(lambda _: lost.set())
+                    await connection.add_listener(_CHATS_CHANNEL, _on_notification)
+                    # Anything could have changed while nobody listened
+                    callback()
+                    retry_delay = 1.0
+                    await lost.wait()
+                    _logger.warning("Lost connection listening for chat changes")
+            except Exception as e:
+                _logger.error(
+                    "Could not listen for chat changes, retrying in %.0f s",
+                    retry_delay,
+                    exc_info=e,
+                )
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, _MAX_LISTEN_RETRY_DELAY)
+
+    async def get_last_scheduled_run(self, job: str) -> datetime | None:
+        async with self._connection("get_last_scheduled_run") as connection:
+            last_run = await connection.fetchval(
+                """
+                SELECT last_run FROM scheduled_jobs WHERE name = $1;
+                """,
+                job,
+            )
+            return cast("datetime | None", last_run)
+
+    async def claim_scheduled_run(self, job: str, scheduled_for: datetime) -> bool:
+        # The row lock is only held for this statement, not while the job runs
+        async with self._connection("claim_scheduled_run") as connection:
+            claimed = await connection.fetchval(
+                """
+                INSERT INTO scheduled_jobs(name, last_run)
+                VALUES ($1, $2)
+                ON CONFLICT(name) DO UPDATE SET
+                    last_run = excluded.last_run
+                WHERE scheduled_jobs.last_run < excluded.last_run
+                RETURNING true;
+                """,
+                job,
+                scheduled_for,
+            )
+            return claimed is not None
+
+    async def get_memes(self) -> list[Meme]:
+        async with self._connection("get_memes") as connection:
+            rows = await connection.fetch(
+                """
+                SELECT id, kind, weekday, weight, file_name, file_id, last_sent_at
+                FROM memes
+                WHERE enabled;
+                """
+            )
+            return [_to_meme(row) for row in rows]
+
+    async def get_meme_content(self, meme_id: int) -> bytes | None:
+        async with self._connection("get_meme_content") as connection:
+            content = await connection.fetchval(
+                """
+                SELECT content FROM memes WHERE id = $1;
+                """,
+                meme_id,
+            )
+            return cast("bytes | None", content)
+
+    async def insert_meme(
+        self,
+        *,
+        kind: MemeKind,
+        weekday: int,
+        weight: int,
+        file_name: str,
+        content: bytes,
+    ) -> Meme:
+        async with self._connection("insert_meme") as connection:
+            row = await connection.fetchrow(
+                """
+                INSERT INTO memes(kind, weekday, weight, file_name, content)
+                VALUES ($1, $2, $3, $4, $5)
+                RETURNING
+                    id, kind, weekday, weight, file_name, file_id, last_sent_at;
+                """,
+                kind.name,
+                weekday,
+                weight,
+                file_name,
+                content,
+            )
+            return _to_meme(row)
+
+    async def set_meme_file_id(self, meme_id: int, file_id: str | None) -> None:
+        async with self._connection("set_meme_file_id") as connection:
             await connection.execute(
                 """
-                UPDATE polls
-                SET close_time = $2
+                UPDATE memes SET
+                    file_id = $2,
+                    enabled = enabled AND ($2 IS NOT NULL OR content IS NOT NULL)
                 WHERE id = $1;
                 """,
-                poll_id,
-                close_time,
+                meme_id,
+                file_id,
             )
 
-    async def upsert_answer(self, poll_answer: PollAnswer) -> None:
-        async with self._pool.acquire() as connection:
-            connection = cast(asyncpg.Connection, connection)
+    async def set_memes_last_sent(
+        self,
+        meme_ids: Collection[int],
+        sent_at: datetime,
+    ) -> None:
+        async with self._connection("set_memes_last_sent") as connection:
             await connection.execute(
                 """
-                INSERT INTO poll_answers(user_id, poll_id, time, option)
-                VALUES ($1, $2, $3, $4)
-                ON CONFLICT(user_id, poll_id) DO UPDATE SET
-                    time = $3,
-                    option = $4
+                UPDATE memes SET last_sent_at = $2 WHERE id = ANY($1::bigint[]);
+                """,
+                list(meme_ids),
+                sent_at,
+            )
+
+    async def create_poll_partitions(self, *, since: datetime, until: datetime) -> int:
+        async with self._connection("create_poll_partitions") as connection:
+            created = await connection.fetchval(
+                """
+                SELECT count(*) FROM create_poll_partitions($1, $2);
                 """,
-                poll_answer.user_id,
-                poll_answer.poll_id,
-                poll_answer.time,
-                poll_answer.get_option_value(),
+                since,
+                until,
+            )
+            return cast(int, created)
+
+    async def get_poll_partitions(self) -> list[PollPartition]:
+        async with self._connection("get_poll_partitions") as connection:
+            rows = await connection.fetch(
+                r"""
+                WITH partitions AS (
+                    SELECT
+                        parent.relname AS parent,
+                        child.relname AS name,
+                        pg_get_expr(child.relpartbound, child.oid) AS bound
+                    FROM pg_inherits
+                    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                    WHERE pg_inherits.inhparent IN (
+                        'polls'::regclass,
+                        'poll_answers'::regclass
+                    )
+                )
+                SELECT
+                    polls.name,
+                    answers.name,
+                    bounds[1]::timestamptz,
+                    bounds[2]::timestamptz
+                FROM partitions polls
+                LEFT JOIN partitions answers
+                    ON answers.parent = 'poll_answers' AND answers.bound = polls.bound
+                CROSS JOIN regexp_match(
+                    polls.bound,
+                    'FROM \(''(.+)''\) TO \(''(.+)''\)'
+                ) AS bounds
+                -- The default partitions hold no month to detach
+                WHERE polls.parent = 'polls' AND polls.bound <> 'DEFAULT'
+                ORDER BY 3;
+                """
             )
+            return [
+                PollPartition(
+                    polls_table=row[0],
+                    answers_table=row[1],
+                    start=row[2],
+                    end=row[3],
+                )
+                for row in rows
+            ]
+
+    async def detach_poll_partition(self, partition: PollPartition) -> None:
+        async with self._connection("detach_poll_partition") as connection:
+            async with connection.transaction():
+                await self._detach_partition(connection, partition)
+
+    async def drop_poll_partition(self, partition: PollPartition) -> None:
+        tables = [partition.polls_table]
+        if (answers_table := partition.answers_table) is not None:
+            tables.append(answers_table)
+
+        async with self._connection("drop_poll_partition") as connection:
+            async with connection.transaction():
+                # Partitions referenced by a foreign key can't be dropped
+                await self._detach_partition(connection, partition)
+                await connection.execute(
+                    f"""
+                    DROP TABLE {", ".join(map(_quote_identifier, tables))};
+                    """
+                )
+
+    @staticmethod
+    async def _detach_partition(
+        connection: asyncpg.Connection,
+        partition: PollPartition,
+    ) -> None:
+        # The answers reference the polls
+        if (answers_table := partition.answers_table) is not None:
+            await connection.execute(
+                f"""
+                ALTER TABLE poll_answers
+                DETACH PARTITION {_quote_identifier(answers_table)};
+                """
+            )
+        await connection.execute(
+            f"""
+            ALTER TABLE polls
+            DETACH PARTITION {_quote_identifier(partition.polls_table)};
+            """
+        )
+
+
+def _to_meme(row: Any) -> Meme:
+    return Meme(
+        id=row[0],
+        kind=MemeKind[row[1]],
+        weekday=row[2],
+        weight=row[3],
+        file_name=row[4],
+        file_id=row[5],
+        last_sent_at=row[6],
+    )
+
+
+def _lookup_windows(time: datetime) -> list[tuple[datetime, datetime]]:
+    # Disjoint, a poll is only ever found in one of them
+    since = time - _POLL_LOOKUP_WINDOW
+    return [(since, _END_OF_TIME), (_BEGINNING_OF_TIME, since)]
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
@@ -0,0 +1,428 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+from bot.database import Database, WriteBatch
+from bot.metrics import REGISTRY
+from bot.model import PollAnswer, PollOption, User
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterable, Callable, Collection, Iterable
+    from contextlib import AbstractAsyncContextManager
+
+    from bot.config import SpoolConfig
+    from bot.database import (
+        ExportFormat,
+        HistoryRecord,
+        ImportResult,
+        PollPartition,
+    )
+    from bot.meme import Meme, MemeKind
+    from bot.model import Chat, Poll, PollResult, PollStats, UserStats
+
+_logger = logging.getLogger(__name__)
+
+_MAX_RETRY_DELAY = 30.0
+
+_REPLAY_ERRORS = REGISTRY.counter(
+    "mood_spool_replay_errors_total",
+    "Failed attempts to replay spooled answers",
+)
+
+
+class SpooledDatabase(Database):
+    """
+    Appends answers to a local spool file and returns right away. A
+    background task replays the spool into the wrapped database in batches
+    and checkpoints how far it got, so answers survive database outages and
+    restarts. Replaying is at least once, which is fine for upserts.
+
+    Spool lines are JSON arrays: user_id, first_name, poll_id, time, option.
+    """
+
+    def __init__(self, database: Database, config: SpoolConfig) -> None:
+        self._db = database
+        self._config = config
+        directory = Path(config.directory)
+        self._spool_path = directory / "answers.spool"
+        self._checkpoint_path = directory / "answers.checkpoint"
+        self._writer: BinaryIO | None = None
+        self._reader: BinaryIO | None = None
+        # Everything before the offset has been written to the database
+        self._offset = 0
+        self._size = 0
+        self._written = asyncio.Event()
+        self._replay_lock = asyncio.Lock()
+        self._replay_task: asyncio.Task[None] | None = None
+        self._is_db_open = False
+        REGISTRY.gauge(
+            "mood_spool_pending_bytes",
+            "Spooled answers not written to the database yet",
+            lambda: self.pending_bytes,
+        )
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._size - self._offset
+
+    async def open(self) -> None:
+        self._spool_path.parent.mkdir(parents=True, exist_ok=True)
+        self._spool_path.touch()
+        reader = self._spool_path.open("rb")
+        size = _complete_size(reader)
+        writer = self._spool_path.open("ab")
+        if size < writer.tell():
+            _logger.warning("Dropping incomplete last line of the spool")
+            writer.truncate(size)
+
+        offset = self._read_checkpoint()
+        if offset > size:
+            # The spool was emptied, but the new checkpoint wasn't written
+            offset = 0
+
+        self._reader = reader
+        self._writer = writer
+        self._offset = offset
+        self._size = size
+        if self.pending_bytes:
+            _logger.info("Replaying %d bytes of spooled answers", self.pending_bytes)
+            self._written.set()
+
+        try:
+            await self._open_db()
+        except Exception as e:
+            _logger.error("Could not open database, spooling answers", exc_info=e)
+
+        self._replay_task = asyncio.create_task(self._replay_continuously())
+
+    async def _open_db(self) -> None:
+        if not self._is_db_open:
+            await self._db.open()
+            self._is_db_open = True
+
+    async def close(self) -> None:
+        if (task := self._replay_task) is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            self._replay_task = None
+
+        try:
+            while self._is_db_open and self.pending_bytes:
+                await self.replay()
+        except Exception as e:
+            _logger.error(
+                "Could not replay spool, %d bytes are kept for the next start",
+                self.pending_bytes,
+                exc_info=e,
+            )
+
+        if (writer := self._writer) is not None:
+            writer.flush()
+            await asyncio.to_thread(os.fsync, writer.fileno())
+            writer.close()
+            self._writer = None
+        if (reader := self._reader) is not None:
+            reader.close()
+            self._reader = None
+
+        if self._is_db_open:
+            await self._db.close()
+            self._is_db_open = False
+
+    def _read_checkpoint(self) -> int:
+        try:
+            return int(self._checkpoint_path.read_text())
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            # Replaying again is safe, losing answers isn't
+            _logger.warning("Ignoring invalid spool checkpoint")
+            return 0
+
+    def _write_checkpoint(self, offset: int) -> None:
+        temporary_path = self._checkpoint_path.with_suffix(".tmp")
+        temporary_path.write_text(str(offset))
+        temporary_path.replace(self._checkpoint_path)
+
+    def _read_batch(self, reader: BinaryIO, size: int) -> tuple[list[bytes], int]:
+        reader.seek(self._offset)
+        lines: list[bytes] = []
+        end = self._offset
+        while len(lines) < self._config.max_batch_size and end < size:
+            line = reader.readline()
+            lines.append(line)
+            end += len(line)
+
+        return lines, end
+
+    async def _replay_continuously(self) -> None:
+        delay = self._config.max_delay_ms / 1000
+        retry_delay = delay
+        while True:
+            if not self.pending_bytes:
+                self._written.clear()
+                await self._written.wait()
+                # Let a batch build up
+                await asyncio.sleep(delay)
+
+            try:
+                await self._open_db()
+                await self.replay()
+            except Exception as e:
+                _REPLAY_ERRORS.inc()
+                _logger.error(
+                    "Could not replay spool, retrying in %.2f s",
+                    retry_delay,
+                    exc_info=e,
+                )
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, _MAX_RETRY_DELAY)
+            else:
+                retry_delay = delay
+
+    async def replay(self) -> None:
+        """
+        Writes the next batch of spooled answers to the database.
+        """
+        async with self._replay_lock:
+            reader = self._reader
+            writer = self._writer
+            if reader is None or writer is None:
+                raise ValueError("Spool not open")
+
+            # Group commit, lines written since the last batch become durable.
+            # Answers are appended on the event loop in the meantime, but only
+            # the lines up to the current size are read.
+            writer.flush()
+            await asyncio.to_thread(os.fsync, writer.fileno())
+            lines, end = await asyncio.to_thread(self._read_batch, reader, self._size)
+            if not lines:
+                return
+
+            await self._db.write_batch(_to_batch(lines))
+            self._offset = end
+
+            if self._offset == self._size:
+                # Everything is in the database, start over with an empty
+                # spool. The checkpoint goes first: if the spool isn't
+                # emptied after all, it's only replayed again.
+                await asyncio.to_thread(self._write_checkpoint, 0)
+                # Unless answers were spooled while the checkpoint was written
+                if self._offset == self._size:
+                    writer.truncate(0)
+                    self._offset = 0
+                    self._size = 0
+                    return
+
+            await asyncio.to_thread(self._write_checkpoint, self._offset)
+
+    async def record_answer(self, user: User, poll_answer: PollAnswer) -> None:
+        writer = self._writer
+        if writer is None:
+            raise ValueError("Spool not open")
+
+        line = json.dumps(
+            [
+                user.id,
+                user.first_name,
+                poll_answer.poll_id,
+                poll_answer.time.isoformat(),
+                poll_answer.get_option_value(),
+            ],
+            separators=(",", ":"),
+        ).encode()
+        writer.write(line + b"\n")
+        # Survives the process crashing, the replay task fsyncs
+        writer.flush()
+        self._size += len(line) + 1
+        self._written.set()
+
+    async def can_connect(self) -> bool:
+        return await self._db.can_connect()
+
+    async def get_poll(self, poll_id: str) -> Poll:
+        return await self._db.get_poll(poll_id)
+
+    def get_open_polls(self, *, created_before: datetime) -> AsyncIterable[Poll]:
+        return self._db.get_open_polls(created_before=created_before)
+
+    async def insert_poll(self, poll: Poll) -> None:
+        await self._db.insert_poll(poll)
+
+    async def insert_polls(self, polls: Collection[Poll]) -> None:
+        await self._db.insert_polls(polls)
+
+    async def update_poll_close_time(
+        self,
+        poll_id: str,
+        close_time: datetime,
+    ) -> None:
+        await self._db.update_poll_close_time(poll_id, close_time)
+
+    async def update_polls_close_time(
+        self,
+        poll_ids: Collection[str],
+        close_time: datetime,
+    ) -> None:
+        await self._db.update_polls_close_time(poll_ids, close_time)
+
+    async def get_poll_result(self, poll_id: str) -> PollResult:
+        return await self._db.get_poll_result(poll_id)
+
+    async def insert_poll_results(self, results: Collection[PollResult]) -> None:
+        await self._db.insert_poll_results(results)
+
+    async def get_latest_poll_stats(self, group_id: int) -> PollStats | None:
+        return await self._db.get_latest_poll_stats(group_id)
+
+    async def get_user_stats(self, *, user_id: int, group_id: int) -> UserStats | None:
+        return await self._db.get_user_stats(user_id=user_id, group_id=group_id)
+
+    async def rebuild_stats(self) -> int:
+        return await self._db.rebuild_stats()
+
+    async def upsert_user(self, user: User) -> None:
+        await self._db.upsert_user(user)
+
+    async def add_to_group(self, *, user_id: int, group_id: int) -> None:
+        await self._db.add_to_group(user_id=user_id, group_id=group_id)
+
+    async def upsert_answer(self, poll_answer: PollAnswer) -> None:
+        await self._db.upsert_answer(poll_answer)
+
+    async def write_batch(self, batch: WriteBatch) -> None:
+        await self._db.write_batch(batch)
+
+    async def export_answers(
+        self,
+        output: Path | BinaryIO,
+        *,
+        export_format: ExportFormat,
+        group_id: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        return await self._db.export_answers(
+            output,
+            export_format=export_format,
+            group_id=group_id,
+            since=since,
+            until=until,
+        )
+
+    async def import_answers(
+        self,
+        records: Iterable[HistoryRecord],
+    ) -> ImportResult:
+        return await self._db.import_answers(records)
+
+    async def get_chats(self) -> list[Chat]:
+        return await self._db.get_chats()
+
+    async def insert_chats(self, chat_ids: Collection[int]) -> int:
+        return await self._db.insert_chats(chat_ids)
+
+    def listen_for_chat_changes(
+        self,
+        callback: Callable[[], None],
+    ) -> AbstractAsyncContextManager[None]:
+        return self._db.listen_for_chat_changes(callback)
+
+    async def get_last_scheduled_run(self, job: str) -> datetime | None:
+        return await self._db.get_last_scheduled_run(job)
+
+    async def claim_scheduled_run(self, job: str, scheduled_for: datetime) -> bool:
+        return await self._db.claim_scheduled_run(job, scheduled_for)
+
+    async def get_memes(self) -> list[Meme]:
+        return await self._db.get_memes()
+
+    async def get_meme_content(self, meme_id: int) -> bytes | None:
+        return await self._db.get_meme_content(meme_id)
+
+    async def insert_meme(
+        self,
+        *,
+        kind: MemeKind,
+        weekday: int,
+        weight: int,
+        file_name: str,
+        content: bytes,
+    ) -> Meme:
+        return await self._db.insert_meme(
+            kind=kind,
+            weekday=weekday,
+            weight=weight,
+            file_name=file_name,
+            content=content,
+        )
+
+    async def set_meme_file_id(self, meme_id: int, file_id: str | None) -> None:
+        await self._db.set_meme_file_id(meme_id, file_id)
+
+    async def set_memes_last_sent(
+        self,
+        meme_ids: Collection[int],
+        sent_at: datetime,
+    ) -> None:
+        await self._db.set_memes_last_sent(meme_ids, sent_at)
+
+    async def create_poll_partitions(self, *, since: datetime, until: datetime) -> int:
+        return await self._db.create_poll_partitions(since=since, until=until)
+
+    async def get_poll_partitions(self) -> list[PollPartition]:
+        return await self._db.get_poll_partitions()
+
+    async def detach_poll_partition(self, partition: PollPartition) -> None:
+        await self._db.detach_poll_partition(partition)
+
+    async def drop_poll_partition(self, partition: PollPartition) -> None:
+        await self._db.drop_poll_partition(partition)
+
+
+def _complete_size(spool: BinaryIO) -> int:
+    # Size up to and including the last line break
+    end = spool.seek(0, os.SEEK_END)
+    position = end
+    while position > 0:
+        chunk_start = max(0, position - 4096)
+        spool.seek(chunk_start)
+        chunk = spool.read(position - chunk_start)
+        if (index := chunk.rfind(b"\n")) >= 0:
+            return chunk_start + index + 1
+        position = chunk_start
+
+    return 0
+
+
+def _to_batch(lines: list[bytes]) -> WriteBatch:
+    # Later lines win, like the answers they replace did
+    users: dict[int, User] = {}
+    answers: dict[tuple[int, str], PollAnswer] = {}
+    for line in lines:
+        try:
+            user_id, first_name, poll_id, time, option = json.loads(line)
+        except ValueError as e:
+            _logger.error("Skipping invalid spool line %r", line, exc_info=e)
+            continue
+
+        users[user_id] = User(id=user_id, first_name=first_name)
+        answers[user_id, poll_id] = PollAnswer(
+            time=datetime.fromisoformat(time),
+            option=None if option is None else PollOption(option),
+            user_id=user_id,
+            poll_id=poll_id,
+        )
+
+    return WriteBatch(
+        users=list(users.values()),
+        answers=list(answers.values()),
+        memberships=[],
+        poll_memberships=list(answers.keys()),
+    )
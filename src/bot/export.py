@@ -0,0 +1,74 @@
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+from zoneinfo import ZoneInfo
+
+from bot.database import ExportFormat
+
+if TYPE_CHECKING:
+    from bot.database import Database
+
+_logger = logging.getLogger(__name__)
+
+
+def _parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="export")
+    parser.add_argument(
+        "--format",
+        type=ExportFormat,
+        choices=list(ExportFormat),
+        default=ExportFormat.csv,
+    )
+    parser.add_argument("--group", type=int, help="Only export this group")
+    parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="Only export polls created at or after this time",
+    )
+    parser.add_argument(
+        "--until",
+        type=datetime.fromisoformat,
+        help="Only export polls created before this time",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="File to write to instead of stdout",
+    )
+    return parser.parse_args(args)
+
+
+def _localize(value: datetime | None, timezone_name: str) -> datetime | None:
+    if value is None or value.tzinfo is not None:
+        return value
+
+    return value.replace(tzinfo=ZoneInfo(timezone_name))
+
+
+async def export(database: Database, timezone_name: str, args: list[str]) -> None:
+    parsed = _parse_args(args)
+
+    await database.open()
+    try:
+        start = time.perf_counter()
+        rows = await database.export_answers(
+            parsed.output or sys.stdout.buffer,
+            export_format=parsed.format,
+            group_id=parsed.group,
+            since=_localize(parsed.since, timezone_name),
+            until=_localize(parsed.until, timezone_name),
+        )
+        duration = time.perf_counter() - start
+    finally:
+        await database.close()
+
+    _logger.info(
+        "Exported %d rows in %.2f s (%.0f rows/s)",
+        rows,
+        duration,
+        rows / duration if duration else 0,
+    )
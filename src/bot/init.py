@@ -1,11 +1,14 @@
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-import sentry_sdk
 from bs_config import Env
 
+from bot import tracing
 from bot.config import Config, DatabaseConfig, SentryConfig
+from bot.database_buffer import BufferedDatabase
+from bot.database_cache import CachedDatabase
 from bot.database_pg import PostgresDatabase
+from bot.database_spool import SpooledDatabase
 
 if TYPE_CHECKING:
     from bot.database import Database
@@ -25,22 +28,62 @@ def _setup_sentry(config: SentryConfig | None) -> None:
         _LOG.warning("Sentry not configured")
         return
 
+    # Only imported when it's configured, importing it is slow
+    import sentry_sdk
+
+    if not config.is_tracing_enabled:
+        sentry_sdk.init(
+            dsn=config.dsn,
+            release=config.release,
+        )
+        return
+
+    def _sample(context: dict[str, Any]) -> float:
+        transaction_context = context.get("transaction_context") or {}
+        if transaction_context.get("op") == "cron":
+            return config.cron_traces_sample_rate
+
+        return config.update_traces_sample_rate
+
     sentry_sdk.init(
         dsn=config.dsn,
         release=config.release,
+        traces_sampler=_sample,
     )
+    tracing.enable()
 
 
-def _create_database(config: DatabaseConfig) -> Database:
-    return PostgresDatabase(config)
+def create_database(config: DatabaseConfig) -> Database:
+    database: Database = PostgresDatabase(config)
 
+    if buffer_config := config.write_buffer:
+        _LOG.info(
+            "Buffering writes (max batch size %d, max delay %d ms)",
+            buffer_config.max_batch_size,
+            buffer_config.max_delay_ms,
+        )
+        database = BufferedDatabase(database, buffer_config)
 
-def initialize() -> tuple[Config, Database]:
+    if cache_config := config.cache:
+        database = CachedDatabase(database, cache_config)
+
+    # Outermost, so recording an answer never waits for the database
+    if spool_config := config.spool:
+        _LOG.info("Spooling answers to %s", spool_config.directory)
+        database = SpooledDatabase(database, spool_config)
+
+    return database
+
+
+def initialize(*, include_nats: bool = True) -> tuple[Config, Database]:
     _setup_logging()
 
-    config = Config.from_env(Env.load(include_default_dotenv=True))
+    config = Config.from_env(
+        Env.load(include_default_dotenv=True),
+        include_nats=include_nats,
+    )
     _setup_sentry(config.sentry)
 
-    database = _create_database(config.database)
+    database = create_database(config.database)
 
     return config, database
@@ -0,0 +1,348 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING
+
+import telegram
+from bs_config import Env
+from telegram.ext import TypeHandler
+
+from bot.bot import MoodBot
+from bot.config import DatabaseConfig, HttpConfig, TelegramConfig
+from bot.database_memory import MemoryDatabase
+from bot.init import create_database
+from bot.model import PollOption
+from bot.standin import BotApiStandIn
+
+if TYPE_CHECKING:
+    from bot.bot import Context
+    from bot.database import Database
+    from bot.model import Poll
+
+_logger = logging.getLogger(__name__)
+
+# Usage:
+#   python -m bot.loadtest run --rates 250,500,1000,2000
+#   python -m bot.loadtest serve-api --port 8081
+#
+# run pushes synthetic poll answers into the update queue of an application
+# without an updater, which is where the NATS updater puts received updates,
+# so everything from deserialization to the database write is measured.
+
+
+@dataclass(frozen=True, kw_only=True)
+class StepResult:
+    offered_rate: float
+    sent: int
+    completed: int
+    throughput: float
+    p50: float
+    p95: float
+    p99: float
+    max_latency: float
+    max_backlog: int
+
+    def is_saturated(self, max_p99: float) -> bool:
+        return (
+            self.completed < self.sent
+            or self.throughput < 0.95 * self.offered_rate
+            or self.p99 > max_p99
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"{self.offered_rate:7.0f}/s offered"
+            f" {self.throughput:7.0f}/s handled"
+            f" ({self.completed}/{self.sent})"
+            f"  p50 {self.p50 * 1000:7.2f} ms"
+            f"  p95 {self.p95 * 1000:7.2f} ms"
+            f"  p99 {self.p99 * 1000:7.2f} ms"
+            f"  max {self.max_latency * 1000:7.2f} ms"
+            f"  backlog {self.max_backlog}"
+        )
+
+
+def _parse_args(args: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bot.loadtest")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def _add_latency(subparser: argparse.ArgumentParser) -> None:
+        subparser.add_argument("--min-latency-ms", type=int, default=40)
+        subparser.add_argument("--max-latency-ms", type=int, default=250)
+
+    serve = subparsers.add_parser("serve-api", help="Only run the Bot API stand-in")
+    serve.add_argument("--port", type=int, default=8081)
+    _add_latency(serve)
+
+    run = subparsers.add_parser("run", help="Find the saturation point")
+    _add_latency(run)
+    run.add_argument(
+        "--rates",
+        type=lambda value: [float(rate) for rate in value.split(",")],
+        default=[100.0, 250.0, 500.0, 1000.0, 2000.0],
+        help="Offered poll answers per second, one step each",
+    )
+    run.add_argument("--step-seconds", type=float, default=10.0)
+    run.add_argument(
+        "--drain-seconds",
+        type=float,
+        default=30.0,
+        help="How long to wait for the backlog after each step",
+    )
+    run.add_argument(
+        "--update-concurrency",
+        type=int,
+        default=8,
+        help="Like TELEGRAM__UPDATE_CONCURRENCY, 1 handles updates one by one",
+    )
+    run.add_argument("--chats", type=int, default=100)
+    run.add_argument("--users", type=int, default=5000)
+    run.add_argument(
+        "--max-p99-ms",
+        type=float,
+        default=500.0,
+        help="A step with a higher p99 latency counts as saturated",
+    )
+    run.add_argument(
+        "--database",
+        choices=["memory", "env"],
+        default="memory",
+        help=(
+            "env uses the DATABASE__* variables including the cache and"
+            " write buffer settings, point it at a scratch database"
+        ),
+    )
+    run.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Keep the bot's own logging, it logs every answer",
+    )
+    return parser.parse_args(args)
+
+
+def _create_database(name: str) -> Database:
+    if name == "memory":
+        return MemoryDatabase()
+
+    # Only needs the database settings, the rest can stay unset
+    env = Env.load(include_default_dotenv=True)
+    return create_database(DatabaseConfig.from_env(env / "database"))
+
+
+class _LoadGenerator:
+    def __init__(self, bot: MoodBot, polls: list[Poll], users: int) -> None:
+        self._bot = bot
+        self._polls = polls
+        self._users = users
+        self._random = random.Random(0)
+        self._update_ids = itertools.count(1)
+        self._sent_at: dict[int, float] = {}
+        self._latencies: list[float] = []
+        self._last_completion = 0.0
+        self._idle = asyncio.Event()
+
+    async def on_update(self, update: telegram.Update, _: Context) -> None:
+        # Registered after all other handlers, so the update is fully handled
+        sent_at = self._sent_at.pop(update.update_id, None)
+        if sent_at is None:
+            return
+
+        self._last_completion = time.perf_counter()
+        self._latencies.append(self._last_completion - sent_at)
+        if not self._sent_at:
+            self._idle.set()
+
+    def _create_update(self) -> telegram.Update:
+        chats = len(self._polls)
+        chat_index = self._random.randrange(chats)
+        poll = self._polls[chat_index]
+        # Users stick to a chat, so answers produce realistic memberships
+        user_id = self._random.randrange(max(1, self._users // chats)) * chats
+        user_id += chat_index + 1
+        update_id = next(self._update_ids)
+        # The same JSON the NATS updater deserializes
+        return telegram.Update.de_json(
+            {
+                "update_id": update_id,
+                "poll_answer": {
+                    "poll_id": poll.id,
+                    "user": {
+                        "id": user_id,
+                        "is_bot": False,
+                        "first_name": f"Load {user_id}",
+                    },
+                    "option_ids": [self._random.randrange(len(PollOption))],
+                },
+            },
+            self._bot.app.bot,
+        )
+
+    async def run_step(
+        self,
+        *,
+        rate: float,
+        duration: float,
+        drain_timeout: float,
+    ) -> StepResult:
+        queue = self._bot.app.update_queue
+        self._latencies = []
+        count = int(rate * duration)
+        max_backlog = 0
+
+        start = time.perf_counter()
+        for index in range(count):
+            # Open loop: updates arrive on schedule, however far behind the
+            # bot is. Late ones are sent right away.
+            delay = start + index / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            update = self._create_update()
+            self._sent_at[update.update_id] = time.perf_counter()
+            await queue.put(update)
+            max_backlog = max(max_backlog, len(self._sent_at))
+
+        if self._sent_at:
+            self._idle.clear()
+            try:
+                await asyncio.wait_for(self._idle.wait(), drain_timeout)
+            except TimeoutError:
+                _logger.warning("%d updates still pending", len(self._sent_at))
+
+        # Late completions from this step must not count for the next one
+        self._sent_at.clear()
+        latencies = sorted(self._latencies) or [0.0]
+
+        def _percentile(fraction: float) -> float:
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        completed = len(self._latencies)
+        elapsed = max(self._last_completion - start, duration)
+        return StepResult(
+            offered_rate=rate,
+            sent=count,
+            completed=completed,
+            throughput=completed / elapsed,
+            p50=_percentile(0.50),
+            p95=_percentile(0.95),
+            p99=_percentile(0.99),
+            max_latency=latencies[-1],
+            max_backlog=max_backlog,
+        )
+
+
+async def _run(parsed: argparse.Namespace) -> None:
+    standin = BotApiStandIn(
+        min_latency=parsed.min_latency_ms / 1000,
+        max_latency=parsed.max_latency_ms / 1000,
+    )
+    await standin.start()
+
+    config = TelegramConfig(
+        token="123456:load-test",
+        api_base_url=standin.base_url,
+        timezone_name="Etc/UTC",
+        send_concurrency=32,
+        messages_per_second=1000,
+        chat_interval_ms=0,
+        max_send_attempts=1,
+        close_batch_size=100,
+        update_concurrency=parsed.update_concurrency,
+        update_dedupe_window=10_000,
+        http=HttpConfig(
+            pool_size=256,
+            keepalive_connections=256,
+            keepalive_expiry_seconds=5,
+            http2=False,
+            connect_timeout_seconds=5,
+            read_timeout_seconds=5,
+            write_timeout_seconds=5,
+            media_write_timeout_seconds=20,
+            pool_timeout_seconds=1,
+        ),
+    )
+    bot = MoodBot(config, None, _create_database(parsed.database))
+    app = bot.app
+
+    await bot.initialize()
+    try:
+        # Polls are created the way send-polls does it, through the stand-in
+        chat_ids = [-(index + 1) for index in range(parsed.chats)]
+        await bot.send_polls(chat_ids)
+        tomorrow = datetime.now(tz=UTC) + timedelta(days=1)
+        polls = [
+            poll
+            async for poll in bot.db.get_open_polls(created_before=tomorrow)
+            if poll.group_id in chat_ids
+        ]
+        if not polls:
+            _logger.error("No polls to answer")
+            return
+
+        generator = _LoadGenerator(bot, polls, parsed.users)
+        app.add_handler(TypeHandler(telegram.Update, generator.on_update), group=1)
+
+        max_p99 = parsed.max_p99_ms / 1000
+        saturated_at: float | None = None
+        async with app:
+            await app.start()
+            try:
+                for rate in parsed.rates:
+                    result = await generator.run_step(
+                        rate=rate,
+                        duration=parsed.step_seconds,
+                        drain_timeout=parsed.drain_seconds,
+                    )
+                    _logger.info("%s", result)
+                    if result.is_saturated(max_p99):
+                        saturated_at = rate
+                        break
+            finally:
+                await app.stop()
+
+        if saturated_at is None:
+            _logger.info("Not saturated up to %.0f answers/s", parsed.rates[-1])
+        else:
+            _logger.info("Saturated at %.0f answers/s", saturated_at)
+        _logger.info("Bot API calls: %s", dict(standin.calls))
+    finally:
+        await bot.close()
+        await standin.close()
+
+
+async def _serve(parsed: argparse.Namespace) -> None:
+    standin = BotApiStandIn(
+        min_latency=parsed.min_latency_ms / 1000,
+        max_latency=parsed.max_latency_ms / 1000,
+    )
+    await standin.start(parsed.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await standin.close()
+
+
+def main(args: list[str] | None = None) -> None:
+    parsed = _parse_args(args)
+
+    logging.basicConfig()
+    logging.root.level = logging.WARNING
+    if getattr(parsed, "verbose", False):
+        logging.getLogger(__package__).level = logging.DEBUG
+    _logger.level = logging.INFO
+    logging.getLogger("bot.standin").level = logging.INFO
+
+    match parsed.command:
+        case "serve-api":
+            asyncio.run(_serve(parsed))
+        case "run":
+            asyncio.run(_run(parsed))
+
+
+if __name__ == "__main__":
+    main()
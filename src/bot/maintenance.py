@@ -0,0 +1,88 @@
+import logging
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from bot.config import RetentionAction
+from bot.database import ExportFormat
+
+if TYPE_CHECKING:
+    from bot.config import RetentionConfig
+    from bot.database import Database, PollPartition
+
+_logger = logging.getLogger(__name__)
+
+
+def _add_months(time: datetime, months: int) -> datetime:
+    # Partitions cover UTC months
+    time = time.astimezone(UTC)
+    month_index = time.year * 12 + time.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=UTC)
+
+
+async def _archive(
+    database: Database,
+    partition: PollPartition,
+    directory: Path,
+) -> None:
+    path = directory / f"{partition.polls_table}.csv"
+    rows = await database.export_answers(
+        path,
+        export_format=ExportFormat.csv,
+        since=partition.start,
+        until=partition.end,
+    )
+    # Only dropped once the export went through
+    await database.drop_poll_partition(partition)
+    _logger.info("Archived %d answers to %s", rows, path)
+
+
+async def maintain(
+    database: Database,
+    config: RetentionConfig,
+    *,
+    now: datetime | None = None,
+) -> None:
+    """
+    Creates the poll partitions for the coming months and detaches or
+    archives the ones past retention.
+
+    Detached and archived answers no longer count towards the stats once they
+    are rebuilt.
+    """
+    current_month = _add_months(now or datetime.now(tz=UTC), 0)
+
+    await database.open()
+    try:
+        created = await database.create_poll_partitions(
+            since=current_month,
+            until=_add_months(current_month, config.premake_months),
+        )
+        _logger.info("Created partitions for %d months", created)
+
+        if not config.months:
+            return
+
+        cutoff = _add_months(current_month, -config.months)
+        expired = [
+            partition
+            for partition in await database.get_poll_partitions()
+            if partition.end <= cutoff
+        ]
+        if not expired:
+            _logger.info("No partitions before %s", cutoff.date())
+            return
+
+        directory = Path(config.archive_directory)
+        if config.action == RetentionAction.archive:
+            directory.mkdir(parents=True, exist_ok=True)
+
+        for partition in expired:
+            match config.action:
+                case RetentionAction.detach:
+                    await database.detach_poll_partition(partition)
+                    _logger.info("Detached %s", partition.polls_table)
+                case RetentionAction.archive:
+                    await _archive(database, partition, directory)
+    finally:
+        await database.close()
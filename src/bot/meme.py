@@ -1,11 +1,31 @@
+import argparse
+import asyncio
+import logging
 import random
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum, auto
+from pathlib import Path
 from typing import TYPE_CHECKING
 
+from bot.metrics import REGISTRY
+
 if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
     from datetime import datetime
 
+    from bot.database import Database
+
+_logger = logging.getLogger(__name__)
+
+_UPLOADS = REGISTRY.counter(
+    "mood_meme_uploads_total",
+    "Meme files uploaded to Telegram",
+)
+_STALE_FILE_IDS = REGISTRY.counter(
+    "mood_meme_stale_file_ids_total",
+    "Meme file IDs that Telegram rejected",
+)
+
 
 class _DayOfWeek(Enum):
     Monday = 0
@@ -21,69 +41,314 @@ class MemeKind(Enum):
     photo = auto()
     video = auto()
     animation = auto()
+    # Sent as a voice message
     audio = auto()
 
+    @staticmethod
+    def from_path(path: Path) -> MemeKind:
+        suffix = path.suffix.lower()
+        for kind, suffixes in _SUFFIXES.items():
+            if suffix in suffixes:
+                return kind
+
+        raise ValueError(f"Unknown kind of meme: {path.name}")
+
 
-@dataclass(frozen=True, kw_only=True)
+_SUFFIXES = {
+    MemeKind.photo: {".jpg", ".jpeg", ".png", ".webp"},
+    MemeKind.video: {".mp4", ".mov", ".webm"},
+    MemeKind.animation: {".gif"},
+    MemeKind.audio: {".ogg", ".oga", ".opus", ".mp3", ".m4a"},
+}
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
 class Meme:
-    file_id: str
+    id: int
     kind: MemeKind
+    # 0 is Monday, like datetime.weekday()
+    weekday: int
+    # How often it comes up compared to the other memes of the day
+    weight: int
+    # Only memes added from a file can be uploaded again
+    file_name: str | None
+    # None until the file has been uploaded
+    file_id: str | None
+    last_sent_at: datetime | None
 
 
-def get_meme(at_time: datetime) -> Meme | None:
-    day_of_week = _DayOfWeek(at_time.weekday())
-    candidates = _MEMES_BY_DAY.get(day_of_week)
-    if not candidates:
-        return None
-    return random.choice(candidates)
-
-
-_MEMES_BY_DAY = {
-    _DayOfWeek.Monday: [
-        Meme(
-            kind=MemeKind.photo,
-            file_id="AgACAgIAAxkBAAM_YadeyBhYrgqfspOYJI2-"
-            "Q0CJBKoAAmS1MRsbNeBI8OUMldl34gMBAAMCAAN4AAMiBA",
-        ),
-        Meme(
-            kind=MemeKind.photo,
-            file_id="AgACAgIAAxkBAANDYxdkpr0njPmQiA1jUPJPyhoz04MAAom-"
-            "MRt2lMFIay6HJVncG6kBAAMCAAN5AAMpBA",
-        ),
-    ],
-    _DayOfWeek.Tuesday: [
-        Meme(
-            kind=MemeKind.animation,
-            file_id="CgACAgQAAxkBAANBYxdhE8fUGGNR82Oh-IatiJM3m-gAAvkCAAKjsB1TKszbmqUkSXYpBA",
-        ),
-    ],
-    _DayOfWeek.Wednesday: [
-        Meme(
-            kind=MemeKind.photo,
-            file_id="AgACAgIAAxkBAAM7YDZLM7l3_"
-            "SDr5gU6Uui6HQzT0h0AAk2xMRt69rhJVqsnsDCWduc3tAeeLgADAQADAgADbQADfJACAAEeBA",
-        ),
-    ],
-    _DayOfWeek.Thursday: [
-        Meme(
-            kind=MemeKind.animation,
-            file_id="CgACAgIAAxkBAANEYzMf9xDKJ4ScYBT5JriNNV8L4aAAAiweAAIl4plJ4JCjKfT7dRUpBA",
-        ),
-    ],
-    _DayOfWeek.Friday: [
-        Meme(
-            kind=MemeKind.audio,
-            file_id="AwACAgIAAxkDAANeaQ23Qi7fZEBTFNwHgW_IVbk4olIAAlOAAALhXnBIApVGoujSZ882BA",
-        ),
-        Meme(
-            kind=MemeKind.video,
-            file_id="BAACAgIAAxkBAAM8YE0YG3NVgZdCH__27kNYL4DTj5MAAnsLAAIFyWhKhR8KzjuNll4eBA",
-        ),
-    ],
-    _DayOfWeek.Sunday: [
-        Meme(
-            kind=MemeKind.photo,
-            file_id="AgACAgIAAxkBAANNaINuPaTrEVWJQxJyDiwdluPp4ikAAh3-MRsNR1FLHbovMdCNO-0BAAMCAAN5AAM2BA",
-        ),
-    ],
-}
+# Uploads the content of a meme and returns its new file ID
+type Upload = Callable[[Meme, bytes], Awaitable[str]]
+
+
+class _MemeRotation:
+    """
+    Draws the memes of a day in rounds, in which each meme comes up weight
+    times in random order. A meme doesn't come up twice in a row, unless its
+    weight is more than that of the others together, and then as rarely as
+    possible.
+    """
+
+    def __init__(
+        self,
+        memes: list[Meme],
+        rng: random.Random,
+        *,
+        last_id: int | None,
+    ) -> None:
+        self._memes = memes
+        self._rng = rng
+        self._last_id = last_id
+        self._round: list[Meme] = []
+        self._next = 0
+
+    def draw(self) -> Meme | None:
+        if self._next >= len(self._round):
+            self._round = self._shuffle()
+            self._next = 0
+            if not self._round:
+                return None
+
+        meme = self._round[self._next]
+        self._next += 1
+        self._last_id = meme.id
+        return meme
+
+    def _shuffle(self) -> list[Meme]:
+        memes = [meme for meme in self._memes for _ in range(meme.weight)]
+        self._rng.shuffle(memes)
+        # How often each meme comes up in the rest of the round
+        remaining = {meme.id: meme.weight for meme in self._memes}
+        max_weight = max(remaining.values(), default=0)
+        left_id = self._last_id
+        for index in range(len(memes)):
+            count = len(memes) - index
+            # Only near the end of the round can a meme be left for more than
+            # every other draw, then it has to come up right away
+            if 2 * max_weight > count:
+                most_id = max(remaining, key=remaining.__getitem__)
+                if most_id != left_id and 2 * remaining[most_id] > count:
+                    _swap_in(memes, index, most_id, same=True)
+            if memes[index].id == left_id:
+                _swap_in(memes, index, left_id, same=False)
+
+            left_id = memes[index].id
+            remaining[left_id] -= 1
+
+        return memes
+
+    def put(self, meme: Meme) -> None:
+        # Starts a new round, which is fine for the rare changes
+        self.remove(meme.id)
+        self._memes.append(meme)
+
+    def remove(self, meme_id: int) -> None:
+        self._memes = [meme for meme in self._memes if meme.id != meme_id]
+        self._round = []
+        self._next = 0
+
+
+def _swap_in(memes: list[Meme], index: int, meme_id: int, *, same: bool) -> None:
+    # Swaps the next meme with, or without, the ID to the index
+    for other in range(index, len(memes)):
+        if (memes[other].id == meme_id) == same:
+            memes[index], memes[other] = memes[other], memes[index]
+            return
+
+
+class MemeCatalog:
+    """
+    Keeps the memes table in memory, indexed by weekday, so picking a meme
+    doesn't touch the database. Call load() to pick up changes.
+
+    Memes added from a file are uploaded once, their file ID is stored. When
+    Telegram rejects a file ID, the meme is left out and uploaded again in the
+    background, sending polls never waits for an upload. Memes that can't be
+    uploaded, e.g. because there is no upload chat, are left out.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        *,
+        upload: Upload | None,
+        rng: random.Random | None = None,
+    ) -> None:
+        self._db = database
+        self._upload = upload
+        self._rng = rng or random.Random()
+        self._rotations = [
+            _MemeRotation([], self._rng, last_id=None) for _ in _DayOfWeek
+        ]
+        self._uploads: dict[int, asyncio.Task[None]] = {}
+        self._stale_file_ids: set[str] = set()
+        # The last meme drawn for each weekday since record_sent()
+        self._drawn: dict[int, Meme] = {}
+
+    async def load(self) -> None:
+        memes = await self._db.get_memes()
+        memes_by_weekday: list[list[Meme]] = [[] for _ in _DayOfWeek]
+        for meme in memes:
+            if meme.file_id is None:
+                self._start_upload(meme)
+            elif meme.id not in self._uploads:
+                memes_by_weekday[meme.weekday].append(meme)
+
+        rotations: list[_MemeRotation] = []
+        for day_memes in memes_by_weekday:
+            # The next run starts with another meme than the last one
+            sent = [
+                (meme.last_sent_at, meme.id)
+                for meme in day_memes
+                if meme.last_sent_at is not None
+            ]
+            last_id = max(sent)[1] if sent else None
+            rotations.append(_MemeRotation(day_memes, self._rng, last_id=last_id))
+
+        self._rotations = rotations
+        _logger.debug("Loaded %d memes", len(memes))
+
+    def get_meme(self, at_time: datetime) -> Meme | None:
+        weekday = at_time.weekday()
+        meme = self._rotations[weekday].draw()
+        if meme is not None:
+            self._drawn[weekday] = meme
+
+        return meme
+
+    async def record_sent(self, sent_at: datetime) -> None:
+        # Only the last meme of a day matters for the next load()
+        if drawn := self._drawn:
+            self._drawn = {}
+            await self._db.set_memes_last_sent(
+                [meme.id for meme in drawn.values()],
+                sent_at,
+            )
+
+    def replace_stale(self, meme: Meme) -> None:
+        """
+        Leaves out a meme whose file ID was rejected by Telegram until it has
+        been uploaded again.
+        """
+        file_id = meme.file_id
+        if file_id is None or file_id in self._stale_file_ids:
+            return
+
+        self._stale_file_ids.add(file_id)
+        _STALE_FILE_IDS.inc()
+        self._rotations[meme.weekday].remove(meme.id)
+        self._start_upload(meme, is_stale=True)
+
+    async def add(
+        self,
+        *,
+        kind: MemeKind,
+        weekday: int,
+        weight: int,
+        file_name: str,
+        content: bytes,
+    ) -> Meme:
+        meme = await self._db.insert_meme(
+            kind=kind,
+            weekday=weekday,
+            weight=weight,
+            file_name=file_name,
+            content=content,
+        )
+        if (upload := self._upload) is None:
+            _logger.warning("Can't upload meme %d without an upload chat", meme.id)
+            return meme
+
+        file_id = await self._upload_file(upload, meme, content)
+        return replace(meme, file_id=file_id)
+
+    async def close(self) -> None:
+        # Uploads started by a cron run are finished before it exits
+        if uploads := list(self._uploads.values()):
+            await asyncio.gather(*uploads)
+
+    def _start_upload(self, meme: Meme, *, is_stale: bool = False) -> None:
+        if meme.id not in self._uploads:
+            task = asyncio.create_task(self._upload_again(meme, is_stale=is_stale))
+            self._uploads[meme.id] = task
+
+    async def _upload_again(self, meme: Meme, *, is_stale: bool) -> None:
+        try:
+            if is_stale:
+                # Keeps other processes from sending it in the meantime
+                await self._db.set_meme_file_id(meme.id, None)
+
+            if meme.file_name is None:
+                _logger.error(
+                    "Disabled meme %d, it wasn't added from a file and can't be"
+                    " uploaded again",
+                    meme.id,
+                )
+                return
+
+            if (upload := self._upload) is None:
+                _logger.warning("Can't upload meme %d without an upload chat", meme.id)
+                return
+
+            # Removed in the meantime if there is no content
+            if (content := await self._db.get_meme_content(meme.id)) is not None:
+                file_id = await self._upload_file(upload, meme, content)
+                self._rotations[meme.weekday].put(replace(meme, file_id=file_id))
+        except Exception as e:
+            _logger.error("Could not upload meme %d", meme.id, exc_info=e)
+        finally:
+            del self._uploads[meme.id]
+
+    async def _upload_file(self, upload: Upload, meme: Meme, content: bytes) -> str:
+        file_id = await upload(meme, content)
+        await self._db.set_meme_file_id(meme.id, file_id)
+        _UPLOADS.inc()
+        _logger.info("Uploaded meme %d (%s)", meme.id, meme.file_name)
+        return file_id
+
+
+def _parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="add-meme")
+    parser.add_argument(
+        "--weekday",
+        required=True,
+        choices=[day.name.lower() for day in _DayOfWeek],
+    )
+    parser.add_argument(
+        "--weight",
+        type=int,
+        default=1,
+        help="How often the meme comes up compared to the others of the day",
+    )
+    parser.add_argument(
+        "--kind",
+        choices=[kind.name for kind in MemeKind],
+        help="Guessed from the file extension by default",
+    )
+    parser.add_argument("files", type=Path, nargs="+")
+    parsed = parser.parse_args(args)
+    if parsed.weight < 1:
+        parser.error("--weight must be at least 1")
+
+    return parsed
+
+
+async def add_memes(catalog: MemeCatalog, args: list[str]) -> None:
+    parsed = _parse_args(args)
+    weekday = _DayOfWeek[parsed.weekday.capitalize()]
+    for path in parsed.files:
+        kind = MemeKind[parsed.kind] if parsed.kind else MemeKind.from_path(path)
+        meme = await catalog.add(
+            kind=kind,
+            weekday=weekday.value,
+            weight=parsed.weight,
+            file_name=path.name,
+            content=path.read_bytes(),
+        )
+        _logger.info(
+            "Added %s %s as meme %d for %s",
+            kind.name,
+            path.name,
+            meme.id,
+            weekday.name,
+        )
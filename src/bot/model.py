@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from datetime import UTC, datetime
+from datetime import UTC, datetime, time
 from enum import IntEnum
 from typing import Self, cast
 
@@ -24,7 +24,17 @@ class PollOption(IntEnum):
                 return "😞 Schlecht"
 
 
-@dataclass(kw_only=True)
+@dataclass(frozen=True, kw_only=True, slots=True)
+class Chat:
+    id: int
+    is_enabled: bool
+    # None means the default from the config
+    timezone_name: str | None
+    send_time: time | None
+    memes_enabled: bool
+
+
+@dataclass(kw_only=True, slots=True)
 class Poll:
     id: str
     group_id: int
@@ -33,7 +43,55 @@ class Poll:
     close_time: datetime | None
 
 
-@dataclass(frozen=True, kw_only=True)
+@dataclass(frozen=True, kw_only=True, slots=True)
+class PollResult:
+    poll_id: str
+    total_voter_count: int
+    # Indexed by PollOption value
+    option_counts: list[int]
+
+    @classmethod
+    def from_telegram(cls, poll: telegram.Poll) -> Self:
+        return cls(
+            poll_id=poll.id,
+            total_voter_count=poll.total_voter_count,
+            option_counts=[option.voter_count for option in poll.options],
+        )
+
+    def get_count(self, option: PollOption) -> int:
+        return self.option_counts[option.value]
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class PollStats:
+    poll_id: str
+    creation_time: datetime
+    voter_count: int
+    # Indexed by PollOption value
+    option_counts: list[int]
+
+    def get_count(self, option: PollOption) -> int:
+        return self.option_counts[option.value]
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class UserStats:
+    user_id: int
+    group_id: int
+    answer_count: int
+    option_sum: int
+    current_streak: int
+    longest_streak: int
+
+    @property
+    def average(self) -> float | None:
+        if not self.answer_count:
+            return None
+
+        return self.option_sum / self.answer_count
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
 class User:
     id: int
     first_name: str
@@ -49,7 +107,7 @@ class User:
         return f"{self.first_name} ({self.id})"
 
 
-@dataclass(frozen=True, kw_only=True)
+@dataclass(frozen=True, kw_only=True, slots=True)
 class PollAnswer:
     time: datetime
     option: PollOption | None
@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+
+class SendRateLimiter:
+    """
+    Spaces out sends to stay within Telegram's global and per-chat message
+    limits. Slots are handed out in call order, so waiting callers don't
+    need to race each other.
+    """
+
+    def __init__(self, *, messages_per_second: float, chat_interval: float) -> None:
+        self._global_interval = 1 / messages_per_second
+        self._chat_interval = chat_interval
+        self._next_global = 0.0
+        self._next_by_chat: dict[int, float] = {}
+        self.throttled = 0
+
+    async def acquire(self, chat_id: int) -> None:
+        now = time.monotonic()
+        start = max(now, self._next_global, self._next_by_chat.get(chat_id, 0.0))
+        self._next_global = start + self._global_interval
+        self._next_by_chat[chat_id] = start + self._chat_interval
+
+        if (delay := start - now) > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold back all further sends, e.g. after Telegram answered with
+        RetryAfter.
+        """
+        self.throttled += 1
+        self._next_global = max(self._next_global, time.monotonic() + seconds)
@@ -0,0 +1,77 @@
+import time
+from typing import TYPE_CHECKING, Any
+
+import httpx
+from telegram.request import HTTPXRequest
+
+from bot import tracing
+from bot.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from bot.config import HttpConfig
+
+_API_CALL_SECONDS = REGISTRY.histogram(
+    "mood_telegram_api_call_seconds",
+    "Duration of Telegram Bot API calls",
+    ("endpoint",),
+)
+_API_CALL_ERRORS = REGISTRY.counter(
+    "mood_telegram_api_call_errors_total",
+    "Failed Telegram Bot API calls",
+    ("endpoint", "reason"),
+)
+
+
+class MeasuredRequest(HTTPXRequest):
+    """
+    Records latency and errors of every Bot API call, labelled by endpoint.
+    """
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        *args: Any,
+        **kwargs: Any,
+    ) -> tuple[int, bytes]:
+        # The URL contains the bot token, only the method name is safe to use
+        endpoint = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        try:
+            with tracing.span(op="http.client", name=endpoint):
+                status, payload = await super().do_request(
+                    url,
+                    method,
+                    *args,
+                    **kwargs,
+                )
+        except Exception as e:
+            _API_CALL_ERRORS.inc(endpoint, type(e).__name__)
+            raise
+        finally:
+            _API_CALL_SECONDS.observe(time.perf_counter() - start, endpoint)
+
+        if status >= 400:
+            _API_CALL_ERRORS.inc(endpoint, str(status))
+
+        return status, payload
+
+
+def create_request(config: HttpConfig) -> MeasuredRequest:
+    return MeasuredRequest(
+        connection_pool_size=config.pool_size,
+        connect_timeout=config.connect_timeout_seconds,
+        read_timeout=config.read_timeout_seconds,
+        write_timeout=config.write_timeout_seconds,
+        media_write_timeout=config.media_write_timeout_seconds,
+        pool_timeout=config.pool_timeout_seconds,
+        http_version="2" if config.http2 else "1.1",
+        httpx_kwargs={
+            # Replaces the limits derived from the pool size alone
+            "limits": httpx.Limits(
+                max_connections=config.pool_size,
+                max_keepalive_connections=config.keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry_seconds,
+            ),
+        },
+    )
@@ -0,0 +1,172 @@
+import asyncio
+import contextlib
+import logging
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING
+
+from bot import tracing
+from bot.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Sequence
+    from datetime import time, tzinfo
+
+    from bot.database import Database
+
+_logger = logging.getLogger(__name__)
+
+_MAX_SLEEP = 60.0
+
+_RUNS = REGISTRY.counter(
+    "mood_scheduled_runs_total",
+    "Runs of scheduled jobs, including failed ones",
+    ("job",),
+)
+_RUN_ERRORS = REGISTRY.counter(
+    "mood_scheduled_run_errors_total",
+    "Runs of scheduled jobs that raised an exception",
+    ("job",),
+)
+
+
+@dataclass(frozen=True, kw_only=True)
+class ScheduledJob:
+    name: str
+    # Local time in the timezone
+    at: time
+    timezone: tzinfo
+    run: Callable[[], Awaitable[None]]
+
+
+class Scheduler:
+    """
+    Runs jobs once a day in the long-running process. A run is claimed in the
+    database before it starts, so only one of several replicas runs it, and
+    runs missed while no replica was up are caught up on if they are at most
+    max_delay late.
+
+    A job without any claimed run was run by something else so far, e.g. a
+    CronJob, so it starts with its next run instead of catching up.
+
+    The jobs are looked up again before every check, so they can change.
+
+    Failed and interrupted runs count as finished, like a CronJob they are not
+    retried.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        get_jobs: Callable[[], Sequence[ScheduledJob]],
+        *,
+        max_delay: timedelta,
+    ) -> None:
+        self._db = database
+        self._get_jobs = get_jobs
+        self._max_delay = max_delay
+        # Latest run of each job this process knows to be finished or skipped
+        self._settled: dict[str, datetime] = {}
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            raise ValueError("Already started")
+
+        self._task = asyncio.create_task(self._run_continuously())
+
+    async def close(self) -> None:
+        if (task := self._task) is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            self._task = None
+
+    def _occurrence(self, job: ScheduledJob, now: datetime, *, days: int) -> datetime:
+        local_date = now.astimezone(job.timezone).date() + timedelta(days=days)
+        occurrence = datetime.combine(local_date, job.at, tzinfo=job.timezone)
+        return occurrence.astimezone(UTC)
+
+    def _latest_run(self, job: ScheduledJob, now: datetime) -> datetime:
+        scheduled_for = self._occurrence(job, now, days=0)
+        if scheduled_for > now:
+            return self._occurrence(job, now, days=-1)
+
+        return scheduled_for
+
+    def _seconds_until_next_run(
+        self,
+        jobs: Sequence[ScheduledJob],
+        now: datetime,
+    ) -> float:
+        seconds = _MAX_SLEEP
+        for job in jobs:
+            scheduled_for = self._occurrence(job, now, days=0)
+            if scheduled_for <= now:
+                scheduled_for = self._occurrence(job, now, days=1)
+            seconds = min(seconds, (scheduled_for - now).total_seconds())
+
+        return seconds
+
+    async def _run_continuously(self) -> None:
+        while True:
+            now = datetime.now(tz=UTC)
+            jobs = self._get_jobs()
+            for job in jobs:
+                try:
+                    await self.run_if_due(job, now)
+                except Exception as e:
+                    _logger.error("Could not check on %s", job.name, exc_info=e)
+
+            now = datetime.now(tz=UTC)
+            await asyncio.sleep(self._seconds_until_next_run(jobs, now))
+
+    async def run_if_due(self, job: ScheduledJob, now: datetime) -> None:
+        scheduled_for = self._latest_run(job, now)
+        settled = self._settled.get(job.name)
+        if settled is not None and settled >= scheduled_for:
+            return
+
+        last_run = await self._db.get_last_scheduled_run(job.name)
+        if last_run is None:
+            _logger.info(
+                "Starting %s with its run after %s",
+                job.name,
+                scheduled_for.astimezone(job.timezone),
+            )
+            await self._db.claim_scheduled_run(job.name, scheduled_for)
+            self._settled[job.name] = scheduled_for
+            return
+
+        if last_run >= scheduled_for:
+            self._settled[job.name] = scheduled_for
+            return
+
+        if now - scheduled_for > self._max_delay:
+            _logger.warning(
+                "Skipping %s scheduled for %s, it's too late to catch up on",
+                job.name,
+                scheduled_for.astimezone(job.timezone),
+            )
+            self._settled[job.name] = scheduled_for
+            return
+
+        if not await self._db.claim_scheduled_run(job.name, scheduled_for):
+            _logger.debug("%s was claimed by another process", job.name)
+            self._settled[job.name] = scheduled_for
+            return
+
+        _logger.info(
+            "Running %s scheduled for %s",
+            job.name,
+            scheduled_for.astimezone(job.timezone),
+        )
+        try:
+            with tracing.transaction(op="cron", name=job.name):
+                await job.run()
+        except Exception as e:
+            _RUN_ERRORS.inc(job.name)
+            _logger.error("Scheduled %s failed", job.name, exc_info=e)
+
+        _RUNS.inc(job.name)
+        self._settled[job.name] = scheduled_for
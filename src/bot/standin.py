@@ -0,0 +1,268 @@
+import asyncio
+import collections
+import email.parser
+import email.policy
+import itertools
+import json
+import logging
+import random
+import time
+from typing import Any
+from urllib.parse import parse_qsl
+
+_logger = logging.getLogger(__name__)
+
+type JsonObject = dict[str, Any]
+# Uploaded files are bytes, everything else is a string
+type Form = dict[str, str | bytes]
+# Media methods and the message field carrying the file
+_MEDIA = {
+    "sendPhoto": "photo",
+    "sendVideo": "video",
+    "sendAnimation": "animation",
+    "sendVoice": "voice",
+}
+
+
+def _parse_form(content_type: str, body: bytes) -> Form:
+    if not content_type.startswith("multipart/form-data"):
+        return dict(parse_qsl(body.decode()))
+
+    # Files are uploaded as multipart/form-data, which email can parse once
+    # it knows the boundary
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    form: Form = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True)
+        if not isinstance(name, str) or not isinstance(payload, bytes):
+            continue
+
+        form[name] = payload if part.get_filename() else payload.decode()
+
+    return form
+
+
+class BotApiStandIn:
+    """
+    Answers the Bot API methods the bot uses on a local port, after a random
+    delay between min_latency and max_latency seconds. New connections are
+    held for connect_latency seconds first, like a TLS handshake would. Nothing
+    leaves the machine, so send-polls, close-polls and the load test can run
+    offline.
+
+    Point a bot at it with TELEGRAM__API_BASE_URL=<base_url>.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_latency: float,
+        max_latency: float,
+        connect_latency: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.min_latency = min_latency
+        self.max_latency = max_latency
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self.calls: collections.Counter[str] = collections.Counter()
+        # time.perf_counter() when the first request arrived
+        self.first_call_at: float | None = None
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        self._poll_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        # (chat_id, message_id) -> poll
+        self._polls: dict[tuple[int, int], JsonObject] = {}
+        self._server: asyncio.Server | None = None
+
+    @property
+    def base_url(self) -> str:
+        server = self._server
+        if server is None:
+            raise ValueError("Not started")
+
+        host, port = server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/bot"
+
+    async def start(self, port: int = 0) -> None:
+        if self._server is not None:
+            raise ValueError("Already started")
+
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            host="127.0.0.1",
+            port=port,
+        )
+        _logger.info("Serving Bot API stand-in at %s", self.base_url)
+
+    async def close(self) -> None:
+        server = self._server
+        if server is not None:
+            server.close()
+            # Clients keep their connections alive, wait_closed() would wait
+            # for them forever
+            server.close_clients()
+            await server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self.connections += 1
+        if self.connect_latency:
+            await asyncio.sleep(self.connect_latency)
+
+        # httpx keeps connections alive, so serve requests until it hangs up
+        try:
+            while request_line := await reader.readline():
+                content_length = 0
+                content_type = ""
+                while (header := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = header.decode("latin-1").partition(":")
+                    match name.strip().lower():
+                        case "content-length":
+                            content_length = int(value)
+                        case "content-type":
+                            content_type = value.strip()
+
+                body = await reader.readexactly(content_length)
+                path = request_line.decode("latin-1").split()[1]
+                status, response = await self._call(
+                    path.rsplit("/", 1)[-1],
+                    _parse_form(content_type, body),
+                )
+
+                payload = json.dumps(response).encode()
+                head = (
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    "\r\n"
+                )
+                writer.write(head.encode() + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            _logger.debug("Client disconnected", exc_info=e)
+        finally:
+            writer.close()
+
+    async def _call(self, method: str, form: Form) -> tuple[str, JsonObject]:
+        if self.first_call_at is None:
+            self.first_call_at = time.perf_counter()
+
+        params: JsonObject = {}
+        for key, value in form.items():
+            # Non-string parameters are sent JSON encoded
+            try:
+                params[key] = value if isinstance(value, bytes) else json.loads(value)
+            except ValueError:
+                params[key] = value
+
+        if latency := self._random.uniform(self.min_latency, self.max_latency):
+            await asyncio.sleep(latency)
+
+        self.calls[method] += 1
+        match method:
+            case "getMe":
+                result: JsonObject = {
+                    "id": 1,
+                    "is_bot": True,
+                    "first_name": "Stand-in",
+                    "username": "standin_bot",
+                }
+            case "sendPoll":
+                message_id = next(self._message_ids)
+                poll: JsonObject = {
+                    "id": f"standin-{next(self._poll_ids)}",
+                    "question": params["question"],
+                    # Plain strings or InputPollOption objects
+                    "options": [
+                        {
+                            "text": option
+                            if isinstance(option, str)
+                            else option["text"],
+                            "voter_count": 0,
+                        }
+                        for option in params["options"]
+                    ],
+                    "total_voter_count": 0,
+                    "is_closed": False,
+                    "is_anonymous": params.get("is_anonymous", True),
+                    "type": "regular",
+                    "allows_multiple_answers": params.get(
+                        "allows_multiple_answers",
+                        False,
+                    ),
+                }
+                self._polls[(int(params["chat_id"]), message_id)] = poll
+                result = self._message(params["chat_id"], message_id, poll=poll)
+            case "stopPoll":
+                poll = self._polls.get(
+                    (int(params["chat_id"]), int(params["message_id"]))
+                )
+                if poll is None:
+                    return "400 Bad Request", {
+                        "ok": False,
+                        "error_code": 400,
+                        "description": "Bad Request: poll not found",
+                    }
+                poll["is_closed"] = True
+                result = poll
+            case "sendMessage":
+                result = self._message(
+                    params["chat_id"],
+                    next(self._message_ids),
+                    text=params["text"],
+                )
+            case "sendPhoto" | "sendVideo" | "sendAnimation" | "sendVoice":
+                field = _MEDIA[method]
+                result = self._message(
+                    params["chat_id"],
+                    next(self._message_ids),
+                    **{field: self._media(field, params[field])},
+                )
+            case _:
+                return "404 Not Found", {
+                    "ok": False,
+                    "error_code": 404,
+                    "description": "Not Found: method not found",
+                }
+
+        return "200 OK", {"ok": True, "result": result}
+
+    def _media(self, field: str, file: str | bytes) -> JsonObject | list[JsonObject]:
+        # Uploads get a new file ID, sending a file ID sends that file again
+        if isinstance(file, bytes):
+            file_id = f"standin-file-{next(self._file_ids)}"
+            size = len(file)
+        else:
+            file_id = str(file)
+            size = 0
+
+        media: JsonObject = {
+            "file_id": file_id,
+            "file_unique_id": file_id,
+            "file_size": size,
+        }
+        match field:
+            case "photo":
+                return [{**media, "width": 1280, "height": 720}]
+            case "video" | "animation":
+                return {**media, "width": 1280, "height": 720, "duration": 10}
+            case _:
+                return {**media, "duration": 10}
+
+    @staticmethod
+    def _message(chat_id: int, message_id: int, **content: Any) -> JsonObject:
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "group", "title": "Stand-in"},
+            **content,
+        }
@@ -0,0 +1,37 @@
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any
+
+_NO_SPAN = nullcontext()
+_enabled = False
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+# Without tracing, both functions return a shared no-op context manager so the
+# hot path doesn't pay for Sentry's own no-op span bookkeeping.
+
+
+def transaction(*, op: str, name: str) -> AbstractContextManager[Any]:
+    if not _enabled:
+        return _NO_SPAN
+
+    # Only imported once tracing is enabled, importing it is slow
+    import sentry_sdk
+
+    return sentry_sdk.start_transaction(op=op, name=name)
+
+
+def span(*, op: str, name: str) -> AbstractContextManager[Any]:
+    if not _enabled:
+        return _NO_SPAN
+
+    import sentry_sdk
+
+    return sentry_sdk.start_span(op=op, name=name)
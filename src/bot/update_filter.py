@@ -0,0 +1,72 @@
+import collections
+from typing import TYPE_CHECKING
+
+from telegram.ext import ApplicationHandlerStop
+
+from bot.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    import telegram
+
+    from bot.config import PartitionConfig
+
+_DROPPED = REGISTRY.counter(
+    "mood_updates_dropped_total",
+    "Updates that were not handled",
+    ("reason",),
+)
+
+
+class UpdateFilter:
+    """
+    Drops updates that were handled already, e.g. because NATS redelivered
+    them, by remembering the last window update IDs.
+
+    With a partition, every replica receives all updates and only keeps the
+    ones whose key belongs to its partition. Updates with the same key are
+    always handled by the same replica, so they stay in order and are
+    deduplicated there.
+
+    Register it as the first handler, it stops the handling of dropped
+    updates.
+    """
+
+    def __init__(
+        self,
+        *,
+        window: int,
+        partition: PartitionConfig | None,
+        key: Callable[[telegram.Update], int],
+    ) -> None:
+        self._window = window
+        self._partition = partition
+        self._key = key
+        self._seen: set[int] = set()
+        self._seen_order: collections.deque[int] = collections.deque()
+
+    def accepts(self, update: telegram.Update) -> bool:
+        if (partition := self._partition) is not None:
+            if self._key(update) % partition.count != partition.index:
+                _DROPPED.inc("partition")
+                return False
+
+        if not self._window:
+            return True
+
+        update_id = update.update_id
+        if update_id in self._seen:
+            _DROPPED.inc("duplicate")
+            return False
+
+        self._seen.add(update_id)
+        self._seen_order.append(update_id)
+        if len(self._seen_order) > self._window:
+            self._seen.discard(self._seen_order.popleft())
+
+        return True
+
+    async def __call__(self, update: telegram.Update, _: object) -> None:
+        if not self.accepts(update):
+            raise ApplicationHandlerStop
@@ -0,0 +1,94 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from telegram.ext import BaseUpdateProcessor
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Hashable
+
+# The base class only decides whether the application starts a task per
+# update, the actual limit is applied in do_process_update.
+_UNLIMITED = 2**31 - 1
+
+
+@dataclass(kw_only=True)
+class _KeyLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Updates holding or waiting for the lock
+    users: int = 0
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Handles up to limit updates at the same time, but updates with the same
+    key one after the other, in the order they were received. Updates
+    without a key are not ordered at all.
+
+    Waiting for an earlier update with the same key doesn't take up a slot.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        key: Callable[[object], Hashable | None],
+    ) -> None:
+        if limit < 1:
+            raise ValueError("limit must be positive")
+
+        super().__init__(_UNLIMITED)
+        self.limit = limit
+        self._key = key
+        self._slots = asyncio.Semaphore(limit)
+        self._key_locks: dict[Hashable, _KeyLock] = {}
+        # Updates waiting for their key or a slot
+        self.waiting = 0
+        self.in_flight = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(
+        self,
+        update: object,
+        coroutine: Awaitable[Any],
+    ) -> None:
+        # The application starts one task per update in the order they were
+        # received, and nothing before this point suspends, so the key locks
+        # are requested in that order too. asyncio locks are fair.
+        key = self._key(update)
+        key_lock: _KeyLock | None = None
+        if key is not None:
+            key_lock = self._key_locks.get(key)
+            if key_lock is None:
+                key_lock = _KeyLock()
+                self._key_locks[key] = key_lock
+            key_lock.users += 1
+
+        started = False
+        self.waiting += 1
+        try:
+            if key_lock is not None:
+                await key_lock.lock.acquire()
+            try:
+                async with self._slots:
+                    started = True
+                    self.waiting -= 1
+                    self.in_flight += 1
+                    try:
+                        await coroutine
+                    finally:
+                        self.in_flight -= 1
+            finally:
+                if key_lock is not None:
+                    key_lock.lock.release()
+        finally:
+            if not started:
+                self.waiting -= 1
+            if key_lock is not None:
+                key_lock.users -= 1
+                if not key_lock.users:
+                    del self._key_locks[key]
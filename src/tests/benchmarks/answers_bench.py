@@ -0,0 +1,115 @@
+import asyncio
+import os
+import statistics
+import time
+from datetime import UTC, datetime
+
+import pytest
+
+from bot.config import DatabaseConfig, PoolConfig
+from bot.database_pg import PostgresDatabase
+from bot.model import Poll, PollAnswer, PollOption, User
+
+# Runs against a migrated database, e.g. the one from docker-compose.yaml:
+#   BENCH_DATABASE_PASSWORD=postgres make bench
+_PASSWORD = os.getenv("BENCH_DATABASE_PASSWORD")
+_USERS = 2_000
+_CONCURRENCY = 32
+
+
+def _config(*, statement_cache_size: int, max_size: int) -> DatabaseConfig:
+    return DatabaseConfig(
+        host=os.getenv("BENCH_DATABASE_HOST", "localhost"),
+        name=os.getenv("BENCH_DATABASE_NAME", "postgres"),
+        username=os.getenv("BENCH_DATABASE_USERNAME", "postgres"),
+        password=_PASSWORD or "",
+        pool=PoolConfig(
+            min_size=max_size,
+            max_size=max_size,
+            max_queries=50_000,
+            max_inactive_connection_lifetime_seconds=300,
+            statement_cache_size=statement_cache_size,
+            command_timeout_seconds=30,
+        ),
+        cache=None,
+        write_buffer=None,
+        spool=None,
+    )
+
+
+async def _separate_calls(db: PostgresDatabase, user: User, answer: PollAnswer) -> None:
+    # The answer path before record_answer existed
+    await db.upsert_user(user)
+    await db.upsert_answer(answer)
+    poll = await db.get_poll(answer.poll_id)
+    await db.add_to_group(user_id=user.id, group_id=poll.group_id)
+
+
+async def _record_answer(db: PostgresDatabase, user: User, answer: PollAnswer) -> None:
+    await db.record_answer(user, answer)
+
+
+async def _run(config: DatabaseConfig, answer_path: str) -> tuple[float, list[float]]:
+    db = PostgresDatabase(config)
+    await db.open()
+    try:
+        now = datetime.now(tz=UTC)
+        poll = Poll(
+            id=f"bench-{answer_path}-{time.time_ns()}",
+            group_id=-1,
+            message_id=0,
+            creation_time=now,
+            close_time=now,
+        )
+        await db.insert_poll(poll)
+
+        handle = _separate_calls if answer_path == "separate" else _record_answer
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for user_id in range(_USERS):
+            queue.put_nowait(user_id)
+
+        latencies: list[float] = []
+
+        async def _worker() -> None:
+            while not queue.empty():
+                user_id = queue.get_nowait()
+                user = User(id=-(user_id + 1), first_name=f"Bench {user_id}")
+                answer = PollAnswer(
+                    time=now,
+                    option=PollOption(user_id % len(PollOption)),
+                    user_id=user.id,
+                    poll_id=poll.id,
+                )
+                start = time.perf_counter()
+                await handle(db, user, answer)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_worker() for _ in range(_CONCURRENCY)))
+        return time.perf_counter() - start, latencies
+    finally:
+        await db.close()
+
+
+@pytest.mark.skipif(_PASSWORD is None, reason="BENCH_DATABASE_PASSWORD not set")
+@pytest.mark.parametrize("answer_path", ["separate", "record_answer"])
+@pytest.mark.parametrize(
+    ("statement_cache_size", "max_size"),
+    [(0, 4), (100, 4), (100, 16)],
+)
+def test_answer_throughput(
+    answer_path: str,
+    statement_cache_size: int,
+    max_size: int,
+) -> None:
+    config = _config(statement_cache_size=statement_cache_size, max_size=max_size)
+    duration, latencies = asyncio.run(_run(config, answer_path))
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print()
+    print(
+        f"{answer_path:>13} cache={statement_cache_size:<3} pool={max_size:<2}"
+        f" {len(latencies) / duration:8.0f} answers/s"
+        f"  p50 {quantiles[49] * 1000:6.2f} ms"
+        f"  p99 {quantiles[98] * 1000:6.2f} ms"
+    )
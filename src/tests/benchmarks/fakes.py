@@ -0,0 +1,161 @@
+import asyncio
+import itertools
+import random
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, Any
+
+import telegram
+from telegram.constants import ChatType, PollType
+from telegram.error import BadRequest
+
+from bot.database_memory import MemoryDatabase
+from bot.model import PollAnswer, PollOption, User
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class FakeCall:
+    method: str
+    chat_id: int
+    # perf_counter() when the call returned
+    finished: float
+
+
+class FakeBot(telegram.Bot):
+    """
+    Stands in for the Bot API: records every call and answers after a random
+    latency between min_latency and max_latency seconds.
+
+    Poll IDs are derived from the message ID, use poll_id() when seeding polls
+    that stop_poll() is going to close.
+
+    Sending a file ID from stale_file_ids fails like an expired one does,
+    uploading a file takes upload_latency seconds on top.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_latency: float = 0.0,
+        max_latency: float = 0.0,
+        stale_file_ids: Collection[str] = (),
+        upload_latency: float = 0.0,
+    ) -> None:
+        super().__init__(token="123456:fake")
+        # Bot objects are frozen, only private attributes can be set
+        self._min_latency = min_latency
+        self._max_latency = max_latency
+        self._stale_file_ids = set(stale_file_ids)
+        self._upload_latency = upload_latency
+        self._calls: list[FakeCall] = []
+        self._message_ids = itertools.count(1)
+        self._random = random.Random(0)
+
+    @property
+    def calls(self) -> list[FakeCall]:
+        return self._calls
+
+    async def _respond(self, method: str, chat_id: int) -> None:
+        if latency := self._random.uniform(self._min_latency, self._max_latency):
+            await asyncio.sleep(latency)
+        self._calls.append(
+            FakeCall(method=method, chat_id=chat_id, finished=time.perf_counter())
+        )
+
+    def _message(
+        self,
+        chat_id: int,
+        *,
+        with_poll: bool = False,
+        **kwargs: Any,
+    ) -> telegram.Message:
+        message_id = next(self._message_ids)
+        return telegram.Message(
+            message_id=message_id,
+            date=datetime.now(tz=UTC),
+            chat=telegram.Chat(id=chat_id, type=ChatType.GROUP),
+            poll=self._poll(message_id, is_closed=False) if with_poll else None,
+            **kwargs,
+        )
+
+    async def _send_file(self, method: str, chat_id: int, file: Any) -> str:
+        if isinstance(file, telegram.InputFile):
+            await asyncio.sleep(self._upload_latency)
+            await self._respond(method, chat_id)
+            return f"uploaded-{next(self._message_ids)}"
+
+        await self._respond(method, chat_id)
+        if file in self._stale_file_ids:
+            raise BadRequest("Wrong remote file identifier specified: wrong padding")
+
+        return str(file)
+
+    @staticmethod
+    def poll_id(message_id: int) -> str:
+        return f"fake-{message_id}"
+
+    def _poll(self, message_id: int, *, is_closed: bool) -> telegram.Poll:
+        voter_counts = [(message_id + option) % 7 for option in PollOption]
+        return telegram.Poll(
+            id=self.poll_id(message_id),
+            question="",
+            options=[
+                telegram.PollOption(text=str(option), voter_count=count)
+                for option, count in zip(PollOption, voter_counts, strict=True)
+            ],
+            total_voter_count=sum(voter_counts),
+            is_closed=is_closed,
+            is_anonymous=False,
+            type=PollType.REGULAR,
+            allows_multiple_answers=False,
+        )
+
+    async def send_poll(self, *args: Any, **kwargs: Any) -> telegram.Message:
+        await self._respond("sendPoll", kwargs["chat_id"])
+        return self._message(kwargs["chat_id"], with_poll=True)
+
+    async def stop_poll(self, *args: Any, **kwargs: Any) -> telegram.Poll:
+        await self._respond("stopPoll", kwargs["chat_id"])
+        return self._poll(kwargs["message_id"], is_closed=True)
+
+    async def send_photo(self, *args: Any, **kwargs: Any) -> telegram.Message:
+        chat_id = kwargs["chat_id"]
+        file_id = await self._send_file("sendPhoto", chat_id, kwargs["photo"])
+        photo = telegram.PhotoSize(file_id, file_id, width=1, height=1)
+        return self._message(chat_id, photo=(photo,))
+
+    async def send_video(self, *args: Any, **kwargs: Any) -> telegram.Message:
+        chat_id = kwargs["chat_id"]
+        file_id = await self._send_file("sendVideo", chat_id, kwargs["video"])
+        video = telegram.Video(file_id, file_id, width=1, height=1, duration=1)
+        return self._message(chat_id, video=video)
+
+    async def send_animation(self, *args: Any, **kwargs: Any) -> telegram.Message:
+        chat_id = kwargs["chat_id"]
+        file_id = await self._send_file("sendAnimation", chat_id, kwargs["animation"])
+        animation = telegram.Animation(file_id, file_id, width=1, height=1, duration=1)
+        return self._message(chat_id, animation=animation)
+
+    async def send_voice(self, *args: Any, **kwargs: Any) -> telegram.Message:
+        chat_id = kwargs["chat_id"]
+        file_id = await self._send_file("sendVoice", chat_id, kwargs["voice"])
+        return self._message(chat_id, voice=telegram.Voice(file_id, file_id, 1))
+
+
+class SlowDatabase(MemoryDatabase):
+    """
+    An in-memory database that takes latency seconds to record an answer,
+    like a round trip to Postgres. Answers are recorded in parallel.
+    """
+
+    def __init__(self, *, latency: float) -> None:
+        super().__init__()
+        self.latency = latency
+
+    async def record_answer(self, user: User, poll_answer: PollAnswer) -> None:
+        await asyncio.sleep(self.latency)
+        await super().record_answer(user, poll_answer)
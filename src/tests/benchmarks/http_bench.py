@@ -0,0 +1,141 @@
+import asyncio
+import time
+from dataclasses import replace
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING
+
+from bot.bot import MoodBot
+from bot.config import HttpConfig, TelegramConfig
+from bot.database_memory import MemoryDatabase
+from bot.standin import BotApiStandIn
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+# send-polls and close-polls against the local Bot API stand-in, with a
+# real Bot API client. The stand-in answers after a delay like the real Bot
+# API would, and makes every new connection wait like a TLS handshake.
+_CHATS = 100
+_SEND_CONCURRENCY = 32
+_MIN_LATENCY = 0.02
+_MAX_LATENCY = 0.06
+_CONNECT_LATENCY = 0.06
+# (pool size, kept alive connections). httpcore checks every pooled
+# connection whenever a call starts or ends, so past a dozen or so
+# connections that costs more CPU than the extra calls in flight gain.
+_CLIENTS = {
+    "1 connection": (1, 1),
+    "8 connections": (8, 8),
+    "16 connections": (16, 16),
+    "32 connections": (32, 32),
+    "32, no keep-alive": (32, 0),
+}
+
+
+def _config(api_base_url: str, *, pool_size: int, keepalive: int) -> TelegramConfig:
+    return TelegramConfig(
+        token="123456:http",
+        api_base_url=api_base_url,
+        timezone_name="Europe/Berlin",
+        send_concurrency=_SEND_CONCURRENCY,
+        messages_per_second=10_000,
+        chat_interval_ms=0,
+        max_send_attempts=1,
+        close_batch_size=100,
+        update_concurrency=8,
+        update_dedupe_window=10_000,
+        http=HttpConfig(
+            pool_size=pool_size,
+            keepalive_connections=keepalive,
+            keepalive_expiry_seconds=5,
+            http2=False,
+            connect_timeout_seconds=5,
+            read_timeout_seconds=5,
+            write_timeout_seconds=5,
+            media_write_timeout_seconds=20,
+            # Calls queue up for a connection with a small pool
+            pool_timeout_seconds=60,
+        ),
+    )
+
+
+async def _run_bot(
+    config: TelegramConfig,
+    database: MemoryDatabase,
+    run: Callable[[MoodBot], Awaitable[None]],
+) -> float:
+    bot = MoodBot(config, None, database)
+    await bot.initialize()
+    try:
+        start = time.perf_counter()
+        await run(bot)
+        return time.perf_counter() - start
+    finally:
+        await bot.close()
+
+
+async def _run(*, pool_size: int, keepalive: int) -> tuple[float, float, int]:
+    standin = BotApiStandIn(
+        min_latency=_MIN_LATENCY,
+        max_latency=_MAX_LATENCY,
+        connect_latency=_CONNECT_LATENCY,
+    )
+    await standin.start()
+    try:
+        config = _config(standin.base_url, pool_size=pool_size, keepalive=keepalive)
+        database = MemoryDatabase()
+        chat_ids = [-(index + 1) for index in range(_CHATS)]
+        send_duration = await _run_bot(
+            config,
+            database,
+            lambda bot: bot.send_polls(chat_ids),
+        )
+
+        # Only polls from before today are closed, so the sent ones are
+        # moved back a day
+        tomorrow = datetime.now(tz=UTC) + timedelta(days=1)
+        yesterdays_database = MemoryDatabase()
+        await yesterdays_database.insert_polls(
+            [
+                replace(poll, creation_time=poll.creation_time - timedelta(days=1))
+                async for poll in database.get_open_polls(created_before=tomorrow)
+            ]
+        )
+        close_duration = await _run_bot(
+            config,
+            yesterdays_database,
+            lambda bot: bot.close_open_polls(),
+        )
+    finally:
+        await standin.close()
+
+    assert standin.calls["sendPoll"] == _CHATS
+    assert standin.calls["stopPoll"] == _CHATS
+    return _CHATS / send_duration, _CHATS / close_duration, standin.connections
+
+
+def test_http_clients() -> None:
+    print()
+    baseline: float | None = None
+    for client, (pool_size, keepalive) in _CLIENTS.items():
+        send_rate, close_rate, connections = asyncio.run(
+            _run(pool_size=pool_size, keepalive=keepalive)
+        )
+        # Connections are only reused if they are kept alive, by the bot that
+        # sent the polls and the one that closed them. Both call getMe first.
+        if keepalive:
+            assert connections <= 2 * pool_size
+        else:
+            assert connections == 2 * (_CHATS + 1)
+
+        baseline = baseline or send_rate
+        if pool_size == 1:
+            # One call at a time can't beat the stand-in's latency
+            assert send_rate < 1 / _MIN_LATENCY
+        else:
+            assert send_rate > 3 * baseline
+
+        print(
+            f"{client:>17}: {send_rate:5.0f} polls sent/s ({send_rate / baseline:4.1f}x),"
+            f" {close_rate:5.0f} closed/s, {connections:3d} connections"
+        )
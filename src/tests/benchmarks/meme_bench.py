@@ -0,0 +1,141 @@
+import asyncio
+import collections
+import random
+import time
+from datetime import UTC, datetime
+
+import pytest
+
+from bot.bot import MoodBot
+from bot.config import HttpConfig, MemeConfig, TelegramConfig
+from bot.database_memory import MemoryDatabase
+from bot.meme import Meme, MemeCatalog, MemeKind
+from tests.benchmarks.fakes import FakeBot
+
+_DRAWS = 100_000
+_CHATS = 200
+_UPLOAD_LATENCY = 0.5
+_UPLOAD_CHAT_ID = 1
+# A Monday
+_MONDAY = datetime(2026, 10, 19, 13, tzinfo=UTC)
+_CONFIG = TelegramConfig(
+    token="123456:fake",
+    api_base_url="https://api.telegram.org/bot",
+    timezone_name="UTC",
+    send_concurrency=16,
+    messages_per_second=10_000,
+    chat_interval_ms=0,
+    max_send_attempts=3,
+    close_batch_size=100,
+    update_concurrency=8,
+    update_dedupe_window=10_000,
+    http=HttpConfig(
+        pool_size=256,
+        keepalive_connections=256,
+        keepalive_expiry_seconds=5,
+        http2=False,
+        connect_timeout_seconds=5,
+        read_timeout_seconds=5,
+        write_timeout_seconds=5,
+        media_write_timeout_seconds=20,
+        pool_timeout_seconds=1,
+    ),
+)
+
+
+def _meme(meme_id: int, *, weight: int, file_name: str | None = None) -> Meme:
+    return Meme(
+        id=meme_id,
+        kind=MemeKind.photo,
+        weekday=_MONDAY.weekday(),
+        weight=weight,
+        file_name=file_name,
+        file_id=f"file-{meme_id}",
+        last_sent_at=None,
+    )
+
+
+@pytest.mark.parametrize("meme_count", [2, 20, 2_000])
+def test_get_meme(meme_count: int) -> None:
+    async def _run() -> tuple[float, list[Meme]]:
+        database = MemoryDatabase()
+        rng = random.Random(0)
+        for meme_id in range(1, meme_count + 1):
+            database.add_meme(_meme(meme_id, weight=rng.randint(1, 5)))
+
+        catalog = MemeCatalog(database, upload=None, rng=rng)
+        await catalog.load()
+        start = time.perf_counter()
+        drawn = [catalog.get_meme(_MONDAY) for _ in range(_DRAWS)]
+        duration = time.perf_counter() - start
+        assert None not in drawn
+        return duration, [meme for meme in drawn if meme is not None]
+
+    duration, drawn = asyncio.run(_run())
+
+    counts = collections.Counter(meme.id for meme in drawn)
+    weights = {meme.id: meme.weight for meme in drawn}
+    total_weight = sum(weights.values())
+
+    # Never the same meme twice in a row, unless one outweighs all others
+    repeats = sum(a.id == b.id for a, b in zip(drawn, drawn[1:], strict=False))
+    if 2 * max(weights.values()) <= total_weight:
+        assert repeats == 0
+
+    # Each meme comes up in proportion to its weight
+    for meme_id, weight in weights.items():
+        expected = len(drawn) * weight / total_weight
+        assert abs(counts[meme_id] - expected) <= max(weight, expected * 0.05)
+
+    print()
+    print(
+        f"{meme_count:>5} memes: {duration / _DRAWS * 1e9:7.0f} ns per get_meme()"
+        f"  ({repeats} repeats in a row)"
+    )
+
+
+def test_send_polls_with_stale_file_id() -> None:
+    async def _run() -> tuple[float, float, list[Meme], FakeBot]:
+        database = MemoryDatabase()
+        await database.open()
+        # Memes go by the local weekday of the chats
+        stale = await database.insert_meme(
+            kind=MemeKind.photo,
+            weekday=datetime.now(tz=UTC).weekday(),
+            weight=1,
+            file_name="stale.jpg",
+            content=b"stale",
+        )
+        await database.set_meme_file_id(stale.id, "stale")
+        fake_bot = FakeBot(stale_file_ids={"stale"}, upload_latency=_UPLOAD_LATENCY)
+        bot = MoodBot(
+            _CONFIG,
+            None,
+            database,
+            meme_config=MemeConfig(upload_chat_id=_UPLOAD_CHAT_ID),
+            bot=fake_bot,
+        )
+
+        start = time.perf_counter()
+        await bot.send_polls([-(chat_index + 1) for chat_index in range(_CHATS)])
+        send_duration = time.perf_counter() - start
+        await bot.memes.close()
+        upload_duration = time.perf_counter() - start
+        return send_duration, upload_duration, await database.get_memes(), fake_bot
+
+    send_duration, upload_duration, memes, fake_bot = asyncio.run(_run())
+
+    sent_polls = [call for call in fake_bot.calls if call.method == "sendPoll"]
+    uploads = [call for call in fake_bot.calls if call.chat_id == _UPLOAD_CHAT_ID]
+    assert len(sent_polls) == _CHATS
+    # Uploaded once, without holding up the polls
+    assert len(uploads) == 1
+    assert send_duration < _UPLOAD_LATENCY
+    assert len(memes) == 1
+    assert memes[0].file_id not in {None, "stale"}
+
+    print()
+    print(
+        f"send polls with a stale meme: {send_duration * 1000:7.1f} ms"
+        f"  (uploaded again after {upload_duration * 1000:7.1f} ms)"
+    )
@@ -0,0 +1,72 @@
+import dataclasses
+import sys
+import time
+import tracemalloc
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, Any
+
+from bot.model import Poll, PollAnswer, PollOption, User
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+_COUNT = 100_000
+_NOW = datetime.now(tz=UTC)
+
+
+def _without_slots(cls: Any) -> type:
+    # Same fields, but a regular __dict__ per instance like before
+    return dataclasses.make_dataclass(
+        f"Unslotted{cls.__name__}",
+        [(field.name, field.type) for field in dataclasses.fields(cls)],
+        kw_only=True,
+        frozen=cls.__dataclass_params__.frozen,
+    )
+
+
+_FACTORIES: dict[str, Callable[[type, int], Any]] = {
+    "Poll": lambda cls, i: cls(
+        id=str(i),
+        group_id=i,
+        message_id=i,
+        creation_time=_NOW,
+        close_time=None,
+    ),
+    "User": lambda cls, i: cls(id=i, first_name="Name"),
+    "PollAnswer": lambda cls, i: cls(
+        time=_NOW,
+        option=PollOption.good,
+        user_id=i,
+        poll_id="poll",
+    ),
+}
+
+
+def _measure(cls: type, factory: Callable[[type, int], Any]) -> tuple[float, float]:
+    start = time.perf_counter()
+    for i in range(_COUNT):
+        factory(cls, i)
+    construction = (time.perf_counter() - start) / _COUNT
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    # Shared values so only the objects themselves are counted
+    objects = [factory(cls, 0) for _ in range(_COUNT)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = (after - before - sys.getsizeof(objects)) / _COUNT
+
+    return construction, size
+
+
+def test_model_footprint() -> None:
+    print()
+    for cls in [Poll, User, PollAnswer]:
+        factory = _FACTORIES[cls.__name__]
+        slotted_time, slotted_size = _measure(cls, factory)
+        plain_time, plain_size = _measure(_without_slots(cls), factory)
+        print(
+            f"{cls.__name__:>10}:"
+            f" {slotted_size:5.0f} B vs {plain_size:5.0f} B without slots,"
+            f" {slotted_time * 1e9:5.0f} ns vs {plain_time * 1e9:5.0f} ns to construct"
+        )
@@ -0,0 +1,234 @@
+import asyncio
+import statistics
+import time
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING, cast
+
+import pytest
+import telegram
+
+from bot.bot import MoodBot
+from bot.config import HttpConfig, TelegramConfig
+from bot.database_memory import MemoryDatabase
+from bot.model import Poll, PollAnswer, PollOption, User
+from tests.benchmarks.fakes import FakeBot
+
+if TYPE_CHECKING:
+    from bot.bot import Context
+
+# Runs without Postgres or Telegram, timings only cover the bot itself, the
+# in-memory database and the simulated Bot API latency.
+_CHATS = 200
+_USERS_PER_CHAT = 25
+_HISTORY_DAYS = 3 * 365
+_ANSWERED_DAYS = 30
+_CONFIG = TelegramConfig(
+    token="123456:fake",
+    api_base_url="http://127.0.0.1:1/bot",
+    timezone_name="Europe/Berlin",
+    send_concurrency=8,
+    messages_per_second=25,
+    chat_interval_ms=1000,
+    max_send_attempts=3,
+    close_batch_size=100,
+    update_concurrency=8,
+    update_dedupe_window=10_000,
+    http=HttpConfig(
+        pool_size=256,
+        keepalive_connections=256,
+        keepalive_expiry_seconds=5,
+        http2=False,
+        connect_timeout_seconds=5,
+        read_timeout_seconds=5,
+        write_timeout_seconds=5,
+        media_write_timeout_seconds=20,
+        pool_timeout_seconds=1,
+    ),
+)
+
+
+def _create_bot(database: MemoryDatabase, fake_bot: FakeBot) -> MoodBot:
+    return MoodBot(_CONFIG, None, database, bot=fake_bot)
+
+
+def _user(chat_index: int, user_index: int) -> User:
+    user_id = chat_index * _USERS_PER_CHAT + user_index + 1
+    return User(id=user_id, first_name=f"User {user_id}")
+
+
+async def _seed_history(database: MemoryDatabase, *, now: datetime) -> None:
+    # Every chat got a poll every day, the recent ones were answered by
+    # everyone. All of them are closed already.
+    polls: list[Poll] = []
+    for day in range(_HISTORY_DAYS, 0, -1):
+        creation_time = now - timedelta(days=day)
+        for chat_index in range(_CHATS):
+            message_id = day * _CHATS + chat_index
+            polls.append(
+                Poll(
+                    id=f"history-{message_id}",
+                    group_id=-(chat_index + 1),
+                    message_id=message_id,
+                    creation_time=creation_time,
+                    close_time=creation_time + timedelta(hours=20),
+                )
+            )
+    await database.insert_polls(polls)
+
+    for poll in polls[-_ANSWERED_DAYS * _CHATS :]:
+        chat_index = -poll.group_id - 1
+        for user_index in range(_USERS_PER_CHAT):
+            user = _user(chat_index, user_index)
+            answer = PollAnswer(
+                time=poll.creation_time,
+                option=PollOption(user_index % len(PollOption)),
+                user_id=user.id,
+                poll_id=poll.id,
+            )
+            await database.record_answer(user, answer)
+
+
+def _answer(user: User, poll_id: str, option: int) -> telegram.PollAnswer:
+    return telegram.PollAnswer(
+        poll_id=poll_id,
+        option_ids=(option % len(PollOption),),
+        user=telegram.User(id=user.id, first_name=user.first_name, is_bot=False),
+    )
+
+
+def _print_latencies(
+    name: str,
+    count: int,
+    duration: float,
+    latencies: list[float],
+) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print()
+    print(
+        f"{name:>22}: {count / duration:9.0f}/s"
+        f"  p50 {quantiles[49] * 1000:8.3f} ms"
+        f"  p99 {quantiles[98] * 1000:8.3f} ms"
+        f"  max {max(latencies) * 1000:8.3f} ms"
+    )
+
+
+def test_poll_answer_throughput() -> None:
+    async def _run() -> tuple[float, list[float]]:
+        database = MemoryDatabase()
+        now = datetime.now(tz=UTC)
+        await _seed_history(database, now=now)
+
+        polls: list[Poll] = []
+        for chat_index in range(_CHATS):
+            message_id = -(chat_index + 1)
+            polls.append(
+                Poll(
+                    id=FakeBot.poll_id(message_id),
+                    group_id=-(chat_index + 1),
+                    message_id=message_id,
+                    creation_time=now,
+                    close_time=None,
+                )
+            )
+        await database.insert_polls(polls)
+
+        # Everyone answers once, then every fifth user changes their mind
+        updates: list[telegram.Update] = []
+        for round_number in range(2):
+            for poll in polls:
+                chat_index = -poll.group_id - 1
+                for user_index in range(0, _USERS_PER_CHAT, 1 + round_number * 4):
+                    user = _user(chat_index, user_index)
+                    updates.append(
+                        telegram.Update(
+                            update_id=len(updates),
+                            poll_answer=_answer(user, poll.id, round_number),
+                        )
+                    )
+
+        bot = _create_bot(database, FakeBot())
+        context = cast("Context", None)
+        latencies: list[float] = []
+        start = time.perf_counter()
+        for update in updates:
+            update_start = time.perf_counter()
+            await bot._on_poll_answer(update, context)
+            latencies.append(time.perf_counter() - update_start)
+
+        return time.perf_counter() - start, latencies
+
+    duration, latencies = asyncio.run(_run())
+    _print_latencies("poll answers", len(latencies), duration, latencies)
+
+
+@pytest.mark.parametrize("max_latency", [0.0, 0.2])
+def test_send_polls(max_latency: float) -> None:
+    async def _run() -> tuple[float, list[float]]:
+        database = MemoryDatabase()
+        await database.open()
+        await _seed_history(database, now=datetime.now(tz=UTC))
+        fake_bot = FakeBot(min_latency=max_latency / 4, max_latency=max_latency)
+        bot = _create_bot(database, fake_bot)
+
+        start = time.perf_counter()
+        await bot.send_polls([-(chat_index + 1) for chat_index in range(_CHATS)])
+        duration = time.perf_counter() - start
+
+        # Time until each chat got its poll
+        delivered = [
+            call.finished - start
+            for call in fake_bot.calls
+            if call.method == "sendPoll"
+        ]
+        return duration, delivered
+
+    duration, delivered = asyncio.run(_run())
+    _print_latencies(
+        f"send polls ({max_latency:.1f} s)",
+        len(delivered),
+        duration,
+        delivered,
+    )
+
+
+@pytest.mark.parametrize("max_latency", [0.0, 0.2])
+def test_close_open_polls(max_latency: float) -> None:
+    async def _run() -> tuple[float, list[float]]:
+        database = MemoryDatabase()
+        now = datetime.now(tz=UTC)
+        await _seed_history(database, now=now)
+
+        # Yesterday's polls are still open
+        yesterday = now - timedelta(days=1)
+        open_polls: list[Poll] = []
+        for chat_index in range(_CHATS):
+            message_id = -(chat_index + 1)
+            open_polls.append(
+                Poll(
+                    id=FakeBot.poll_id(message_id),
+                    group_id=-(chat_index + 1),
+                    message_id=message_id,
+                    creation_time=yesterday - timedelta(hours=1),
+                    close_time=None,
+                )
+            )
+        await database.insert_polls(open_polls)
+
+        fake_bot = FakeBot(min_latency=max_latency / 4, max_latency=max_latency)
+        bot = _create_bot(database, fake_bot)
+
+        start = time.perf_counter()
+        await bot.close_open_polls()
+        duration = time.perf_counter() - start
+
+        closed = [call.finished - start for call in fake_bot.calls]
+        assert len(closed) == _CHATS
+        return duration, closed
+
+    duration, closed = asyncio.run(_run())
+    _print_latencies(
+        f"close polls ({max_latency:.1f} s)",
+        len(closed),
+        duration,
+        closed,
+    )
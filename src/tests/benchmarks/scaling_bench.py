@@ -0,0 +1,153 @@
+import asyncio
+import collections
+import contextlib
+import random
+import time
+from datetime import UTC, datetime
+
+import telegram
+from telegram.ext import TypeHandler
+
+from bot.bot import MoodBot
+from bot.config import HttpConfig, PartitionConfig, TelegramConfig
+from bot.model import Poll, PollOption
+from bot.standin import BotApiStandIn
+from tests.benchmarks.fakes import SlowDatabase
+
+# Replicas of handle-updates in one process, all of them receive every
+# update like they would with their own NATS consumer. The shared database
+# takes a few milliseconds per answer, which is what limits a replica with
+# a fixed update concurrency.
+_REPLICA_COUNTS = [1, 2, 4]
+_UPDATES = 3_000
+_USERS = 5_000
+_CHATS = 50
+# Every tenth update is delivered a second time
+_REDELIVERY_INTERVAL = 10
+_DB_LATENCY = 0.005
+_UPDATE_CONCURRENCY = 4
+
+
+def _config(api_base_url: str) -> TelegramConfig:
+    return TelegramConfig(
+        token="123456:scaling",
+        api_base_url=api_base_url,
+        timezone_name="Europe/Berlin",
+        send_concurrency=8,
+        messages_per_second=25,
+        chat_interval_ms=1000,
+        max_send_attempts=3,
+        close_batch_size=100,
+        update_concurrency=_UPDATE_CONCURRENCY,
+        update_dedupe_window=10_000,
+        http=HttpConfig(
+            pool_size=256,
+            keepalive_connections=256,
+            keepalive_expiry_seconds=5,
+            http2=False,
+            connect_timeout_seconds=5,
+            read_timeout_seconds=5,
+            write_timeout_seconds=5,
+            media_write_timeout_seconds=20,
+            pool_timeout_seconds=1,
+        ),
+    )
+
+
+def _create_updates(polls: list[Poll]) -> list[telegram.Update]:
+    rng = random.Random(0)
+    updates: list[telegram.Update] = []
+    for update_id in range(1, _UPDATES + 1):
+        user_id = rng.randrange(1, _USERS + 1)
+        update = telegram.Update(
+            update_id=update_id,
+            poll_answer=telegram.PollAnswer(
+                poll_id=rng.choice(polls).id,
+                option_ids=(rng.randrange(len(PollOption)),),
+                user=telegram.User(id=user_id, first_name="User", is_bot=False),
+            ),
+        )
+        updates.append(update)
+        if update_id % _REDELIVERY_INTERVAL == 0:
+            updates.append(updates[-_REDELIVERY_INTERVAL])
+
+    return updates
+
+
+async def _run(replicas: int) -> tuple[float, collections.Counter[int]]:
+    database = SlowDatabase(latency=_DB_LATENCY)
+    polls = [
+        Poll(
+            id=f"poll-{chat_index}",
+            group_id=-(chat_index + 1),
+            message_id=chat_index,
+            creation_time=datetime.now(tz=UTC),
+            close_time=None,
+        )
+        for chat_index in range(_CHATS)
+    ]
+    await database.insert_polls(polls)
+    updates = _create_updates(polls)
+
+    handled: collections.Counter[int] = collections.Counter()
+    unique = len({update.update_id for update in updates})
+    done = asyncio.Event()
+
+    async def _on_handled(update: telegram.Update, _: object) -> None:
+        handled[update.update_id] += 1
+        if len(handled) == unique:
+            done.set()
+
+    standin = BotApiStandIn(min_latency=0.0, max_latency=0.0)
+    await standin.start()
+    try:
+        bots = [
+            MoodBot(
+                _config(standin.base_url),
+                None,
+                database,
+                partition_config=(
+                    PartitionConfig(index=index, count=replicas)
+                    if replicas > 1
+                    else None
+                ),
+            )
+            for index in range(replicas)
+        ]
+        async with contextlib.AsyncExitStack() as stack:
+            for bot in bots:
+                app = bot.app
+                app.add_handler(TypeHandler(telegram.Update, _on_handled), group=1)
+                await stack.enter_async_context(app)
+                await app.start()
+                stack.push_async_callback(app.stop)
+
+            start = time.perf_counter()
+            for update in updates:
+                for bot in bots:
+                    bot.app.update_queue.put_nowait(update)
+            await done.wait()
+            duration = time.perf_counter() - start
+            # Redeliveries at the end must be dropped too
+            await asyncio.sleep(0.1)
+    finally:
+        await standin.close()
+
+    return duration, handled
+
+
+def test_replica_scaling() -> None:
+    print()
+    baseline: float | None = None
+    for replicas in _REPLICA_COUNTS:
+        duration, handled = asyncio.run(_run(replicas))
+        # Every update exactly once, across all replicas
+        assert len(handled) == _UPDATES
+        assert set(handled.values()) == {1}
+
+        throughput = len(handled) / duration
+        baseline = baseline or throughput
+        print(
+            f"{replicas} replicas: {throughput:7.0f} answers/s"
+            f"  ({throughput / baseline:4.2f}x)"
+        )
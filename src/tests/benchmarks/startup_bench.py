@@ -0,0 +1,138 @@
+import asyncio
+import collections
+import statistics
+import subprocess
+import sys
+import time
+
+import pytest
+
+from bot.standin import BotApiStandIn
+
+# Every send-polls and close-polls run is a cold start in a fresh CronJob pod,
+# so each run here starts a new interpreter too. Runs offline, the Bot API is
+# the local stand-in and the database lives in memory.
+_RUNS = 5
+_IMPORTS = {
+    "cron": "import bot.__main__, bot.bot",
+    "handle-updates": (
+        "import bot.__main__, bot.bot, bot.update_processor, bs_nats_updater"
+    ),
+}
+_SEND_POLLS = """
+import asyncio
+import sys
+
+from bot.__main__ import _send_polls
+from bot.bot import MoodBot
+from bot.config import HttpConfig, TelegramConfig
+from bot.database_memory import MemoryDatabase
+
+config = TelegramConfig(
+    token="123456:startup",
+    api_base_url=sys.argv[1],
+    timezone_name="Europe/Berlin",
+    send_concurrency=8,
+    messages_per_second=25,
+    chat_interval_ms=0,
+    max_send_attempts=1,
+    close_batch_size=100,
+    update_concurrency=8,
+    update_dedupe_window=10_000,
+    http=HttpConfig(
+        pool_size=256,
+        keepalive_connections=256,
+        keepalive_expiry_seconds=5,
+        http2=False,
+        connect_timeout_seconds=5,
+        read_timeout_seconds=5,
+        write_timeout_seconds=5,
+        media_write_timeout_seconds=20,
+        pool_timeout_seconds=1,
+    ),
+)
+mood_bot = MoodBot(config, None, MemoryDatabase(), active_chats=[-1])
+asyncio.run(_send_polls(mood_bot))
+
+# Only handle-updates needs these, cron runs must not pay for them
+if imported := {"telegram.ext", "bs_nats_updater"} & sys.modules.keys():
+    sys.exit(f"send-polls imported {sorted(imported)}")
+"""
+
+
+def _import_times(code: str) -> dict[str, int]:
+    # Microseconds spent importing each top level package, submodules included
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    times: collections.Counter[str] = collections.Counter()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        self_time, _, name = line.removeprefix("import time:").split("|")
+        if not self_time.strip().isdigit():
+            continue
+
+        times[name.strip().split(".")[0]] += int(self_time)
+
+    return times
+
+
+@pytest.mark.parametrize("mode", list(_IMPORTS))
+def test_import_time(mode: str) -> None:
+    runs = [_import_times(_IMPORTS[mode]) for _ in range(_RUNS)]
+    totals = [sum(times.values()) for times in runs]
+    # The fastest run has the least noise
+    fastest = runs[totals.index(min(totals))]
+
+    print()
+    print(
+        f"{mode:>15} imports: median {statistics.median(totals) / 1000:7.1f} ms"
+        f"  min {min(totals) / 1000:7.1f} ms"
+    )
+    heaviest = sorted(fastest.items(), key=lambda item: item[1], reverse=True)
+    for package, self_time in heaviest[:8]:
+        print(f"{package:>32}: {self_time / 1000:7.1f} ms")
+
+
+def test_time_to_first_api_call() -> None:
+    async def _run() -> list[tuple[float, float]]:
+        standin = BotApiStandIn(min_latency=0.0, max_latency=0.0)
+        await standin.start()
+        try:
+            timings: list[tuple[float, float]] = []
+            for _ in range(_RUNS):
+                standin.first_call_at = None
+                start = time.perf_counter()
+                process = await asyncio.create_subprocess_exec(
+                    sys.executable,
+                    "-c",
+                    _SEND_POLLS,
+                    standin.base_url,
+                    stdout=subprocess.DEVNULL,
+                )
+                assert await process.wait() == 0
+                finished = time.perf_counter() - start
+
+                first_call_at = standin.first_call_at
+                assert first_call_at is not None
+                timings.append((first_call_at - start, finished))
+
+            return timings
+        finally:
+            await standin.close()
+
+    timings = asyncio.run(_run())
+    first_calls = [first_call for first_call, _ in timings]
+    finished = [total for _, total in timings]
+    print()
+    print(
+        f"send-polls first API call: median"
+        f" {statistics.median(first_calls) * 1000:7.1f} ms"
+        f"  min {min(first_calls) * 1000:7.1f} ms"
+        f"  (exited after {statistics.median(finished) * 1000:7.1f} ms)"
+    )
@@ -0,0 +1,51 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING
+
+import sentry_sdk
+
+from bot import tracing
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    import pytest
+
+
+async def _operation() -> None:
+    pass
+
+
+async def _bare() -> None:
+    await _operation()
+
+
+async def _traced() -> None:
+    with tracing.transaction(op="update", name="bench"):
+        with tracing.span(op="db", name="bench"):
+            await _operation()
+
+
+def _measure(function: Callable[[], Awaitable[None]], iterations: int) -> float:
+    async def _run() -> float:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await function()
+        return (time.perf_counter() - start) / iterations
+
+    return asyncio.run(_run())
+
+
+def test_tracing_overhead(monkeypatch: pytest.MonkeyPatch) -> None:
+    bare = _measure(_bare, 100_000)
+    disabled = _measure(_traced, 100_000)
+
+    # No DSN, so nothing is sent, but spans are still created and sampled
+    sentry_sdk.init(traces_sample_rate=1.0)
+    monkeypatch.setattr(tracing, "_enabled", True)
+    enabled = _measure(_traced, 1_000)
+
+    print()
+    print(f"bare:     {bare * 1e9:8.0f} ns/update")
+    print(f"disabled: {disabled * 1e9:8.0f} ns/update (+{(disabled - bare) * 1e9:.0f})")
+    print(f"enabled:  {enabled * 1e9:8.0f} ns/update (+{(enabled - bare) * 1e9:.0f})")
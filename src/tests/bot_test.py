@@ -0,0 +1,334 @@
+import asyncio
+from datetime import UTC, datetime, time, timedelta
+from typing import TYPE_CHECKING, Any
+from zoneinfo import ZoneInfo
+
+import pytest
+import telegram
+from telegram.constants import ChatType
+from telegram.error import RetryAfter
+
+from bot.bot import MoodBot
+from bot.config import HttpConfig, SchedulerConfig, TelegramConfig
+from bot.database_memory import MemoryDatabase
+from bot.model import Chat, Poll
+from bot.ratelimit import SendRateLimiter
+from tests.benchmarks.fakes import FakeBot
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+_CONFIG = TelegramConfig(
+    token="123456:fake",
+    api_base_url="http://127.0.0.1:1/bot",
+    timezone_name="Europe/Berlin",
+    send_concurrency=8,
+    messages_per_second=1000,
+    chat_interval_ms=0,
+    max_send_attempts=3,
+    close_batch_size=100,
+    update_concurrency=8,
+    update_dedupe_window=10_000,
+    http=HttpConfig(
+        pool_size=16,
+        keepalive_connections=16,
+        keepalive_expiry_seconds=5,
+        http2=False,
+        connect_timeout_seconds=5,
+        read_timeout_seconds=5,
+        write_timeout_seconds=5,
+        media_write_timeout_seconds=20,
+        pool_timeout_seconds=1,
+    ),
+)
+
+
+class _FlakyBot(FakeBot):
+    """
+    Rate limits the polls to a chat the given number of times, and holds back
+    the polls to blocked chats until they are released.
+    """
+
+    def __init__(self, *, rate_limited: dict[int, int] | None = None) -> None:
+        super().__init__()
+        self._rate_limited = dict(rate_limited or {})
+        self._released: dict[int, asyncio.Event] = {}
+
+    def block(self, chat_id: int) -> asyncio.Event:
+        released = asyncio.Event()
+        self._released[chat_id] = released
+        return released
+
+    async def send_poll(self, *args: Any, **kwargs: Any) -> telegram.Message:
+        chat_id = kwargs["chat_id"]
+        if (released := self._released.get(chat_id)) is not None:
+            await released.wait()
+        if self._rate_limited.get(chat_id):
+            self._rate_limited[chat_id] -= 1
+            raise RetryAfter(timedelta(seconds=3))
+
+        return await super().send_poll(*args, **kwargs)
+
+
+class _FailingDatabase(MemoryDatabase):
+    async def insert_polls(self, polls: Collection[Poll]) -> None:
+        raise ConnectionError("Database is down")
+
+
+async def _create_bot(
+    fake_bot: _FlakyBot,
+    database: MemoryDatabase | None = None,
+) -> tuple[MoodBot, MemoryDatabase]:
+    database = database or MemoryDatabase()
+    await database.open()
+    return MoodBot(_CONFIG, None, database, bot=fake_bot), database
+
+
+def _record_pauses(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    # Skips the actual waiting
+    pauses: list[float] = []
+    monkeypatch.setattr(
+        SendRateLimiter,
+        "pause",
+        lambda _, seconds: pauses.append(seconds),
+    )
+    return pauses
+
+
+async def _group_ids(database: MemoryDatabase) -> list[int]:
+    polls = database.get_open_polls(created_before=datetime.now(tz=UTC))
+    return sorted([poll.group_id async for poll in polls])
+
+
+def test_retries_rate_limited_sends(monkeypatch: pytest.MonkeyPatch) -> None:
+    pauses = _record_pauses(monkeypatch)
+
+    async def _run() -> None:
+        bot, database = await _create_bot(_FlakyBot(rate_limited={-1: 2}))
+
+        await bot.send_polls([-1, -2])
+        assert await _group_ids(database) == [-2, -1]
+        # What Telegram asked for and a growing backoff
+        assert pauses == [4.0, 5.0]
+
+    asyncio.run(_run())
+
+
+def test_gives_up_after_max_send_attempts(monkeypatch: pytest.MonkeyPatch) -> None:
+    pauses = _record_pauses(monkeypatch)
+
+    async def _run() -> None:
+        bot, database = await _create_bot(_FlakyBot(rate_limited={-1: 3}))
+
+        with pytest.raises(ExceptionGroup) as error:
+            await bot.send_polls([-1, -2])
+        assert error.group_contains(RetryAfter)
+        assert len(error.value.exceptions) == 1
+        assert len(pauses) == 2
+        # The other chat got its poll all the same
+        assert await _group_ids(database) == [-2]
+
+    asyncio.run(_run())
+
+
+def test_stores_polls_as_they_are_sent() -> None:
+    async def _run() -> None:
+        fake_bot = _FlakyBot()
+        released = fake_bot.block(-2)
+        bot, database = await _create_bot(fake_bot)
+
+        sending = asyncio.create_task(bot.send_polls([-1, -2]))
+        async with asyncio.timeout(1):
+            while not await _group_ids(database):
+                await asyncio.sleep(0.001)
+        assert await _group_ids(database) == [-1]
+
+        released.set()
+        await sending
+        assert await _group_ids(database) == [-2, -1]
+
+    asyncio.run(_run())
+
+
+def test_fails_chats_whose_poll_was_not_stored() -> None:
+    async def _run() -> None:
+        bot, _ = await _create_bot(_FlakyBot(), _FailingDatabase())
+
+        with pytest.raises(ExceptionGroup) as error:
+            await bot.send_polls([-1, -2])
+        assert error.group_contains(ConnectionError)
+        assert len(error.value.exceptions) == 2
+
+    asyncio.run(_run())
+
+
+def test_opens_and_closes_the_bot() -> None:
+    class _Bot(FakeBot):
+        def __init__(self) -> None:
+            super().__init__()
+            self._events: list[str] = []
+
+        @property
+        def events(self) -> list[str]:
+            return self._events
+
+        async def initialize(self) -> None:
+            self._events.append("initialize")
+
+        async def shutdown(self) -> None:
+            self._events.append("shutdown")
+
+    async def _run() -> None:
+        fake_bot = _Bot()
+        bot = MoodBot(_CONFIG, None, MemoryDatabase(), bot=fake_bot)
+
+        await bot.initialize()
+        await bot.close()
+        assert fake_bot.events == ["initialize", "shutdown"]
+
+    asyncio.run(_run())
+
+
+async def _add_chats(bot: MoodBot, database: MemoryDatabase, chats: list[Chat]) -> None:
+    for chat in chats:
+        database.update_chat(chat)
+    await bot.chats.reload()
+
+
+def _chat(chat_id: int, *, timezone_name: str | None, send_time: time | None) -> Chat:
+    return Chat(
+        id=chat_id,
+        is_enabled=True,
+        timezone_name=timezone_name,
+        send_time=send_time,
+        memes_enabled=False,
+    )
+
+
+def _poll(message_id: int, chat_id: int, creation_time: datetime) -> Poll:
+    return Poll(
+        id=FakeBot.poll_id(message_id),
+        group_id=chat_id,
+        message_id=message_id,
+        creation_time=creation_time,
+        close_time=None,
+    )
+
+
+def _start_of_today(timezone: ZoneInfo) -> datetime:
+    today = datetime.now(tz=timezone).date()
+    return datetime.combine(today, time(), tzinfo=timezone)
+
+
+def test_closes_polls_once_the_chats_day_is_over() -> None:
+    async def _run() -> None:
+        bot, database = await _create_bot(_FlakyBot())
+        new_york = ZoneInfo("America/New_York")
+        await _add_chats(
+            bot,
+            database,
+            [
+                _chat(-1, timezone_name=None, send_time=None),
+                _chat(-2, timezone_name="America/New_York", send_time=None),
+            ],
+        )
+        berlin_midnight = _start_of_today(ZoneInfo(_CONFIG.timezone_name))
+        new_york_midnight = _start_of_today(new_york)
+        await database.insert_polls(
+            [
+                _poll(1, -1, berlin_midnight - timedelta(minutes=1)),
+                _poll(2, -1, berlin_midnight),
+                _poll(3, -2, new_york_midnight - timedelta(minutes=1)),
+                _poll(4, -2, new_york_midnight),
+            ]
+        )
+
+        await bot.close_open_polls()
+        assert await _group_ids(database) == [-2, -1]
+        for message_id in (1, 3):
+            poll = await database.get_poll(FakeBot.poll_id(message_id))
+            assert poll.close_time is not None
+
+    asyncio.run(_run())
+
+
+def test_closes_all_polls_of_given_chats() -> None:
+    async def _run() -> None:
+        bot, database = await _create_bot(_FlakyBot())
+        now = datetime.now(tz=UTC)
+        await database.insert_polls(
+            [_poll(1, -1, now), _poll(2, -2, now), _poll(3, -3, now)]
+        )
+
+        await bot.close_open_polls([-1, -2], skip_chat_ids=[-2])
+        assert await _group_ids(database) == [-3, -2]
+
+    asyncio.run(_run())
+
+
+def test_schedules_closing_after_each_send_time() -> None:
+    async def _run() -> None:
+        bot, database = await _create_bot(_FlakyBot())
+        await _add_chats(
+            bot,
+            database,
+            [
+                _chat(-1, timezone_name=None, send_time=None),
+                _chat(-2, timezone_name=None, send_time=time(23)),
+                _chat(-3, timezone_name="America/New_York", send_time=None),
+            ],
+        )
+        config = SchedulerConfig(
+            send_polls_at=time(13),
+            close_polls_at=time(0, 5),
+            max_delay_minutes=60,
+        )
+
+        jobs = bot._get_scheduled_jobs(config)
+        assert sorted((job.name, job.at, str(job.timezone)) for job in jobs) == [
+            ("close-polls", time(0, 5), "Europe/Berlin"),
+            ("close-polls 00:05 America/New_York", time(0, 5), "America/New_York"),
+            ("close-polls 10:05 Europe/Berlin", time(10, 5), "Europe/Berlin"),
+            ("send-polls", time(13), "Europe/Berlin"),
+            ("send-polls 13:00 America/New_York", time(13), "America/New_York"),
+            ("send-polls 23:00 Europe/Berlin", time(23), "Europe/Berlin"),
+        ]
+
+    asyncio.run(_run())
+
+
+def test_replies_through_the_sending_bot() -> None:
+    class _Bot(FakeBot):
+        def __init__(self) -> None:
+            super().__init__()
+            self._replies: list[tuple[int, str, int | None]] = []
+
+        @property
+        def replies(self) -> list[tuple[int, str, int | None]]:
+            return self._replies
+
+        async def send_message(self, *args: Any, **kwargs: Any) -> telegram.Message:
+            reply_parameters = kwargs["reply_parameters"]
+            self._replies.append(
+                (kwargs["chat_id"], kwargs["text"], reply_parameters.message_id)
+            )
+            return self._message(kwargs["chat_id"])
+
+    async def _run() -> None:
+        fake_bot = _Bot()
+        bot, _ = await _create_bot(fake_bot)
+        # Not bound to any bot, like the updater's bot it must not be used
+        message = telegram.Message(
+            message_id=7,
+            date=datetime.now(tz=UTC),
+            chat=telegram.Chat(id=-1, type=ChatType.GROUP),
+            from_user=telegram.User(id=1, first_name="Alice", is_bot=False),
+            text="/stats",
+        )
+
+        await bot._on_stats(telegram.Update(update_id=1, message=message), None)
+        assert fake_bot.replies == [
+            (-1, "Noch keine Antworten in dieser Gruppe.", 7),
+        ]
+
+    asyncio.run(_run())
@@ -0,0 +1,62 @@
+import pytest
+
+from bot.cache import LruCache
+
+
+def test_evicts_least_recently_used() -> None:
+    cache: LruCache[str, int] = LruCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+    assert cache.stats.evictions == 1
+
+
+def test_counts_hits_and_misses() -> None:
+    cache: LruCache[str, int] = LruCache(max_size=2)
+    cache.put("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert "a" in cache
+    assert cache.get("a", count=False) == 1
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+
+def test_expires_entries_after_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 100.0
+    monkeypatch.setattr("bot.cache.time.monotonic", lambda: now)
+    cache: LruCache[str, int] = LruCache(max_size=2, ttl_seconds=10)
+    cache.put("a", 1)
+
+    now += 10
+    assert cache.get("a") == 1
+
+    now += 1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.stats.expirations == 1
+    assert cache.stats.misses == 1
+
+
+def test_discards_and_clears() -> None:
+    cache: LruCache[str, int] = LruCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    cache.discard("a")
+    cache.discard("missing")
+    assert "a" not in cache
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_requires_positive_size() -> None:
+    with pytest.raises(ValueError, match="max_size"):
+        LruCache(max_size=0)
@@ -0,0 +1,163 @@
+import asyncio
+from datetime import UTC, datetime
+
+import pytest
+
+from bot.config import WriteBufferConfig
+from bot.database_buffer import BufferedDatabase
+from bot.metrics import REGISTRY
+from bot.model import PollAnswer, PollOption, User
+from tests.fakes import RecordingDatabase, create_poll
+
+
+def _answer(user_id: int, option: PollOption, poll_id: str = "poll") -> PollAnswer:
+    return PollAnswer(
+        time=datetime.now(tz=UTC),
+        option=option,
+        user_id=user_id,
+        poll_id=poll_id,
+    )
+
+
+async def _create(
+    *,
+    max_batch_size: int = 100,
+    max_delay_ms: int = 60_000,
+) -> tuple[BufferedDatabase, RecordingDatabase]:
+    database = RecordingDatabase()
+    await database.insert_polls([create_poll("poll")])
+    for user_id in (1, 2):
+        await database.upsert_user(User(id=user_id, first_name="Known"))
+    buffered = BufferedDatabase(
+        database,
+        WriteBufferConfig(max_batch_size=max_batch_size, max_delay_ms=max_delay_ms),
+    )
+    await buffered.open()
+    return buffered, database
+
+
+def test_flushes_when_batch_is_full() -> None:
+    async def _run() -> None:
+        buffered, database = await _create(max_batch_size=4)
+
+        await buffered.upsert_user(User(id=1, first_name="Ada"))
+        await buffered.upsert_answer(_answer(1, PollOption.good))
+        await buffered.add_to_group(user_id=1, group_id=-1)
+        assert database.batches == []
+        assert buffered.pending_rows == 3
+
+        await buffered.upsert_user(User(id=2, first_name="Grace"))
+        assert len(database.batches) == 1
+        assert len(database.batches[0]) == 4
+        assert buffered.pending_rows == 0
+
+        await buffered.close()
+
+    asyncio.run(_run())
+
+
+def test_flushes_after_delay() -> None:
+    async def _run() -> None:
+        buffered, database = await _create(max_delay_ms=10)
+
+        user = User(id=1, first_name="Ada")
+        await buffered.record_answer(user, _answer(1, PollOption.very_good))
+        assert database.batches == []
+
+        await asyncio.sleep(0.1)
+        assert len(database.batches) == 1
+        assert buffered.pending_rows == 0
+        assert buffered.stats.flushes == 1
+
+        await buffered.close()
+
+    asyncio.run(_run())
+
+
+def test_coalesces_writes_for_the_same_key() -> None:
+    async def _run() -> None:
+        buffered, database = await _create()
+
+        user = User(id=1, first_name="Ada")
+        for option in PollOption:
+            await buffered.record_answer(user, _answer(1, option))
+        assert buffered.pending_rows == 3
+
+        await buffered.flush()
+        (batch,) = database.batches
+        assert [answer.option for answer in batch.answers] == [PollOption.bad]
+        assert batch.poll_memberships == [(1, "poll")]
+
+        await buffered.close()
+
+    asyncio.run(_run())
+
+
+def test_keeps_batch_if_flush_fails() -> None:
+    async def _run() -> None:
+        buffered, database = await _create()
+        await buffered.upsert_answer(_answer(1, PollOption.good))
+        await buffered.upsert_answer(_answer(2, PollOption.good))
+
+        database.fail_writes = True
+        with pytest.raises(ConnectionError):
+            await buffered.flush()
+        assert buffered.pending_rows == 2
+        assert buffered.stats.failed_flushes == 1
+
+        # Written while the batch was failing, so it's newer
+        await buffered.upsert_answer(_answer(1, PollOption.bad))
+        database.fail_writes = False
+        await buffered.flush()
+
+        (batch,) = database.batches
+        options = {answer.user_id: answer.option for answer in batch.answers}
+        assert options == {1: PollOption.bad, 2: PollOption.good}
+
+        await buffered.close()
+
+    asyncio.run(_run())
+
+
+def test_flushes_on_close() -> None:
+    async def _run() -> None:
+        buffered, database = await _create()
+        await buffered.upsert_user(User(id=1, first_name="Ada"))
+
+        await buffered.close()
+        assert len(database.batches) == 1
+
+    asyncio.run(_run())
+
+
+def test_exports_flush_metrics() -> None:
+    def _value(name: str) -> float:
+        prefix = f"{name} "
+        for line in REGISTRY.render().splitlines():
+            if line.startswith(prefix):
+                return float(line.removeprefix(prefix))
+        return 0.0
+
+    async def _run() -> None:
+        buffered, database = await _create()
+        flushes = _value("mood_write_buffer_flushes_total")
+        errors = _value("mood_write_buffer_flush_errors_total")
+        rows = _value("mood_write_buffer_flushed_rows_total")
+        durations = _value("mood_write_buffer_flush_seconds_count")
+
+        await buffered.upsert_answer(_answer(1, PollOption.good))
+        assert _value("mood_write_buffer_pending_rows") == 1
+        database.fail_writes = True
+        with pytest.raises(ConnectionError):
+            await buffered.flush()
+        database.fail_writes = False
+        await buffered.flush()
+
+        assert _value("mood_write_buffer_flushes_total") == flushes + 1
+        assert _value("mood_write_buffer_flush_errors_total") == errors + 1
+        assert _value("mood_write_buffer_flushed_rows_total") == rows + 1
+        assert _value("mood_write_buffer_flush_seconds_count") == durations + 2
+
+        await buffered.close()
+
+    asyncio.run(_run())
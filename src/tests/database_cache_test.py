@@ -0,0 +1,148 @@
+import asyncio
+from datetime import UTC, datetime
+
+import pytest
+
+from bot.config import CacheConfig
+from bot.database import NotFoundException
+from bot.database_cache import CachedDatabase
+from bot.metrics import REGISTRY
+from bot.model import PollAnswer, PollOption, User
+from tests.fakes import RecordingDatabase, create_poll
+
+
+async def _create() -> tuple[CachedDatabase, RecordingDatabase]:
+    database = RecordingDatabase()
+    cached = CachedDatabase(
+        database,
+        CacheConfig(
+            max_polls=2,
+            max_users=2,
+            max_memberships=2,
+            ttl_seconds=60,
+        ),
+    )
+    await cached.open()
+    return cached, database
+
+
+def test_looks_up_poll_once() -> None:
+    async def _run() -> None:
+        cached, database = await _create()
+        await database.insert_polls([create_poll("poll")])
+
+        first = await cached.get_poll("poll")
+        second = await cached.get_poll("poll")
+        assert first == second
+        assert database.calls == ["get_poll"]
+
+        await cached.close()
+
+    asyncio.run(_run())
+
+
+def test_exports_cache_stats() -> None:
+    async def _run() -> None:
+        cached, database = await _create()
+        await database.insert_polls([create_poll("poll")])
+
+        for _ in range(3):
+            await cached.get_poll("poll")
+        lines = REGISTRY.render().splitlines()
+        assert "mood_poll_cache_entries 1.0" in lines
+        assert "mood_poll_cache_hits 2.0" in lines
+        assert "mood_poll_cache_misses 1.0" in lines
+
+        await cached.close()
+
+    asyncio.run(_run())
+
+
+def test_caches_inserted_polls() -> None:
+    async def _run() -> None:
+        cached, database = await _create()
+        await cached.insert_poll(create_poll("poll"))
+
+        await cached.get_poll("poll")
+        assert database.calls == []
+
+        await cached.close()
+
+    asyncio.run(_run())
+
+
+def test_updates_close_time_of_cached_poll() -> None:
+    async def _run() -> None:
+        cached, _ = await _create()
+        await cached.insert_poll(create_poll("poll"))
+
+        close_time = datetime.now(tz=UTC)
+        await cached.update_poll_close_time("poll", close_time)
+        poll = await cached.get_poll("poll")
+        assert poll.close_time == close_time
+
+        await cached.close()
+
+    asyncio.run(_run())
+
+
+def test_does_not_cache_missing_poll() -> None:
+    async def _run() -> None:
+        cached, database = await _create()
+
+        with pytest.raises(NotFoundException):
+            await cached.get_poll("poll")
+        await database.insert_polls([create_poll("poll")])
+        await cached.get_poll("poll")
+        assert database.calls == ["get_poll", "get_poll"]
+
+        await cached.close()
+
+    asyncio.run(_run())
+
+
+def _answer(user_id: int, option: PollOption) -> PollAnswer:
+    return PollAnswer(
+        time=datetime.now(tz=UTC),
+        option=option,
+        user_id=user_id,
+        poll_id="poll",
+    )
+
+
+def test_skips_known_user_and_membership() -> None:
+    async def _run() -> None:
+        cached, database = await _create()
+        user = User(id=1, first_name="Ada")
+
+        for _ in range(2):
+            await cached.upsert_user(user)
+            await cached.add_to_group(user_id=1, group_id=-1)
+        assert database.calls == ["upsert_user", "add_to_group"]
+
+        await cached.upsert_user(User(id=1, first_name="Ada Lovelace"))
+        assert database.calls[-1] == "upsert_user"
+
+        await cached.close()
+
+    asyncio.run(_run())
+
+
+def test_records_only_answer_when_user_is_known() -> None:
+    async def _run() -> None:
+        cached, database = await _create()
+        await cached.insert_poll(create_poll("poll"))
+        user = User(id=1, first_name="Ada")
+
+        await cached.record_answer(user, _answer(1, PollOption.good))
+        await cached.record_answer(user, _answer(1, PollOption.bad))
+        assert database.calls == ["record_answer", "upsert_answer"]
+
+        # A new name is written along with the answer again
+        renamed = User(id=1, first_name="Ada Lovelace")
+        await cached.record_answer(renamed, _answer(1, PollOption.good))
+        assert database.calls[-1] == "record_answer"
+
+        await cached.close()
+
+    asyncio.run(_run())
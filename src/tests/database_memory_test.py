@@ -0,0 +1,58 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+from bot.database_memory import MemoryDatabase
+from bot.model import PollAnswer, PollOption, User
+from tests.fakes import create_poll
+
+
+def test_import_keeps_newer_answers() -> None:
+    async def _run() -> None:
+        database = MemoryDatabase()
+        poll = create_poll("poll")
+        await database.insert_poll(poll)
+        now = datetime.now(tz=UTC)
+        for user_id, answer_time in [(1, now), (2, now - timedelta(hours=1))]:
+            await database.record_answer(
+                User(id=user_id, first_name="Live"),
+                PollAnswer(
+                    time=answer_time,
+                    option=PollOption.good,
+                    user_id=user_id,
+                    poll_id="poll",
+                ),
+            )
+
+        imported_time = now - timedelta(minutes=30)
+        result = await database.import_answers(
+            [
+                (
+                    -1,
+                    "poll",
+                    1,
+                    poll.creation_time,
+                    1,
+                    "Live",
+                    imported_time,
+                    PollOption.bad,
+                ),
+                (
+                    -1,
+                    "poll",
+                    1,
+                    poll.creation_time,
+                    2,
+                    "Live",
+                    imported_time,
+                    PollOption.bad,
+                ),
+            ]
+        )
+        assert result.answers_updated == 1
+
+        stats = await database.get_latest_poll_stats(-1)
+        assert stats is not None
+        assert stats.get_count(PollOption.good) == 1
+        assert stats.get_count(PollOption.bad) == 1
+
+    asyncio.run(_run())
@@ -0,0 +1,138 @@
+import asyncio
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING
+
+from bot.config import SpoolConfig
+from bot.database_spool import SpooledDatabase
+from bot.model import PollAnswer, PollOption, User
+from tests.fakes import RecordingDatabase, create_poll
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def _answer(user_id: int, option: PollOption) -> PollAnswer:
+    return PollAnswer(
+        time=datetime.now(tz=UTC),
+        option=option,
+        user_id=user_id,
+        poll_id="poll",
+    )
+
+
+async def _create(
+    directory: Path,
+    *,
+    max_batch_size: int = 100,
+    max_delay_ms: int = 60_000,
+) -> tuple[SpooledDatabase, RecordingDatabase]:
+    database = RecordingDatabase()
+    await database.insert_polls([create_poll("poll")])
+    spooled = SpooledDatabase(
+        database,
+        SpoolConfig(
+            directory=str(directory),
+            max_batch_size=max_batch_size,
+            max_delay_ms=max_delay_ms,
+        ),
+    )
+    await spooled.open()
+    return spooled, database
+
+
+def _options(database: RecordingDatabase) -> dict[int, PollOption | None]:
+    return {
+        answer.user_id: answer.option
+        for batch in database.batches
+        for answer in batch.answers
+    }
+
+
+def test_replays_answers_in_background(tmp_path: Path) -> None:
+    async def _run() -> None:
+        spooled, database = await _create(tmp_path, max_delay_ms=10)
+
+        await spooled.record_answer(
+            User(id=1, first_name="Ada"), _answer(1, PollOption.good)
+        )
+        await spooled.record_answer(
+            User(id=2, first_name="Grace"), _answer(2, PollOption.bad)
+        )
+        assert spooled.pending_bytes > 0
+
+        await asyncio.sleep(0.1)
+        assert len(database.batches) == 1
+        assert _options(database) == {1: PollOption.good, 2: PollOption.bad}
+        assert spooled.pending_bytes == 0
+        # Fully replayed spools start over
+        assert (tmp_path / "answers.spool").stat().st_size == 0
+        assert (tmp_path / "answers.checkpoint").read_text() == "0"
+
+        await spooled.close()
+
+    asyncio.run(_run())
+
+
+def test_keeps_answers_while_database_is_down(tmp_path: Path) -> None:
+    async def _run() -> None:
+        spooled, database = await _create(tmp_path)
+        database.fail_writes = True
+
+        await spooled.record_answer(
+            User(id=1, first_name="Ada"), _answer(1, PollOption.good)
+        )
+        await spooled.close()
+        assert database.batches == []
+
+        # The next start replays them
+        spooled, database = await _create(tmp_path)
+        assert spooled.pending_bytes > 0
+        await spooled.close()
+        assert _options(database) == {1: PollOption.good}
+
+    asyncio.run(_run())
+
+
+def test_resumes_from_checkpoint(tmp_path: Path) -> None:
+    async def _run() -> None:
+        spooled, database = await _create(tmp_path, max_batch_size=1)
+
+        await spooled.record_answer(
+            User(id=1, first_name="Ada"), _answer(1, PollOption.good)
+        )
+        await spooled.record_answer(
+            User(id=2, first_name="Grace"), _answer(2, PollOption.bad)
+        )
+        await spooled.replay()
+        assert _options(database) == {1: PollOption.good}
+
+        database.fail_writes = True
+        await spooled.close()
+
+        # Only the answer after the checkpoint is replayed again
+        spooled, database = await _create(tmp_path)
+        await spooled.close()
+        assert _options(database) == {2: PollOption.bad}
+
+    asyncio.run(_run())
+
+
+def test_drops_incomplete_last_line(tmp_path: Path) -> None:
+    async def _run() -> None:
+        spooled, database = await _create(tmp_path)
+        await spooled.record_answer(
+            User(id=1, first_name="Ada"), _answer(1, PollOption.good)
+        )
+        database.fail_writes = True
+        await spooled.close()
+
+        # As if the process crashed while appending
+        with (tmp_path / "answers.spool").open("ab") as spool:
+            spool.write(b'[2,"Grace","poll"')
+
+        spooled, database = await _create(tmp_path)
+        await spooled.close()
+        assert _options(database) == {1: PollOption.good}
+        assert (tmp_path / "answers.spool").stat().st_size == 0
+
+    asyncio.run(_run())
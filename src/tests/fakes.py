@@ -0,0 +1,59 @@
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING
+
+from bot.database_memory import MemoryDatabase
+from bot.model import Poll, PollAnswer, User
+
+if TYPE_CHECKING:
+    from bot.database import WriteBatch
+
+
+class RecordingDatabase(MemoryDatabase):
+    """
+    An in-memory database that records the calls layers in front of it make.
+    While fail_writes is set, write_batch raises instead.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls: list[str] = []
+        self.batches: list[WriteBatch] = []
+        self.fail_writes = False
+
+    async def get_poll(self, poll_id: str) -> Poll:
+        self.calls.append("get_poll")
+        return await super().get_poll(poll_id)
+
+    async def upsert_user(self, user: User) -> None:
+        self.calls.append("upsert_user")
+        await super().upsert_user(user)
+
+    async def add_to_group(self, *, user_id: int, group_id: int) -> None:
+        self.calls.append("add_to_group")
+        await super().add_to_group(user_id=user_id, group_id=group_id)
+
+    async def upsert_answer(self, poll_answer: PollAnswer) -> None:
+        self.calls.append("upsert_answer")
+        await super().upsert_answer(poll_answer)
+
+    async def record_answer(self, user: User, poll_answer: PollAnswer) -> None:
+        self.calls.append("record_answer")
+        await super().record_answer(user, poll_answer)
+
+    async def write_batch(self, batch: WriteBatch) -> None:
+        self.calls.append("write_batch")
+        if self.fail_writes:
+            raise ConnectionError("Database is down")
+
+        self.batches.append(batch)
+        await super().write_batch(batch)
+
+
+def create_poll(poll_id: str, *, group_id: int = -1) -> Poll:
+    return Poll(
+        id=poll_id,
+        group_id=group_id,
+        message_id=1,
+        creation_time=datetime.now(tz=UTC),
+        close_time=None,
+    )
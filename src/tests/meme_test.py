@@ -0,0 +1,70 @@
+import random
+from collections import Counter
+from itertools import pairwise
+
+from bot.meme import Meme, MemeKind, _MemeRotation
+
+
+def _meme(meme_id: int, weight: int = 1) -> Meme:
+    return Meme(
+        id=meme_id,
+        kind=MemeKind.photo,
+        weekday=0,
+        weight=weight,
+        file_name=None,
+        file_id=f"file-{meme_id}",
+        last_sent_at=None,
+    )
+
+
+def _draw_ids(rotation: _MemeRotation, count: int) -> list[int]:
+    ids: list[int] = []
+    for _ in range(count):
+        meme = rotation.draw()
+        assert meme is not None
+        ids.append(meme.id)
+
+    return ids
+
+
+def test_draws_each_meme_by_weight_per_round() -> None:
+    memes = [_meme(1), _meme(2, weight=2), _meme(3, weight=3)]
+    for seed in range(50):
+        rotation = _MemeRotation(list(memes), random.Random(seed), last_id=None)
+        for _ in range(3):
+            assert Counter(_draw_ids(rotation, 6)) == {1: 1, 2: 2, 3: 3}
+
+
+def test_does_not_repeat_meme_in_a_row() -> None:
+    memes = [_meme(1), _meme(2, weight=2), _meme(3, weight=3)]
+    for seed in range(50):
+        rotation = _MemeRotation(list(memes), random.Random(seed), last_id=3)
+        ids = _draw_ids(rotation, 60)
+        assert ids[0] != 3
+        assert all(left != right for left, right in pairwise(ids))
+
+
+def test_repeats_meme_that_outweighs_the_others() -> None:
+    memes = [_meme(1, weight=3), _meme(2)]
+    for seed in range(20):
+        rotation = _MemeRotation(list(memes), random.Random(seed), last_id=None)
+        ids = _draw_ids(rotation, 4)
+        assert Counter(ids) == {1: 3, 2: 1}
+        # As few repeats as possible
+        assert ids[1] == 2 or ids[2] == 2
+
+
+def test_draws_nothing_without_memes() -> None:
+    rotation = _MemeRotation([], random.Random(0), last_id=None)
+    assert rotation.draw() is None
+
+
+def test_puts_and_removes_memes() -> None:
+    rotation = _MemeRotation([_meme(1)], random.Random(0), last_id=None)
+
+    rotation.put(_meme(2))
+    rotation.remove(1)
+    assert _draw_ids(rotation, 2) == [2, 2]
+
+    rotation.remove(2)
+    assert rotation.draw() is None
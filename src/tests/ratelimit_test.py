@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from bot.ratelimit import SendRateLimiter
+
+
+@pytest.fixture
+def delays(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    # The clock stands still, so every delay is relative to the same start
+    sleeps: list[float] = []
+
+    async def _sleep(delay: float) -> None:
+        sleeps.append(round(delay, 6))
+
+    monkeypatch.setattr("bot.ratelimit.time.monotonic", lambda: 100.0)
+    monkeypatch.setattr("bot.ratelimit.asyncio.sleep", _sleep)
+    return sleeps
+
+
+def _acquire_all(limiter: SendRateLimiter, chat_ids: list[int]) -> None:
+    async def _run() -> None:
+        for chat_id in chat_ids:
+            await limiter.acquire(chat_id)
+
+    asyncio.run(_run())
+
+
+def test_spaces_out_sends_globally(delays: list[float]) -> None:
+    limiter = SendRateLimiter(messages_per_second=10, chat_interval=0)
+
+    _acquire_all(limiter, [1, 2, 3])
+    assert delays == [0.1, 0.2]
+
+
+def test_spaces_out_sends_per_chat(delays: list[float]) -> None:
+    limiter = SendRateLimiter(messages_per_second=10, chat_interval=1)
+
+    _acquire_all(limiter, [1, 1, 2])
+    # Slots go out in call order, the other chat comes right after
+    assert delays == [1.0, 1.1]
+
+
+def test_pauses_all_sends(delays: list[float]) -> None:
+    limiter = SendRateLimiter(messages_per_second=10, chat_interval=0)
+
+    limiter.pause(5)
+    _acquire_all(limiter, [1, 2])
+    assert delays == [5.0, 5.1]
+    assert limiter.throttled == 1
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import UTC, datetime, time, timedelta
+
+from bot.database_memory import MemoryDatabase
+from bot.scheduler import ScheduledJob, Scheduler
+
+_SCHEDULED_FOR = datetime(2024, 5, 6, 9, 0, tzinfo=UTC)
+
+
+class _Job:
+    def __init__(self, *, fail: bool = False) -> None:
+        self.runs = 0
+        self._fail = fail
+
+    async def run(self) -> None:
+        self.runs += 1
+        if self._fail:
+            raise RuntimeError("Job failed")
+
+    def scheduled(self) -> ScheduledJob:
+        return ScheduledJob(name="job", at=time(9), timezone=UTC, run=self.run)
+
+
+def _create(database: MemoryDatabase) -> Scheduler:
+    return Scheduler(database, list, max_delay=timedelta(hours=1))
+
+
+def test_starts_without_catching_up() -> None:
+    async def _run() -> None:
+        database = MemoryDatabase()
+        scheduler = _create(database)
+        job = _Job()
+
+        await scheduler.run_if_due(job.scheduled(), _SCHEDULED_FOR)
+        assert job.runs == 0
+        assert await database.get_last_scheduled_run("job") == _SCHEDULED_FOR
+
+        # The next day it runs
+        next_day = _SCHEDULED_FOR + timedelta(days=1, minutes=1)
+        await scheduler.run_if_due(job.scheduled(), next_day)
+        assert job.runs == 1
+
+    asyncio.run(_run())
+
+
+def test_runs_once_when_due() -> None:
+    async def _run() -> None:
+        database = MemoryDatabase()
+        await database.claim_scheduled_run("job", _SCHEDULED_FOR - timedelta(days=1))
+        scheduler = _create(database)
+        job = _Job()
+
+        await scheduler.run_if_due(
+            job.scheduled(), _SCHEDULED_FOR - timedelta(minutes=1)
+        )
+        assert job.runs == 0
+
+        await scheduler.run_if_due(job.scheduled(), _SCHEDULED_FOR)
+        await scheduler.run_if_due(
+            job.scheduled(), _SCHEDULED_FOR + timedelta(minutes=1)
+        )
+        assert job.runs == 1
+        assert await database.get_last_scheduled_run("job") == _SCHEDULED_FOR
+
+        # Another process sharing the database doesn't run it again
+        other = _create(database)
+        await other.run_if_due(job.scheduled(), _SCHEDULED_FOR + timedelta(minutes=2))
+        assert job.runs == 1
+
+    asyncio.run(_run())
+
+
+def test_catches_up_on_late_run() -> None:
+    async def _run() -> None:
+        database = MemoryDatabase()
+        await database.claim_scheduled_run("job", _SCHEDULED_FOR - timedelta(days=1))
+        scheduler = _create(database)
+        job = _Job()
+
+        await scheduler.run_if_due(
+            job.scheduled(), _SCHEDULED_FOR + timedelta(minutes=59)
+        )
+        assert job.runs == 1
+
+    asyncio.run(_run())
+
+
+def test_skips_run_that_is_too_late() -> None:
+    async def _run() -> None:
+        database = MemoryDatabase()
+        await database.claim_scheduled_run("job", _SCHEDULED_FOR - timedelta(days=1))
+        scheduler = _create(database)
+        job = _Job()
+
+        await scheduler.run_if_due(job.scheduled(), _SCHEDULED_FOR + timedelta(hours=2))
+        assert job.runs == 0
+        # Not claimed, in case another process is still in time
+        last_run = await database.get_last_scheduled_run("job")
+        assert last_run == _SCHEDULED_FOR - timedelta(days=1)
+
+    asyncio.run(_run())
+
+
+def test_does_not_retry_failed_run() -> None:
+    async def _run() -> None:
+        database = MemoryDatabase()
+        await database.claim_scheduled_run("job", _SCHEDULED_FOR - timedelta(days=1))
+        scheduler = _create(database)
+        job = _Job(fail=True)
+
+        await scheduler.run_if_due(job.scheduled(), _SCHEDULED_FOR)
+        await scheduler.run_if_due(
+            job.scheduled(), _SCHEDULED_FOR + timedelta(minutes=1)
+        )
+        assert job.runs == 1
+
+    asyncio.run(_run())
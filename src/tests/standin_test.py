@@ -0,0 +1,98 @@
+import asyncio
+from typing import TYPE_CHECKING
+
+import pytest
+
+from bot.bot import MoodBot, _get_file_id
+from bot.config import HttpConfig, MemeConfig, TelegramConfig
+from bot.database_memory import MemoryDatabase
+from bot.meme import Meme, MemeKind
+from bot.standin import BotApiStandIn
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+_UPLOAD_CHAT_ID = 1
+
+
+def _config(api_base_url: str) -> TelegramConfig:
+    return TelegramConfig(
+        token="123456:standin",
+        api_base_url=api_base_url,
+        timezone_name="UTC",
+        send_concurrency=1,
+        messages_per_second=1000,
+        chat_interval_ms=0,
+        max_send_attempts=1,
+        close_batch_size=100,
+        update_concurrency=1,
+        update_dedupe_window=100,
+        http=HttpConfig(
+            pool_size=1,
+            keepalive_connections=1,
+            keepalive_expiry_seconds=5,
+            http2=False,
+            connect_timeout_seconds=5,
+            read_timeout_seconds=5,
+            write_timeout_seconds=5,
+            media_write_timeout_seconds=5,
+            pool_timeout_seconds=1,
+        ),
+    )
+
+
+async def _with_bot(run: Callable[[MoodBot], Awaitable[None]]) -> BotApiStandIn:
+    standin = BotApiStandIn(min_latency=0.0, max_latency=0.0)
+    await standin.start()
+    try:
+        bot = MoodBot(
+            _config(standin.base_url),
+            None,
+            MemoryDatabase(),
+            meme_config=MemeConfig(upload_chat_id=_UPLOAD_CHAT_ID),
+        )
+        await bot.bot.initialize()
+        try:
+            await run(bot)
+        finally:
+            await bot.bot.shutdown()
+    finally:
+        await standin.close()
+
+    return standin
+
+
+def _meme(kind: MemeKind) -> Meme:
+    return Meme(
+        id=1,
+        kind=kind,
+        weekday=0,
+        weight=1,
+        file_name="meme.bin",
+        file_id=None,
+        last_sent_at=None,
+    )
+
+
+@pytest.mark.parametrize("kind", list(MemeKind))
+def test_uploads_memes(kind: MemeKind) -> None:
+    file_ids: list[str] = []
+
+    async def _run(bot: MoodBot) -> None:
+        # Not valid UTF-8, like most media files
+        content = bytes(range(256))
+        file_ids.append(await bot._upload_meme(_meme(kind), content))
+        file_ids.append(await bot._upload_meme(_meme(kind), content))
+
+    standin = asyncio.run(_with_bot(_run))
+    assert file_ids == ["standin-file-1", "standin-file-2"]
+    assert standin.calls.total() == 3
+
+
+@pytest.mark.parametrize("kind", list(MemeKind))
+def test_sends_memes_by_file_id(kind: MemeKind) -> None:
+    async def _run(bot: MoodBot) -> None:
+        message = await bot._send_meme_file(_UPLOAD_CHAT_ID, kind, "known-file")
+        assert _get_file_id(message, kind) == "known-file"
+
+    asyncio.run(_with_bot(_run))
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+import telegram
+from telegram.ext import ApplicationHandlerStop
+
+from bot.config import PartitionConfig
+from bot.update_filter import UpdateFilter
+
+
+def _update(update_id: int) -> telegram.Update:
+    return telegram.Update(update_id=update_id)
+
+
+def _key(update: telegram.Update) -> int:
+    # Two updates per key
+    return update.update_id // 2
+
+
+def test_drops_duplicates_within_window() -> None:
+    update_filter = UpdateFilter(window=2, partition=None, key=_key)
+
+    assert update_filter.accepts(_update(1))
+    assert update_filter.accepts(_update(2))
+    assert not update_filter.accepts(_update(1))
+
+    # 1 dropped out of the window
+    assert update_filter.accepts(_update(3))
+    assert update_filter.accepts(_update(1))
+
+
+def test_accepts_everything_without_window() -> None:
+    update_filter = UpdateFilter(window=0, partition=None, key=_key)
+
+    assert update_filter.accepts(_update(1))
+    assert update_filter.accepts(_update(1))
+
+
+def test_keeps_updates_of_partition() -> None:
+    update_filter = UpdateFilter(
+        window=10,
+        partition=PartitionConfig(index=1, count=3),
+        key=_key,
+    )
+
+    accepted = [i for i in range(12) if update_filter.accepts(_update(i))]
+    assert accepted == [2, 3, 8, 9]
+
+
+def test_stops_handling_of_dropped_updates() -> None:
+    update_filter = UpdateFilter(window=10, partition=None, key=_key)
+
+    asyncio.run(update_filter(_update(1), None))
+    with pytest.raises(ApplicationHandlerStop):
+        asyncio.run(update_filter(_update(1), None))
+
+
+def test_requires_consumer_of_partition() -> None:
+    partition = PartitionConfig(index=1, count=3)
+
+    partition.check_consumer("mood-bot-1")
+    with pytest.raises(ValueError, match="mood-bot"):
+        partition.check_consumer("mood-bot")
+    with pytest.raises(ValueError, match="mood-bot-11"):
+        partition.check_consumer("mood-bot-11")
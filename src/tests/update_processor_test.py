@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from bot.update_processor import OrderedUpdateProcessor
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.events: list[str] = []
+        self.running = 0
+        self.max_running = 0
+
+    async def handle(self, name: str, delay: float) -> None:
+        self.events.append(f"start {name}")
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(delay)
+        self.running -= 1
+        self.events.append(f"end {name}")
+
+
+async def _process_all(
+    processor: OrderedUpdateProcessor,
+    recorder: _Recorder,
+    updates: list[tuple[str | None, str, float]],
+) -> None:
+    await asyncio.gather(
+        *(
+            processor.process_update(update, recorder.handle(update[1], update[2]))
+            for update in updates
+        )
+    )
+
+
+def test_handles_updates_with_same_key_in_order() -> None:
+    async def _run() -> None:
+        processor = OrderedUpdateProcessor(4, key=lambda update: update[0])
+        recorder = _Recorder()
+
+        await _process_all(
+            processor,
+            recorder,
+            [("a", "a1", 0.03), ("a", "a2", 0.01), ("a", "a3", 0)],
+        )
+        assert recorder.events == [
+            "start a1",
+            "end a1",
+            "start a2",
+            "end a2",
+            "start a3",
+            "end a3",
+        ]
+
+    asyncio.run(_run())
+
+
+def test_limits_concurrent_updates() -> None:
+    async def _run() -> None:
+        processor = OrderedUpdateProcessor(2, key=lambda _: None)
+        recorder = _Recorder()
+
+        await _process_all(
+            processor,
+            recorder,
+            [(None, str(i), 0.01) for i in range(5)],
+        )
+        assert recorder.max_running == 2
+        assert processor.waiting == 0
+        assert processor.in_flight == 0
+
+    asyncio.run(_run())
+
+
+def test_waiting_for_key_does_not_take_a_slot() -> None:
+    async def _run() -> None:
+        processor = OrderedUpdateProcessor(2, key=lambda update: update[0])
+        recorder = _Recorder()
+
+        await _process_all(
+            processor,
+            recorder,
+            [("a", "a1", 0.02), ("a", "a2", 0), ("b", "b1", 0)],
+        )
+        assert recorder.events.index("end b1") < recorder.events.index("end a1")
+        assert recorder.events.index("start a2") > recorder.events.index("end a1")
+
+    asyncio.run(_run())
+
+
+def test_keeps_order_after_failure() -> None:
+    async def _run() -> None:
+        processor = OrderedUpdateProcessor(2, key=lambda update: update[0])
+        events: list[str] = []
+
+        async def fail() -> None:
+            await asyncio.sleep(0.01)
+            events.append("fail")
+            raise RuntimeError("Handler failed")
+
+        async def succeed() -> None:
+            events.append("succeed")
+
+        results = await asyncio.gather(
+            processor.process_update(("a",), fail()),
+            processor.process_update(("a",), succeed()),
+            return_exceptions=True,
+        )
+        assert isinstance(results[0], RuntimeError)
+        assert events == ["fail", "succeed"]
+        assert processor.waiting == 0
+
+    asyncio.run(_run())
+
+
+def test_requires_positive_limit() -> None:
+    with pytest.raises(ValueError, match="limit"):
+        OrderedUpdateProcessor(0, key=lambda _: None)